@@ -0,0 +1,344 @@
+import argparse
+import collections
+import importlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import PIL
+
+from imaging.CustomImage import CustomImage
+from imaging.NoiseColorGenerator import NoiseColorGenerator
+from imaging.RingColorGenerator import RingColorGenerator
+
+# A benchmark suite timing and memory-profiling every public `CustomImage` operation,
+# as well as every demo scene end to end, across resolutions and storages.
+#
+# Invocation, from the root of the repository:
+#   python -m benchmarks.run                                   Run everything at every resolution
+#   python -m benchmarks.run -r 1080p -s dense tiled           Pick resolutions and storages
+#   python -m benchmarks.run -k scene                          Only run benchmarks whose name contains 'scene'
+#   python -m benchmarks.run -o results.json                   Write the results as JSON
+#   python -m benchmarks.run --compare benchmarks/baseline.json
+#                                                              Compare against a baseline, exit with status 1
+#                                                              on any regression or any result it lacks
+#   python -m benchmarks.run -k new_bench -s dense tiled palette --update benchmarks/baseline.json
+#                                                              Record results in a baseline, keeping the rest
+#
+# The baseline covers every benchmark at every resolution and storage. A benchmark is added along with its
+# results in the baseline, so that `--compare` checks it from then on.
+#
+# Every benchmark is a function `bench_*(width, height, storage)` that prepares whatever it needs,
+# and returns a function performing only the operation under measurement. Preparation is never timed.
+# The operation is timed `repeat` times, each on freshly prepared state, and its best time is reported.
+# Its peak memory is measured once more, under `tracemalloc`, which `numpy` reports its allocations to.
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+    '8k': (7680, 4320),
+}
+
+STORAGES = ('dense', 'tiled', 'palette')
+
+# Scenes are the `build_image` functions of the demos
+SCENES = [f'demo_{i}' for i in range(7)]
+
+# Thresholds beyond which a result counts as a regression, as a fraction of its baseline
+DEFAULT_TIME_THRESHOLD = 0.5
+DEFAULT_MEMORY_THRESHOLD = 0.25
+
+# Timings shorter than this are too noisy to compare, in seconds
+MIN_COMPARABLE_SECONDS = 0.005
+
+# Helpers for preparing state
+
+def make_color_generator():
+    cg = RingColorGenerator()
+    cg.add_rainbow_to_pool(step_size=15)
+    return cg
+
+def make_image(width, height, storage, background=True):
+    # Every benchmark draws the same random numbers
+    random.seed(0)
+    image = CustomImage(width, height, make_color_generator(), storage=storage)
+    if background:
+        image.reserve_white_background()
+    return image
+
+# A sine across the image, which also accepts an array of every `x` at once
+def make_sine(width, height):
+    return lambda x : height / 3 * np.sin(x / (width / 20)) + height / 2
+
+# Benchmarks of single operations
+
+def bench_construct(width, height, storage):
+    cg = make_color_generator()
+    return lambda : CustomImage(width, height, cg, storage=storage)
+
+def bench_background_fill(width, height, storage):
+    image = make_image(width, height, storage, background=False)
+    return image.reserve_white_background
+
+def bench_region_subdivision(width, height, storage):
+    image = make_image(width, height, storage)
+    return lambda : image.divide_rectangular_regions(10000)
+
+def bench_region_fill(width, height, storage):
+    image = make_image(width, height, storage)
+    image.divide_rectangular_regions(10000)
+    return image.reserve_all_rectangular_regions
+
+def bench_noise_region_fill(width, height, storage):
+    image = make_image(width, height, storage)
+    image.divide_rectangular_regions(10000)
+    noise = NoiseColorGenerator(make_color_generator(), scale=width / 16, seed=0)
+    return lambda : image.reserve_all_rectangular_regions(noise)
+
+def _bench_function_plot(brush_size, vectorized=False, brush='square'):
+    def bench(width, height, storage):
+        image = make_image(width, height, storage)
+        sine = make_sine(width, height)
+        return lambda : image.draw_single_variable_function(sine, brush_size=brush_size, vectorized=vectorized,
+            brush=brush)
+    return bench
+
+bench_function_plot_brush_1 = _bench_function_plot(1)
+bench_function_plot_brush_5 = _bench_function_plot(5)
+bench_function_plot_brush_20 = _bench_function_plot(20)
+bench_function_plot_brush_20_vectorized = _bench_function_plot(20, vectorized=True)
+bench_function_plot_disc_20 = _bench_function_plot(20, brush='disc')
+
+def bench_dot_connection(width, height, storage):
+    image = make_image(width, height, storage)
+    for _ in range(50):
+        image.add_random_dot()
+    return lambda : image.connect_all_dots(brush_size=10)
+
+def bench_density_plot(width, height, storage):
+    image = make_image(width, height, storage)
+    rng = np.random.default_rng(0)
+    xs, ys = rng.normal(width / 2, width / 8, 1000000), rng.normal(height / 2, height / 8, 1000000)
+    return lambda : image.draw_density(xs, ys, radius=3)
+
+def bench_random_slice_generation(width, height, storage):
+    image = make_image(width, height, storage)
+    return lambda : image.create_random_vertical_slices(0, width)
+
+def bench_symmetric_slice_generation(width, height, storage):
+    image = make_image(width, height, storage)
+    return lambda : image.create_symmetric_vertical_slices_from_center(0, width, num_partitions=10)
+
+def bench_slice_reservation(width, height, storage):
+    image = make_image(width, height, storage)
+    image.create_symmetric_vertical_slices_from_center(0, width, num_partitions=10)
+    image.create_random_horizontal_slices(0, height, y_step_size=4)
+    return lambda : (image.reserve_all_vertical_slices(), image.reserve_all_horizontal_slices())
+
+def bench_pixel_validation(width, height, storage):
+    image = make_image(width, height, storage)
+    return image.are_all_pixels_reserved
+
+def bench_byte_construction(width, height, storage):
+    image = make_image(width, height, storage)
+    image.draw_single_variable_function(make_sine(width, height), brush_size=5)
+    return image.to_pil
+
+def _bench_encode(format):
+    def bench(width, height, storage):
+        image = make_image(width, height, storage)
+        image.draw_single_variable_function(make_sine(width, height), brush_size=5)
+        return lambda : image.to_bytes(format)
+    return bench
+
+bench_encode_png = _bench_encode('PNG')
+bench_encode_jpeg = _bench_encode('JPEG')
+
+# Streamed encoding, discarding the encoded `bytes` as they are produced
+def bench_encode_png_stream(width, height, storage):
+    image = make_image(width, height, storage)
+    image.draw_single_variable_function(make_sine(width, height), brush_size=5)
+    return lambda : collections.deque(image.iter_encoded('PNG'), maxlen=0)
+
+# Encoding again after a small edit, which only encodes the strips the edit changed
+def bench_encode_png_after_edit(width, height, storage):
+    image = make_image(width, height, storage)
+    image.to_bytes('PNG')
+    image.draw_line_segment(0, height // 3, width // 4, height // 3 + 20, brush_size=2)
+    return lambda : image.to_bytes('PNG')
+
+# Benchmarks of every demo scene, from construction to an encoded `JPEG`
+
+def _bench_scene(module_name):
+    def bench(width, height, storage):
+        build_image = importlib.import_module(module_name).build_image
+        def run():
+            random.seed(0)
+            return build_image(width, height, storage=storage).to_bytes('JPEG')
+        return run
+    return bench
+
+# Every benchmark, by name, in the order they are run
+BENCHMARKS = {
+    'construct': bench_construct,
+    'background_fill': bench_background_fill,
+    'region_subdivision': bench_region_subdivision,
+    'region_fill': bench_region_fill,
+    'noise_region_fill': bench_noise_region_fill,
+    'function_plot_brush_1': bench_function_plot_brush_1,
+    'function_plot_brush_5': bench_function_plot_brush_5,
+    'function_plot_brush_20': bench_function_plot_brush_20,
+    'function_plot_brush_20_vectorized': bench_function_plot_brush_20_vectorized,
+    'function_plot_disc_20': bench_function_plot_disc_20,
+    'dot_connection': bench_dot_connection,
+    'density_plot': bench_density_plot,
+    'random_slice_generation': bench_random_slice_generation,
+    'symmetric_slice_generation': bench_symmetric_slice_generation,
+    'slice_reservation': bench_slice_reservation,
+    'pixel_validation': bench_pixel_validation,
+    'byte_construction': bench_byte_construction,
+    'encode_png': bench_encode_png,
+    'encode_jpeg': bench_encode_jpeg,
+    'encode_png_stream': bench_encode_png_stream,
+    'encode_png_after_edit': bench_encode_png_after_edit,
+}
+BENCHMARKS.update({f'scene_{scene}': _bench_scene(scene) for scene in SCENES})
+
+# Running benchmarks
+
+# Time a single benchmark, and measure its peak memory. Return both as a `dict`
+def run_benchmark(bench, width, height, storage, repeat, measure_memory=True):
+    times = []
+    for _ in range(repeat):
+        operation = bench(width, height, storage)
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+
+    result = {'seconds': min(times), 'mean_seconds': sum(times) / len(times)}
+
+    if measure_memory:
+        operation = bench(width, height, storage)
+        tracemalloc.start()
+        try:
+            operation()
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+# Run every selected benchmark, reporting progress on `stderr`, and return the results
+def run_all(names, resolutions, storages, repeat, measure_memory=True):
+    results = {}
+    for resolution in resolutions:
+        width, height = RESOLUTIONS[resolution]
+        for storage in storages:
+            for name in names:
+                key = f'{name}@{resolution}/{storage}'
+                result = run_benchmark(BENCHMARKS[name], width, height, storage, repeat, measure_memory)
+                results[key] = result
+
+                memory = result.get('peak_memory_bytes')
+                memory = '' if memory is None else f'{memory / 2 ** 20:10.1f} MiB'
+                print(f'{key:60} {result["seconds"] * 1000:10.1f} ms {memory}', file=sys.stderr)
+    return results
+
+# Compare results against a baseline. Return a list of regressions, each described as a string, along with
+# the keys of the results that the baseline lacks - which cannot be compared, and must not pass unnoticed
+def compare(results, baseline, time_threshold, memory_threshold):
+    regressions, missing = [], []
+    for key, result in results.items():
+        if key not in baseline:
+            missing.append(key)
+            continue
+        base = baseline[key]
+
+        if max(result['seconds'], base['seconds']) >= MIN_COMPARABLE_SECONDS:
+            ratio = result['seconds'] / max(base['seconds'], 1e-9)
+            if ratio > 1 + time_threshold:
+                regressions.append(f'{key}: {base["seconds"] * 1000:.1f} ms -> {result["seconds"] * 1000:.1f} ms '
+                    f'({ratio:.2f}x)')
+
+        if 'peak_memory_bytes' in result and 'peak_memory_bytes' in base:
+            ratio = result['peak_memory_bytes'] / max(base['peak_memory_bytes'], 1)
+            if ratio > 1 + memory_threshold and result['peak_memory_bytes'] > 2 ** 20:
+                regressions.append(f'{key}: {base["peak_memory_bytes"] / 2 ** 20:.1f} MiB -> '
+                    f'{result["peak_memory_bytes"] / 2 ** 20:.1f} MiB peak memory ({ratio:.2f}x)')
+
+    return regressions, missing
+
+# Record results in the baseline at `path`, replacing those of the same keys and keeping every other
+def update_baseline(path, output):
+    try:
+        with open(path) as fp:
+            baseline = json.load(fp)
+    except FileNotFoundError:
+        baseline = {'results': {}}
+
+    baseline['environment'] = output['environment']
+    baseline['results'].update(output['results'])
+    with open(path, 'w') as fp:
+        json.dump(baseline, fp, indent=2, sort_keys=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every CustomImage operation and demo scene.')
+    parser.add_argument('-r', '--resolutions', nargs='+', choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument('-s', '--storages', nargs='+', choices=STORAGES, default=['dense'])
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='number of timed runs per benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this path')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against the results in this JSON file')
+    parser.add_argument('--update', metavar='BASELINE', help='record the results in this JSON file')
+    parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD)
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    parser.add_argument('--list', action='store_true', help='list every benchmark and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return 0
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run_all(names, args.resolutions, args.storages, args.repeat, not args.no_memory)
+
+    output = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pillow': PIL.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(output, fp, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(output, indent=2, sort_keys=True))
+    if args.update:
+        update_baseline(args.update, output)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)['results']
+
+        regressions, missing = compare(results, baseline, args.time_threshold, args.memory_threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        for key in missing:
+            print(f'MISSING {key}: no baseline in {args.compare}, record one with --update', file=sys.stderr)
+        if regressions or missing:
+            return 1
+        print(f'No regressions against {args.compare}', file=sys.stderr)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
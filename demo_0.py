@@ -3,17 +3,16 @@ import math
 from imaging.CustomImage import CustomImage
 from imaging.ColorGenerator import ColorGenerator
 
-def main():
-
-    # Define image dimensions
-    x_max, y_max = 1920, 1080
+# Build the scene of this demo at any resolution, and return it as a `CustomImage`
+# Any further options, such as `storage`, are passed on to `CustomImage`
+def build_image(x_max=1920, y_max=1080, **options):
 
     # Instantiate a `ColorGenerator`
     # This one is very simple: it always generates the color black
     cg = ColorGenerator()
 
     # Instantiate a `CustomImage`
-    my_image = CustomImage(x_max, y_max, cg)
+    my_image = CustomImage(x_max, y_max, cg, **options)
 
     # Set the background color
     my_image.reserve_white_background()
@@ -25,6 +24,11 @@ def main():
     sine_func = lambda x : 200 * math.sin(x/100) + y_max / 2
     my_image.draw_single_variable_function(sine_func, brush_size=20)
 
+    return my_image
+
+def main():
+    my_image = build_image()
+
     # Open the `CustomImage` as a JPEG
     my_image.construct_and_show_jpeg()
 
@@ -3,10 +3,9 @@ import math
 from imaging.CustomImage import CustomImage
 from imaging.RingColorGenerator import RingColorGenerator
 
-def main():
-
-    # Define image dimensions
-    x_max, y_max = 1920, 1080
+# Build the scene of this demo at any resolution, and return it as a `CustomImage`
+# Any further options, such as `storage`, are passed on to `CustomImage`
+def build_image(x_max=1920, y_max=1080, **options):
 
     # Instantiate a `ColorGenerator`
     # This one is a bit more interesting - it has a pool of colors that it cycles through
@@ -16,7 +15,7 @@ def main():
     cg.add_rainbow_to_pool(step_size=30)
     
     # Instantiate a `CustomImage`
-    my_image = CustomImage(x_max, y_max, cg)
+    my_image = CustomImage(x_max, y_max, cg, **options)
 
     # Set the background color
     my_image.reserve_white_background()
@@ -28,6 +27,11 @@ def main():
     sine_func = lambda x : 200 * math.sin(x/100) + y_max / 2
     my_image.draw_single_variable_function(sine_func, brush_size=20)
 
+    return my_image
+
+def main():
+    my_image = build_image()
+
     # Open the `CustomImage` as a JPEG
     my_image.construct_and_show_jpeg()
 
@@ -5,10 +5,9 @@ from imaging.RingColorGenerator import RingColorGenerator
 # We'll use these colors in our image.
 oranges_url = 'https://coolors.co/ff4800-ff5400-ff6000-ff6d00-ff7900-ff8500-ff9100-ff9e00-ffaa00-ffb600'
 
-def main():
-
-    # Define image dimensions
-    x_max, y_max = 1920, 1080
+# Build the scene of this demo at any resolution, and return it as a `CustomImage`
+# Any further options, such as `storage`, are passed on to `CustomImage`
+def build_image(x_max=1920, y_max=1080, **options):
 
     # Instantiate a `ColorGenerator`
     # This one is a bit more interesting - it has a pool of colors that it cycles through
@@ -18,20 +17,25 @@ def main():
     cg.add_palette_to_pool_from_url(oranges_url)
     
     # Instantiate a `CustomImage`
-    my_image = CustomImage(x_max, y_max, cg)
+    my_image = CustomImage(x_max, y_max, cg, **options)
 
     # Set the background color
     my_image.reserve_white_background()
 
     # Repetitively divide the image into `RectangularRegion`s
+    # Larger regions are more likely to be divided
     num_divisions = 35
 
-    for _ in range(num_divisions):
-        my_image.divide_random_rectangular_region_in_two()
+    my_image.divide_rectangular_regions(num_divisions)
 
     # Apply a color to each `RectangularRegion` using our `ColorGenerator` behind the scenes
     my_image.reserve_all_rectangular_regions()
 
+    return my_image
+
+def main():
+    my_image = build_image()
+
     # Open the `CustomImage` as a JPEG
     my_image.construct_and_show_jpeg()
 
@@ -7,10 +7,9 @@ from imaging.RingColorGenerator import RingColorGenerator
 # We'll use these colors in our image.
 reds_url = 'https://coolors.co/641220-6e1423-85182a-a11d33-a71e34-b21e35-bd1f36-c71f37-da1e37-e01e37'
 
-def main():
-
-    # Define image dimensions
-    x_max, y_max = 1920, 1080
+# Build the scene of this demo at any resolution, and return it as a `CustomImage`
+# Any further options, such as `storage`, are passed on to `CustomImage`
+def build_image(x_max=1920, y_max=1080, **options):
 
     # Instantiate a `ColorGenerator`
     # This one is a bit more interesting - it has a pool of colors that it cycles through
@@ -20,7 +19,7 @@ def main():
     cg.add_palette_to_pool_from_url(reds_url)
     
     # Instantiate a `CustomImage`
-    my_image = CustomImage(x_max, y_max, cg)
+    my_image = CustomImage(x_max, y_max, cg, **options)
 
     # Manually invoke our `ColorGenerator` and set the background color of the image
     bg_color = cg.generate_color()
@@ -31,6 +30,11 @@ def main():
         f_sine = lambda x : 100 * math.sin(x/100) + y_offset
         my_image.draw_single_variable_function(f_sine, brush_size=40)
 
+    return my_image
+
+def main():
+    my_image = build_image()
+
     # Open the `CustomImage` as a JPEG
     my_image.construct_and_show_jpeg()
 
@@ -8,10 +8,9 @@ yellows_url = 'https://coolors.co/007f5f-2b9348-55a630-80b918-aacc00-bfd200-d4d7
 oranges_url = 'https://coolors.co/ff4800-ff5400-ff6000-ff6d00-ff7900-ff8500-ff9100-ff9e00-ffaa00-ffb600'
 blues_url = 'https://coolors.co/03045e-023e8a-0077b6-0096c7-00b4d8-48cae4-90e0ef-ade8f4-caf0f8'
 
-def main():
-
-    # Define image dimensions
-    x_max, y_max = 1920, 1080
+# Build the scene of this demo at any resolution, and return it as a `CustomImage`
+# Any further options, such as `storage`, are passed on to `CustomImage`
+def build_image(x_max=1920, y_max=1080, **options):
 
     # Instantiate a `ColorGenerator`
     # This one is a bit more interesting - it has a pool of colors that it cycles through
@@ -24,7 +23,7 @@ def main():
     cg.add_palette_to_pool_from_url(blues_url)
     
     # Instantiate a `CustomImage`
-    my_image = CustomImage(x_max, y_max, cg)
+    my_image = CustomImage(x_max, y_max, cg, **options)
 
     # Set the background color
     my_image.reserve_black_background()
@@ -35,6 +34,11 @@ def main():
     # Reserve each `vertical_slice` using our `ColorGenerator`
     my_image.reserve_all_vertical_slices()
 
+    return my_image
+
+def main():
+    my_image = build_image()
+
     # Open the `CustomImage` as a JPEG
     my_image.construct_and_show_jpeg()
 
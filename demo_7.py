@@ -0,0 +1,47 @@
+import numpy as np
+
+from imaging.Animation import Animation
+from imaging.CustomImage import CustomImage
+from imaging.RingColorGenerator import RingColorGenerator
+
+# Coolors is a website for sharing combinations (palettes) of colors.
+# We'll use these colors in our animation.
+blues_url = 'https://coolors.co/03045e-023e8a-0077b6-0096c7-00b4d8-48cae4-90e0ef-ade8f4-caf0f8'
+
+# Define image dimensions and the number of frames
+x_max, y_max = 640, 360
+num_frames = 24
+
+# Draw everything that changes from one frame to the next.
+# Frames render in parallel, so this must be a module-level function.
+def draw_frame(image, frame_index):
+    # Shift the phase of the sine function a little further each frame
+    phase = 2 * np.pi * frame_index / num_frames
+    sine_func = lambda x : 80 * np.sin(x / 50 + phase) + y_max / 2
+
+    # Advance the starting point of the ring of colors as well
+    image.cg.curr_ring_index = frame_index
+
+    image.draw_single_variable_function(sine_func, brush_size=8, vectorized=True)
+
+def main():
+
+    # Instantiate a `ColorGenerator`
+    # This one is a bit more interesting - it has a pool of colors that it cycles through
+    cg = RingColorGenerator()
+
+    # Populate our pool with the colors of a Coolors Palette
+    cg.add_palette_to_pool_from_url(blues_url)
+
+    # Instantiate a `CustomImage` holding everything that all frames share
+    # Palette storage keeps frames small - every color comes from our pool
+    base = CustomImage(x_max, y_max, cg, storage='palette')
+    base.reserve_black_background()
+
+    # Render every frame on top of a copy of `base`, and stream the frames into a GIF
+    animation = Animation(base, draw_frame, num_frames)
+    animation.save('demo_7.gif', duration=50, processes=4)
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
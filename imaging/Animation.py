@@ -0,0 +1,121 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from imaging.AnimationWriter import GifWriter, ApngWriter
+
+# An `Animation` renders a sequence of frames from a single scene.
+#
+# A scene is split into two parts:
+#   1) `base`: a `CustomImage` holding everything that all frames share, such as a background
+#      or `RectangularRegion`s. It is drawn once, before the `Animation` is rendered
+#   2) `draw_frame`: a function of the form `draw_frame(image, frame_index)` that draws whatever changes
+#      from frame to frame onto `image` - a ring offset, a function phase, slice heights, etc.
+#
+# Every frame starts out as a copy of `base`, including its `ColorGenerator`, so the shared pixels
+# are never redrawn and every frame is independent of the others. Every frame draws its random numbers
+# from its own substream of the seed of `base` (see `CustomImage.get_substream_rng`), so frames differ
+# from one another, yet always render the same. Independent frames can be rendered in parallel on a
+# process pool, with the same result. For that, `draw_frame` must be a module-level function.
+#
+# With `accumulate`, every frame instead starts out as the previous frame. Such frames build on one
+# another, and are rendered in order.
+#
+# Frames are streamed: each one is handed to a writer as soon as it is ready, and then dropped.
+
+class Animation:
+
+    # File extensions of the supported output formats
+    WRITERS = {
+        '.gif': GifWriter,
+        '.png': ApngWriter,
+        '.apng': ApngWriter,
+    }
+
+    def __init__(self, base, draw_frame, num_frames, accumulate=False):
+        self.base = base
+        self.draw_frame = draw_frame
+        self.num_frames = num_frames
+        self.accumulate = accumulate
+
+    # Render a single, independent frame and return it as a `CustomImage`
+    def render_frame(self, frame_index):
+        image = self.base.copy()
+        image.use_substream(frame_index)
+        self.draw_frame(image, frame_index)
+        return image
+
+    # Render all frames, in order, as `PIL.Image`s.
+    # If `processes` is greater than one, independent frames are rendered on a pool of that many processes.
+    # At most two frames per process are in flight at any time, so memory stays bounded.
+    def frames(self, processes=None):
+        if self.accumulate:
+            if processes is not None and processes > 1:
+                raise ValueError('Accumulated frames depend on one another and cannot be rendered in parallel')
+            yield from self._accumulated_frames()
+
+        elif processes is None or processes <= 1:
+            for frame_index in range(self.num_frames):
+                yield self.render_frame(frame_index).to_pil()
+
+        else:
+            yield from self._parallel_frames(processes)
+
+    # Render frames that build on one another
+    def _accumulated_frames(self):
+        image = self.base.copy()
+        for frame_index in range(self.num_frames):
+            self.draw_frame(image, frame_index)
+            # The next frame keeps drawing on `image`, so hand out a snapshot
+            yield image.to_pil().copy()
+
+    # Render independent frames on a process pool, yielding them in order
+    def _parallel_frames(self, processes):
+        with ProcessPoolExecutor(processes, initializer=_set_worker_animation, initargs=(self,)) as executor:
+            pending = collections.deque()
+            next_frame_index = 0
+
+            while pending or next_frame_index < self.num_frames:
+                # Keep every process busy, without racing ahead of the consumer
+                while next_frame_index < self.num_frames and len(pending) < 2 * processes:
+                    pending.append(executor.submit(_render_frame_in_worker, next_frame_index))
+                    next_frame_index += 1
+
+                yield pending.popleft().result()
+
+    # Render all frames and stream them into an animated image at `path`, which may also be a file object.
+    # If `format` is not specified, it is inferred from the extension of `path`: '.gif', '.png' or '.apng'.
+    # `duration` is the time each frame is displayed for, in milliseconds. A `loop` of `0` loops forever.
+    def save(self, path, format=None, duration=100, loop=0, processes=None):
+        if format is None:
+            format = os.path.splitext(path)[1] if isinstance(path, (str, os.PathLike)) else ''
+        extension = format.lower() if format.startswith('.') else '.' + format.lower()
+
+        if extension not in self.WRITERS:
+            raise ValueError(f'Unknown animation format {format!r}, expected one of {list(self.WRITERS)}')
+
+        # Open `path` unless a file object was provided
+        fp = open(path, 'wb') if isinstance(path, (str, os.PathLike)) else path
+        try:
+            if self.WRITERS[extension] is ApngWriter:
+                writer = ApngWriter(fp, self.num_frames, duration, loop)
+            else:
+                writer = self.WRITERS[extension](fp, duration, loop)
+
+            for frame in self.frames(processes):
+                writer.write_frame(frame)
+            writer.close()
+        finally:
+            if fp is not path:
+                fp.close()
+
+
+# Worker processes receive the `Animation` once, when they start
+_worker_animation = None
+
+def _set_worker_animation(animation):
+    global _worker_animation
+    _worker_animation = animation
+
+def _render_frame_in_worker(frame_index):
+    return _worker_animation.render_frame(frame_index).to_pil()
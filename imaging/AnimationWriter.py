@@ -0,0 +1,122 @@
+import struct
+import zlib
+
+import numpy as np
+from PIL import GifImagePlugin
+
+from imaging.ImageWriter import PngWriter, pack_png_chunk
+
+# An `AnimationWriter` encodes a sequence of frames into an animated image, one frame at a time.
+# Every frame is written out as soon as it is received, so no more than one frame is ever held in memory.
+#
+# Frames are `PIL.Image`s of equal size. A writer is used like so:
+#   writer.write_frame(frame_0)
+#   writer.write_frame(frame_1)
+#   ...
+#   writer.close()
+#
+# `AnimationWriter` is at the top of an inheritance hierarchy. Derivative instances
+# encode different formats. Each derivative supplies `write_frame` and `close`.
+
+class AnimationWriter:
+
+    # Provide a binary file object to write to, the time each frame is displayed for, in milliseconds,
+    # and the number of times the animation loops, where `0` loops forever
+    def __init__(self, fp, duration=100, loop=0):
+        self.fp = fp
+        self.duration = duration
+        self.loop = loop
+        self.num_frames_written = 0
+
+    # Encode and write a single frame
+    def write_frame(self, image):
+        raise NotImplementedError
+
+    # Finish the animation. The file object itself is left open
+    def close(self):
+        raise NotImplementedError
+
+
+# A `GifWriter` encodes an animated `GIF`.
+# Each frame carries its own palette, so colors are never shared between frames by force.
+# 'P' (palette) mode frames are written as they are; other frames are quantized to 256 colors first.
+
+class GifWriter(AnimationWriter):
+
+    # Encode and write a single frame
+    def write_frame(self, image):
+        frame = image if image.mode == 'P' else image.convert('RGB').quantize()
+
+        # The first frame also provides the header: the canvas size, a global palette and the loop count
+        if self.num_frames_written == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop})
+            self.fp.write(b''.join(header))
+
+        for data in GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True):
+            self.fp.write(data)
+
+        self.num_frames_written += 1
+
+    # Finish the animation with the `GIF` trailer
+    def close(self):
+        self.fp.write(b';')
+
+
+# An `ApngWriter` encodes an animated `PNG`, storing every frame as 'RGB' data.
+# Unlike `GIF`, an animated `PNG` declares its number of frames up front, so `num_frames` is required.
+#
+# Specification: https://wiki.mozilla.org/APNG_Specification
+
+class ApngWriter(AnimationWriter):
+
+    def __init__(self, fp, num_frames, duration=100, loop=0, compress_level=6):
+        super().__init__(fp, duration, loop)
+        self.num_frames = num_frames
+        self.compress_level = compress_level
+
+        # Frame control and frame data chunks share one running sequence number
+        self.sequence_number = 0
+
+    # Return the next sequence number, packed
+    def _next_sequence_number(self):
+        packed = struct.pack('>I', self.sequence_number)
+        self.sequence_number += 1
+        return packed
+
+    # Encode and write a single frame
+    def write_frame(self, image):
+        rgb = np.asarray(image.convert('RGB'))
+        height, width = rgb.shape[:2]
+
+        # The first frame also provides the header: the canvas size and the animation control
+        if self.num_frames_written == 0:
+            self.fp.write(PngWriter.SIGNATURE)
+            # Width, height, bit depth of 8, color type of 2 (RGB), default compression, filter and interlace
+            self.fp.write(pack_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+            self.fp.write(pack_png_chunk(b'acTL', struct.pack('>II', self.num_frames, self.loop)))
+
+        # Frame control: size, offset, delay as the fraction `duration / 1000` of a second,
+        # no disposal and no blending - every frame replaces the canvas entirely
+        self.fp.write(pack_png_chunk(b'fcTL', self._next_sequence_number() +
+            struct.pack('>IIIIHHBB', width, height, 0, 0, self.duration, 1000, 0, 0)))
+
+        # Every row of image data is prefixed with its filter type, `0` (None)
+        rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+        rows[:, 1:] = rgb.reshape(height, width * 3)
+        data = zlib.compress(rows, self.compress_level)
+
+        # The first frame is stored as regular image data, so that viewers without
+        # animation support still show it. Later frames are stored as frame data
+        if self.num_frames_written == 0:
+            self.fp.write(pack_png_chunk(b'IDAT', data))
+        else:
+            self.fp.write(pack_png_chunk(b'fdAT', self._next_sequence_number() + data))
+
+        self.num_frames_written += 1
+
+    # Finish the animation with the `PNG` trailer
+    def close(self):
+        if self.num_frames_written != self.num_frames:
+            raise ValueError(f'Declared {self.num_frames} frames, but wrote {self.num_frames_written}')
+
+        self.fp.write(pack_png_chunk(b'IEND', b''))
@@ -0,0 +1,91 @@
+import numpy as np
+
+# A `Brush` is the shape stamped at every point of a stroke: every `x` of a plotted function, every step
+# of a line segment or of a curve. Its shape is a mask - a boolean array of odd height and width, centered
+# on the point stamped, that is `True` wherever the brush paints.
+#
+# There are three built-in shapes, each of a size `k`:
+#   'square': Every pixel of a square of side length `2k + 1`. This is the brush of `brush_size`
+#   'disc': Every pixel within `k + 1/2` pixels of the center
+#   'diamond': Every pixel within `k` steps of the center, along `x` and `y` combined
+# Any other shape can be painted from a bitmap, see `from_bitmap`.
+#
+# The mask of a built-in shape is computed once per shape and size, and shared by every stroke:
+#   image.draw_single_variable_function(func, brush_size=10, brush='disc')
+#   image.connect_all_dots(brush=Brush.get('diamond', 4))
+#
+# A square brush is clamped to the image, like squares always have been: whatever part of it lies past the
+# edge of the image is reserved along the edge instead. Every other brush is clipped to the image.
+
+class Brush:
+
+    SHAPES = ('square', 'disc', 'diamond')
+
+    # `Brush._cache` is of the type `{(str, int) : Brush}`, every built-in brush created so far
+    _cache = {}
+
+    # Instantiate a `Brush` from its mask, see `from_bitmap` to paint one from any bitmap
+    def __init__(self, mask, shape='custom'):
+        mask = np.array(mask, dtype=bool)
+        if mask.ndim != 2 or mask.shape[0] % 2 == 0 or mask.shape[1] % 2 == 0:
+            raise ValueError(f'A brush mask must be a 2D array of odd height and width, not of shape {mask.shape}')
+        if not mask.any():
+            raise ValueError('A brush mask must paint at least one pixel')
+        mask.flags.writeable = False
+
+        self.mask = mask
+        self.shape = shape
+
+        # How far the mask reaches from its center along `y` and `x`, and along either
+        self.k_y, self.k_x = mask.shape[0] // 2, mask.shape[1] // 2
+        self.k = max(self.k_y, self.k_x)
+
+        # `self.columns` is of the type `[(int, np.ndarray)]`: for every column of the mask that paints any pixel,
+        # its offset `dx` from the center and the rows it paints, indexing `-k_y, ..., k_y` from 0
+        self.columns = [(dx - self.k_x, np.flatnonzero(mask[:, dx])) for dx in range(mask.shape[1]) if mask[:, dx].any()]
+
+    def __repr__(self):
+        return f'Brush({self.shape!r}, {self.mask.shape[1]}x{self.mask.shape[0]})'
+
+    # Return the built-in brush of `shape` and size `k`, creating its mask only the first time it is asked for.
+    # `shape` may also be a `Brush` already, which is returned as is
+    @classmethod
+    def get(cls, shape, k):
+        if isinstance(shape, Brush):
+            return shape
+        if shape not in cls.SHAPES:
+            raise ValueError(f'Unknown brush shape {shape!r}, expected one of {list(cls.SHAPES)} or a Brush')
+
+        k = int(k)
+        if k < 0:
+            raise ValueError(f'A brush size must not be negative, not {k}')
+
+        key = (shape, k)
+        if key not in cls._cache:
+            dys, dxs = np.ogrid[-k:k + 1, -k:k + 1]
+            if shape == 'square':
+                mask = np.ones((2 * k + 1, 2 * k + 1), dtype=bool)
+            elif shape == 'disc':
+                # `dx^2 + dy^2 <= k^2 + k` is `dx^2 + dy^2 < (k + 1/2)^2` for integers
+                mask = dxs ** 2 + dys ** 2 <= k * (k + 1)
+            else:
+                mask = np.abs(dxs) + np.abs(dys) <= k
+            cls._cache[key] = Brush(mask, shape)
+        return cls._cache[key]
+
+    # Instantiate a `Brush` from any 2D bitmap, such as an array or a greyscale `PIL.Image`.
+    # Every non-zero pixel is painted. The brush is centered on the center of the bitmap: a bitmap of even
+    # height or width is padded by a blank row or column at the bottom or right
+    @classmethod
+    def from_bitmap(cls, bitmap):
+        mask = np.asarray(bitmap) != 0
+        if mask.ndim != 2:
+            raise ValueError(f'A brush bitmap must be 2D, not of shape {mask.shape}')
+        return cls(np.pad(mask, ((0, 1 - mask.shape[0] % 2), (0, 1 - mask.shape[1] % 2))))
+
+    def is_square(self):
+        return self.shape == 'square'
+
+    # Return the number of pixels the brush paints
+    def get_num_pixels(self):
+        return int(np.count_nonzero(self.mask))
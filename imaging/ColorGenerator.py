@@ -1,12 +1,15 @@
 import random
 
+import numpy as np
+
 # A `ColorGenerator` provides colors upon request.
 # A color is a `bytearray` of three elements, one per RGB channel: red, green, blue.
 #
 # `ColorGenerator` is at the top of an inheritance hierarchy. Derivative instances
 # generate colors under different policies. This allows for artistic control.
-# Every `ColorGenerator` has an `_internal_function` - a lambda that enforces the policy
-# of a respective `ColorGenerator`.
+# Every `ColorGenerator` has an `_internal_function` - a bound method that enforces the policy
+# of a respective `ColorGenerator`. Unlike a lambda, a bound method survives being copied or
+# pickled (say, to a worker process) along with its `ColorGenerator`.
 # The policy for the parent-level `ColorGenerator` is this: always generate the color black.
 #
 # Lastly, being at the top of the inheritance hierarchy, `ColorGenerator` provides
@@ -20,50 +23,56 @@ class ColorGenerator:
     RGB_MIN = 0
     RGB_MAX = 255
 
+    # The number of colors generated so far, for `Instrumentation`
+    num_colors_generated = 0
+
     def __init__(self, rgb_rel_min=RGB_MIN, rgb_rel_max=RGB_MAX):
         # Sanitize input and optionally limit the range of band data for this instance
         self.rgb_rel_min = min(max(rgb_rel_min, self.RGB_MIN), self.RGB_MAX)
         self.rgb_rel_max = min(max(rgb_rel_max, self.RGB_MIN), self.RGB_MAX)
 
         # Set policy
-        always_generate_black = lambda : self.int_to_grey_rgb(0)
-        self._internal_function = always_generate_black
+        self._internal_function = self._always_generate_black
+
+    # Enforce the policy of the parent-level `ColorGenerator`
+    def _always_generate_black(self):
+        return self.int_to_grey_rgb(0)
 
     # Invoke the internal function
     # NOTE: Every `ColorGenerator` derivative will also call this, but with a
     # different `_internal_function`, and thus, a different policy
     def generate_color(self):
+        self.num_colors_generated += 1
         return self._internal_function()
 
+    # Invoke the internal function `n` times and return the colors as one compact
+    # `(n, 3)` array of `uint8` channel data, one row per color
+    # NOTE: Derivatives may override this with a faster, bulk version of their policy
+    def generate_colors(self, n):
+        colors = b''.join(self.generate_color() for _ in range(n))
+        return np.frombuffer(colors, dtype=np.uint8).reshape(n, 3)
+
     # Utility functions:
-    
-    # Transform one integer channel value into a single hex component.
-    # A hex component is a byte of hex data, without the prepended '0x'.
-    # Ex: 255 -> ff
-    # Ex: 5 -> 05
-    def _int_to_hex_component(self, i: int):
-        # An integer of value < 16 will be represented as `0x{foo}`, where `len(foo)` == 1.
-        # This must be detected and accounted for.
-        _SINGLE_HEX_THRESHOLD = 16
-
-        # In either case, remove the prepended '0x' so that we can combine rgb into one string
-        if i < _SINGLE_HEX_THRESHOLD:
-            # Ensure a two-digit hex component is returned
-            return '0' + hex(i)[2:]
-        else:
-            return hex(i)[2:]
 
     # Transform three integer channel values into a single `bytearray`.
-    # Ex: (255, 0, 15) -> \xff\x00\x0e
+    # Ex: (255, 0, 15) -> \xff\x00\x0f
     def ints_to_rgb(self, r: int, g: int, b: int):
         # Maintain range / sanitize input for each channel
         r = min(max(r, self.rgb_rel_min), self.rgb_rel_max)
         g = min(max(g, self.rgb_rel_min), self.rgb_rel_max)
         b = min(max(b, self.rgb_rel_min), self.rgb_rel_max)
 
-        # Construct r, g, and b and represent the three channels as a `bytearray`
-        rgb = self._int_to_hex_component(r) + self._int_to_hex_component(g) + self._int_to_hex_component(b)
-        return bytearray.fromhex(rgb)
+        # Pack the three channels directly as bytes
+        return bytearray((r, g, b))
+
+    # Transform arrays of integer channel values into an `(n, 3)` array of colors, one row per color.
+    # This is the bulk form of `ints_to_rgb`.
+    # Ex: ([255, 0], [0, 0], [15, 16]) -> [[255, 0, 15], [0, 0, 16]]
+    def ints_to_rgbs(self, rs, gs, bs):
+        channels = np.stack((rs, gs, bs), axis=-1)
+
+        # Maintain range / sanitize input for each channel
+        return np.clip(channels, self.rgb_rel_min, self.rgb_rel_max).astype(np.uint8)
 
     # Transform an integer intensity into a single `bytearray` representing a grey color.
     # NOTE: By definition, greys have equal channel values for r, g, b.
@@ -0,0 +1,119 @@
+import base64
+import json
+
+import numpy as np
+
+from imaging.Brush import Brush
+from imaging.Framebuffer import as_color_array
+
+# A `CommandBuffer` records the drawing operations of a deferred `CustomImage`, in order,
+# instead of writing their pixels right away.
+#
+# Every drawing operation of a `CustomImage` - backgrounds, regions, slices, function plots,
+# dots and segments - boils down to one of four commands:
+#   'rect': Reserve every pixel within a rectangle as a single color
+#   'squares': Reserve a square of side length `2k + 1` around each of many centers,
+#              with either a single color or one color per square
+#   'stamps': Stamp any other `Brush` at each of many centers, with either a single color or one color per stamp
+#   'mask': Reserve the pixels of a rectangle wherever a mask is set, each as its own color
+#
+# Colors are generated when a command is recorded, so a recorded scene no longer depends on its
+# `ColorGenerator` (or on `random`) and re-renders identically. A `CommandBuffer` can be
+# serialized to JSON for that purpose.
+
+class CommandBuffer:
+
+    def __init__(self):
+        # `self.commands` is of the type `[(str, ...)]`, in the order the commands were recorded:
+        #   ('rect', x_min, x_max, y_min, y_max, color)
+        #   ('squares', centers_x, centers_y, k, colors)
+        #   ('stamps', centers_x, centers_y, brush, colors)
+        #   ('mask', x_min, y_min, mask, colors)
+        self.commands = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __iter__(self):
+        return iter(self.commands)
+
+    # Record a rectangle, half-open in both `x` and `y`, reserved as a single color
+    def record_rect(self, x_min, x_max, y_min, y_max, color):
+        self.commands.append(('rect', int(x_min), int(x_max), int(y_min), int(y_max), as_color_array(color).copy()))
+
+    # Record a square of side length `2k + 1` around each center, see `CustomImage._reserve_stamps`
+    def record_squares(self, centers_x, centers_y, k, colors):
+        self.commands.append(('squares', np.array(centers_x, dtype=np.int64), np.array(centers_y, dtype=np.int64),
+            int(k), as_color_array(colors).copy()))
+
+    # Stamp `brush` at each center, see `CustomImage._reserve_stamps`. Square brushes are recorded as squares
+    def record_stamps(self, centers_x, centers_y, brush, colors):
+        if brush.is_square():
+            self.record_squares(centers_x, centers_y, brush.k, colors)
+            return
+        self.commands.append(('stamps', np.array(centers_x, dtype=np.int64), np.array(centers_y, dtype=np.int64),
+            brush, as_color_array(colors).copy()))
+
+    # Record the pixels of a rectangle, with top-left corner `(x_min, y_min)`, reserved wherever the boolean array
+    # `mask` is `True`, each as its own color: `colors` is an `(h, w, 3)` array, of the same shape as the rectangle
+    def record_mask(self, x_min, y_min, mask, colors):
+        self.commands.append(('mask', int(x_min), int(y_min), np.array(mask, dtype=bool),
+            as_color_array(colors).reshape(mask.shape + (3,)).copy()))
+
+    # Represent every command as a `dict` of plain Python values.
+    # A mask covers up to every pixel of the image, so it is packed into bits and the colors of the pixels it
+    # covers into bytes, both encoded as base64
+    def to_list(self):
+        serialized = []
+        for command in self.commands:
+            if command[0] == 'rect':
+                _, x_min, x_max, y_min, y_max, color = command
+                serialized.append({'op': 'rect', 'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max,
+                    'color': color.tolist()})
+            elif command[0] == 'squares':
+                _, centers_x, centers_y, k, colors = command
+                serialized.append({'op': 'squares', 'centers_x': centers_x.tolist(), 'centers_y': centers_y.tolist(),
+                    'k': k, 'colors': colors.tolist()})
+            elif command[0] == 'mask':
+                _, x_min, y_min, mask, colors = command
+                serialized.append({'op': 'mask', 'x_min': x_min, 'y_min': y_min, 'shape': list(mask.shape),
+                    'mask': base64.b64encode(np.packbits(mask).tobytes()).decode('ascii'),
+                    'colors': base64.b64encode(colors[mask].tobytes()).decode('ascii')})
+            else:
+                _, centers_x, centers_y, brush, colors = command
+                serialized.append({'op': 'stamps', 'centers_x': centers_x.tolist(), 'centers_y': centers_y.tolist(),
+                    'shape': brush.shape, 'mask': brush.mask.astype(int).tolist(), 'colors': colors.tolist()})
+        return serialized
+
+    # Instantiate a `CommandBuffer` from the output of `to_list`
+    @classmethod
+    def from_list(cls, serialized):
+        buffer = cls()
+        for command in serialized:
+            if command['op'] == 'rect':
+                buffer.record_rect(command['x_min'], command['x_max'], command['y_min'], command['y_max'],
+                    command['color'])
+            elif command['op'] == 'squares':
+                buffer.record_squares(command['centers_x'], command['centers_y'], command['k'], command['colors'])
+            elif command['op'] == 'stamps':
+                brush = Brush(command['mask'], command['shape'])
+                buffer.record_stamps(command['centers_x'], command['centers_y'], brush, command['colors'])
+            elif command['op'] == 'mask':
+                height, width = command['shape']
+                bits = np.frombuffer(base64.b64decode(command['mask']), dtype=np.uint8)
+                mask = np.unpackbits(bits, count=height * width).astype(bool).reshape(height, width)
+                colors = np.zeros((height, width, 3), dtype=np.uint8)
+                colors[mask] = np.frombuffer(base64.b64decode(command['colors']), dtype=np.uint8).reshape(-1, 3)
+                buffer.record_mask(command['x_min'], command['y_min'], mask, colors)
+            else:
+                raise ValueError(f'Unknown command {command["op"]!r}')
+        return buffer
+
+    # Serialize every command as JSON
+    def to_json(self):
+        return json.dumps(self.to_list())
+
+    # Instantiate a `CommandBuffer` from the output of `to_json`
+    @classmethod
+    def from_json(cls, serialized):
+        return cls.from_list(json.loads(serialized))
@@ -0,0 +1,93 @@
+import numpy as np
+
+# A `CurveSampler` picks the points at which to sample a parametric curve `(x(t), y(t))`, so that joining
+# consecutive samples with straight line segments traces the curve to within `tolerance` pixels.
+#
+# Sampling starts out even, with `num_initial_samples` intervals across `[t_min, t_max]`. Every interval is then
+# halved for as long as either:
+#   1) The curve strays from the segment joining its ends: the sample at the middle of the interval lies more
+#      than `tolerance` pixels from the middle of the segment. This follows the curvature of the curve
+#   2) The segment is longer than `max_segment_length` pixels, and within `bounds` - the image. This bounds the
+#      screen distance between samples, so that no detail narrower than a few intervals slips through undetected
+# Flat stretches of a curve thus take few samples, and tight bends or fast stretches many.
+#
+# An interval whose curve still strays after `max_depth` halvings is taken to be a discontinuity, such as the
+# jump of `tan(t)`, and its ends are not joined - unless they lie within `max_segment_length` pixels of each other.
+# Neither is a sample joined to anything if it is undefined (not finite).
+
+class CurveSampler:
+
+    def __init__(self, tolerance=0.5, max_segment_length=16, num_initial_samples=64, max_depth=20,
+            max_samples=2 ** 20):
+        self.tolerance = tolerance
+        self.max_segment_length = max_segment_length
+        self.num_initial_samples = num_initial_samples
+        self.max_depth = max_depth
+        self.max_samples = max_samples
+
+    # Sample `func`, which maps `t` to `(x, y)`, across `[t_min, t_max]`.
+    # If `vectorized` is `True`, `func` is invoked with an array of `t` and must return arrays of `x` and `y`.
+    # `bounds` is the `(x_min, x_max, y_min, y_max)` that segments are drawn within. Segments elsewhere are
+    # only sampled as densely as their curvature requires.
+    #
+    # Return `(xs, ys, joined)`: the samples in order of `t`, and whether each sample is to be joined to the next
+    def sample(self, func, t_min, t_max, bounds, vectorized=False):
+        x_min, x_max, y_min, y_max = bounds
+        ts = np.linspace(t_min, t_max, self.num_initial_samples + 1)
+        xs, ys = self._evaluate(func, ts, vectorized)
+
+        # Interval `i` lies between samples `i` and `i + 1`. Only intervals just halved are checked again
+        active = np.ones(len(ts) - 1, dtype=bool)
+        broken = np.zeros(len(ts) - 1, dtype=bool)
+
+        for depth in range(self.max_depth + 1):
+            starts = np.flatnonzero(active)
+            if len(starts) == 0:
+                break
+            ends = starts + 1
+
+            t_mids = (ts[starts] + ts[ends]) / 2
+            x_mids, y_mids = self._evaluate(func, t_mids, vectorized)
+
+            # Undefined samples compare as neither straying nor not, and are halved towards the edge of the
+            # defined part of the curve - unless the interval is undefined throughout
+            with np.errstate(invalid='ignore'):
+                deviations = np.hypot(x_mids - (xs[starts] + xs[ends]) / 2, y_mids - (ys[starts] + ys[ends]) / 2)
+                lengths = np.hypot(xs[ends] - xs[starts], ys[ends] - ys[starts])
+                strays = ~(deviations <= self.tolerance)
+                in_bounds = (np.maximum(xs[starts], xs[ends]) >= x_min) & (np.minimum(xs[starts], xs[ends]) <= x_max) & \
+                    (np.maximum(ys[starts], ys[ends]) >= y_min) & (np.minimum(ys[starts], ys[ends]) <= y_max)
+                refine = strays | (in_bounds & (lengths > self.max_segment_length))
+            refine &= np.isfinite(xs[starts] + ys[starts]) | np.isfinite(xs[ends] + ys[ends]) | \
+                np.isfinite(x_mids + y_mids)
+
+            # Give up on intervals that keep straying
+            if depth == self.max_depth or len(ts) + np.count_nonzero(refine) > self.max_samples:
+                with np.errstate(invalid='ignore'):
+                    broken[starts[strays & ~(lengths <= self.max_segment_length)]] = True
+                break
+
+            # Insert the middle of every interval halved. Both of its halves are checked next
+            halved = np.zeros(len(ts) - 1, dtype=bool)
+            halved[starts[refine]] = True
+            positions = starts[refine] + 1
+            ts = np.insert(ts, positions, t_mids[refine])
+            xs = np.insert(xs, positions, x_mids[refine])
+            ys = np.insert(ys, positions, y_mids[refine])
+
+            counts = 1 + halved
+            active = np.repeat(halved, counts)
+            broken = np.repeat(broken, counts)
+
+        joined = ~broken & np.isfinite(xs[:-1] + ys[:-1]) & np.isfinite(xs[1:] + ys[1:])
+        return xs, ys, joined
+
+    # Evaluate `func` at every `t` of `ts`. Return `(xs, ys)` as `float` arrays
+    def _evaluate(self, func, ts, vectorized):
+        if vectorized:
+            xs, ys = func(ts)
+            return (np.broadcast_to(np.asarray(xs, dtype=float), ts.shape).copy(),
+                np.broadcast_to(np.asarray(ys, dtype=float), ts.shape).copy())
+
+        points = np.array([func(t) for t in ts.tolist()], dtype=float).reshape(len(ts), 2)
+        return points[:, 0].copy(), points[:, 1].copy()
@@ -1,24 +1,49 @@
+import copy
+import io
+import json
+import os
 import random
 import math
 
-from PIL import Image   # Only used for `bytes -> `JPEG` transformation
-
-from imaging.ReservablePixel import ReservablePixel
+import numpy as np
+from PIL import Image   # Only used for encoding and decoding
+
+from imaging.exceptions import EmptyColorPoolError, UnreservedPixelError
+from imaging.Brush import Brush
+from imaging.Framebuffer import Framebuffer, as_color_array
+from imaging.SharedFramebuffer import SharedFramebuffer
+from imaging.TiledFramebuffer import TiledFramebuffer
+from imaging.PaletteFramebuffer import PaletteFramebuffer
+from imaging.PaletteQuantizer import PaletteQuantizer
+from imaging.ImageWriter import PngWriter, PpmWriter
+from imaging.ExportCache import ExportCache
+from imaging.CommandBuffer import CommandBuffer
+from imaging.CurveSampler import CurveSampler
+from imaging.DensityMap import DensityMap
+from imaging.Instrumentation import instrumented
+from imaging.Rasterizer import Rasterizer
 from imaging.RectangularRegion import RectangularRegion
+from imaging.RegionStore import RegionStore
+from imaging.SliceStore import SliceStore
 from imaging.ColorGenerator import ColorGenerator
+from imaging.PositionalColorGenerator import PositionalColorGenerator
+from imaging.RingColorGenerator import RingColorGenerator
 
-# A `CustomImage` is a wrapper object around a two-dimensional list of `ReservablePixel`s.
-# The `CustomImage` can be manipulated by reserving `ReservablePixel`s - in other words,
-# by assigning a color to a `ReservablePixel`.
+# A `CustomImage` is a wrapper object around a `Framebuffer` of pixels.
+# The `CustomImage` can be manipulated by reserving pixels - in other words,
+# by assigning a color to a pixel.
 #
 # Image manipulation can be done in four ways:
 #   1) Dividing a `CustomImage` into `RectangularRegion`s
-#   2) Plotting any single-variable function across the `CustomImage`
-#   3) Placing points (dots) on the `CustomImage`
-#   4) Placing vertical lines (slices) on the `CustomImage`
+#   2) Plotting any single-variable function, or parametric or polar curve, across the `CustomImage`
+#   3) Placing points (dots) on the `CustomImage`, or plotting whole point clouds by density
+#   4) Placing vertical or horizontal lines (slices) on the `CustomImage`
+#
+# A `CustomImage` starts out blank, or as an existing image loaded via `from_image`.
 #
 # Once all image manipuation is complete, a `CustomImage` can be realized as
-# a `JPEG` via `PIL.Image.frombytes()`
+# a `PIL.Image` via `PIL.Image.frombuffer()`, and from there saved or encoded as
+# a `JPEG`, `PNG`, etc. No display is required unless the image is shown.
 
 # Reservation visualization:
 #
@@ -32,38 +57,108 @@ from imaging.ColorGenerator import ColorGenerator
 
 class CustomImage:
 
+    # Pixels can be stored in different ways, each suited to different kinds of images:
+    #   'dense': One contiguous block of pixel data. Fast for any image
+    #   'tiled': Tiles that stay compressed while they hold a single color. Suited to very large,
+    #            mostly solid images
+    #   'palette': One palette index per pixel. Suited to images drawn from a small set of colors,
+    #              such as the pool of a `RingColorGenerator`
+    STORAGES = {
+        'dense': Framebuffer,
+        'tiled': TiledFramebuffer,
+        'palette': PaletteFramebuffer,
+    }
+
+    # Formats that can encode a palette image directly. Other formats receive 'RGB' data
+    PALETTE_FORMATS = {'PNG', 'GIF', 'BMP', 'TIFF'}
+
+    # The number of colors drawn from a `ColorGenerator` to color densities with, see `reserve_density_map`
+    DENSITY_LEVELS = 256
+
+    # Formats that can be encoded as a stream of rows, see `iter_encoded`
+    STREAM_WRITERS = {
+        'PNG': PngWriter,
+        'PPM': PpmWriter,
+    }
+
     # Provide dimensions and a `ColorGenerator` reference to instantiate a `CustomImage`
-    def __init__(self, x_max, y_max, color_generator):
-        # Populate image dimensions and underlying `ReservablePixel`s
+    # The optional parameter `storage` picks how pixels are stored - see `STORAGES`
+    #
+    # The optional parameter `deferred` records drawing operations in a `CommandBuffer` instead of
+    # reserving pixels right away. Commands are rasterized last to first upon `flush`, so that every pixel
+    # is written exactly once, by the last command to cover it - overdrawn pixels are never written.
+    #
+    # The optional parameter `processes` rasterizes a deferred image across that many processes, each
+    # rasterizing one horizontal band of the image at a time - see `Rasterizer`. The result is identical
+    # to rasterizing in a single process. Only 'dense' storage is rasterized in parallel: its pixels are
+    # kept in a `SharedFramebuffer` for the life of the image, which every process writes into directly.
+    #
+    # The optional parameter `instrumentation` takes an `Instrumentation`, which records what every
+    # operation on the image costs. It can also be attached (or removed) at any time after.
+    #
+    # The optional parameter `seed`, an integer, seeds the random number generator of the image, `self.rng`.
+    # Every random operation draws from it, in bulk, so the same seed always renders the same image.
+    # Without a `seed`, one is drawn from the `random` module - seeding `random` beforehand works, too.
+    def __init__(self, x_max, y_max, color_generator, storage='dense', deferred=False, processes=1,
+            instrumentation=None, seed=None):
+        if storage not in self.STORAGES:
+            raise ValueError(f'Unknown storage {storage!r}, expected one of {list(self.STORAGES)}')
+
+        # Populate image dimensions and underlying pixel storage
         self.size = (x_max, y_max)
-        self.reservations = [[ReservablePixel() for _ in range(x_max)] for _ in range(y_max)]
-        self.final_image_byte_data = b''
+        if storage == 'dense' and processes > 1:
+            self.framebuffer = SharedFramebuffer(x_max, y_max)
+        else:
+            self.framebuffer = self.STORAGES[storage](x_max, y_max)
 
         # Save reference to the provided `ColorGenerator`
         self.cg = color_generator
 
-        # Populate `PIL`-specific arguments for eventual `bytes -> JPEG` construction
-        self.mode = 'RGB'
-        self.decoder_name = 'raw'
-        self.decoder_args = (self.mode, 0, 1)
+        # Order a palette like the pool of the `RingColorGenerator` it is drawn from
+        if storage == 'palette' and isinstance(color_generator, RingColorGenerator):
+            self.framebuffer.add_colors_to_palette(color_generator.pool)
+
+        # Allocate the `CommandBuffer` of a deferred image, and track how much of it has been rasterized
+        self.commands = CommandBuffer() if deferred else None
+        self.num_commands_rasterized = 0
+
+        # Allocate the `Rasterizer` that turns squares and commands into pixels
+        self.rasterizer = Rasterizer(x_max, y_max)
+        self.processes = processes
+
+        # Save reference to the optional `Instrumentation`
+        self.instrumentation = instrumentation
+
+        # Allocate the random number generator, from a `SeedSequence` that substreams are spawned from
+        self.seed_sequence = np.random.SeedSequence(random.getrandbits(128) if seed is None else seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+
+        # Allocate the `ExportCache` that keeps exports in sync with the pixels, so that exporting again
+        # after an edit only redoes the strips of the image that the edit changed
+        self.export_cache = ExportCache(self.framebuffer)
 
         # Allocate underlying data structures for image manipulation:
 
-        # An image can be manipulated through `RectangularRegions`
+        # An image can be manipulated through `RectangularRegions`, held in a `RegionStore`
         # By default, there is one `RectangularRegion` over the entire image.
-        self.rec_regions = [RectangularRegion(0, x_max, 0, y_max)]
+        self.rec_regions = RegionStore(0, x_max, 0, y_max)
 
         # An image can be manipulated through the plotting of points, referred to as `dot`s
         # A single `dot` is simply a tuple of coordinates: `(x, y)`
         self.dots = [] 
 
-        # An image can be manipulated through the plotting of vertical lines, referred to as slices
-
-        # `self.vertical_slices` is of the type `{int : [(float, float)]}`
-        # Each key `x` values to a `[(y_min, y_max)]`
-        # This allows for multiple, non-contiguous `slice`s per `x` coordinate
-        self.vertical_slices = {}
+        # An image can be manipulated through the plotting of vertical and horizontal lines, referred to as slices
+        # Each is held in a `SliceStore`, which allows for multiple, non-contiguous slices per `x` (or `y`)
+        # coordinate. Vertical slices span `[y_min, y_max)` at an `x`, horizontal ones `[x_min, x_max)` at a `y`
+        self.vertical_slices = SliceStore()
+        self.horizontal_slices = SliceStore()
     
+    # Return an independent copy of a `CustomImage`.
+    # Its pixels, image manipulation data structures and `ColorGenerator` are all copied.
+    @instrumented
+    def copy(self):
+        return copy.deepcopy(self)
+
     # Internal getters and utilities
 
     def _get_x_max(self):
@@ -72,50 +167,211 @@ class CustomImage:
     def _get_y_max(self):
         return self.size[1]
 
-    # The internal `ReservablePixel`s are stored "upside down" compared to a cartesian grid.
+    # The internal pixels are stored "upside down" compared to a cartesian grid.
     # Perform the translation to allow for normal cartesian plotting
     def _translate_y_coord_cartesian(self, y):
         return self._get_y_max() - 1 - y
 
-    # Image construction
+    # Random number generation
 
-    # Transform all `ReservablePixel`s into a single `bytearray`
-    def _construct_final_byte_string(self):
-        # Extreme speed-up achieved via:
-        # https://www.guyrutenberg.com/2020/04/04/fast-bytes-concatenation-in-python/
+    # Return a random number generator for substream `index` of the seed of this image - for the `index`th
+    # worker process, frame, etc. Substreams are independent of one another and of `self.rng`, and the same
+    # seed and `index` always give the same substream, no matter which process asks for it, or in which order
+    def get_substream_rng(self, index):
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy,
+            spawn_key=(*self.seed_sequence.spawn_key, index))
+        return np.random.default_rng(seed_sequence)
 
-        # TODO error handling for when not all pixels are reserved
+    # Draw every further random number from substream `index`, see `get_substream_rng`
+    def use_substream(self, index):
+        self.rng = self.get_substream_rng(index)
 
-        # Allocate list to aggregate into
-        byte_array = []
+    # Deferred rendering
 
-        # Append all `ReservablePixel`s
-        for j in range(self._get_y_max()):
-            for i in range(self._get_x_max()):
-                byte_array.append(self.reservations[j][i].get_rgb_byte_data())
+    # Return `True` if drawing operations are recorded instead of reserved right away
+    def is_deferred(self):
+        return self.commands is not None
 
-        # Concatenate all bytes
-        self.final_image_byte_data = b''.join(byte_array)
+    # Rasterize every command recorded since the last `flush` into the framebuffer.
+    # This is a no-op for an image that is not deferred.
+    # The optional parameter `processes` overrides the number of processes given upon instantiation.
+    @instrumented
+    def flush(self, processes=None):
+        if not self.is_deferred():
+            return
+
+        pending = self.commands.commands[self.num_commands_rasterized:]
+        self.num_commands_rasterized = len(self.commands)
+        if not pending:
+            return
+
+        # Bands can only be rasterized in parallel into plain channel data. Pixels that are not yet in shared
+        # memory are moved there once, and stay there for every later `flush`
+        processes = self.processes if processes is None else processes
+        if processes > 1 and type(self.framebuffer) is Framebuffer:
+            self.framebuffer = self.export_cache.framebuffer = SharedFramebuffer.from_framebuffer(self.framebuffer)
+        if processes > 1 and isinstance(self.framebuffer, SharedFramebuffer):
+            self.rasterizer.rasterize_parallel(pending, self.framebuffer, processes)
+        else:
+            self.rasterizer.rasterize(pending, self.framebuffer)
+
+    # Serialize a deferred `CustomImage` - its size and every recorded command - as JSON
+    @instrumented
+    def to_json(self):
+        if not self.is_deferred():
+            raise ValueError('Only a deferred CustomImage records its drawing operations')
+
+        return json.dumps({'size': list(self.size), 'commands': self.commands.to_list()})
+
+    # Instantiate a deferred `CustomImage` from the output of `to_json`.
+    # The recorded colors are replayed as they are, so `color_generator` is only used for further drawing
+    @classmethod
+    def from_json(cls, serialized, color_generator=None, storage='dense', processes=1):
+        scene = json.loads(serialized)
+        image = cls(*scene['size'], color_generator, storage=storage, deferred=True, processes=processes)
+        image.commands = CommandBuffer.from_list(scene['commands'])
+        return image
+
+    # Instantiate a `CustomImage` from an existing image, with every pixel reserved, so that drawing
+    # operations layer on top of it. `source` is a path or file object of any format `PIL` can open,
+    # or a `PIL.Image`. Any further options, such as `storage`, are passed on to `CustomImage`
+    #
+    # The decoded channel data is loaded straight into the framebuffer: `PIL` keeps 'RGB' images padded
+    # to four bytes per pixel, so they are copied out of `PIL` once, and never again after that.
+    @classmethod
+    def from_image(cls, source, color_generator=None, **options):
+        pil_image = source if isinstance(source, Image.Image) else Image.open(source)
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+
+        image = cls(*pil_image.size, color_generator, **options)
+        image.framebuffer.load_rgb_array(np.asarray(pil_image))
+        return image
+
+    # Image construction
+
+    # Turn a `CustomImage` into a `PIL.Image`
+    @instrumented
+    def to_pil(self):
+        # Every pixel must be reserved before the image can be constructed
+        if not self.are_all_pixels_reserved():
+            raise UnreservedPixelError(self._describe_unreserved_pixels())
+
+        # The framebuffer is already laid out as final image data, so it is handed
+        # to `PIL` directly instead of being joined into an intermediate `bytes` object
+        return self.framebuffer.to_pil()
+
+    # Encode a `CustomImage` and return the encoded `bytes`
+    # Ex: `my_image.to_bytes('PNG')`
+    @instrumented
+    def to_bytes(self, format='PNG', quality=None, **params):
+        stream = io.BytesIO()
+        self.save(stream, format=format, quality=quality, **params)
+        return stream.getvalue()
+
+    # Encode a `CustomImage` and write it to `path`, which may also be a file object.
+    # If `format` is not specified, it is inferred from the extension of `path`.
+    # `quality` only applies to lossy formats such as `JPEG`. Further options, such as `optimize`,
+    # are passed on to `PIL`.
+    @instrumented
+    def save(self, path, format=None, quality=None, **params):
+        if quality is not None:
+            params['quality'] = quality
+
+        # Infer the format from the extension of `path`, like `PIL` does
+        if format is None and isinstance(path, (str, os.PathLike)):
+            format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+
+        # A `PNG` is encoded by the `ExportCache`, which only encodes again what changed since the last export.
+        # It only takes a `compress_level`; a `PNG` with any other option is encoded by `PIL`
+        if (format or '').upper() == 'PNG' and set(params) <= {'compress_level'}:
+            if not self.are_all_pixels_reserved():
+                raise UnreservedPixelError(self._describe_unreserved_pixels())
+
+            data = self.export_cache.get_png(**params)
+            if isinstance(path, (str, os.PathLike)):
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+            else:
+                path.write(data)
+            return
+
+        # A palette image is expanded into 'RGB' data only for formats that require it
+        image = self.to_pil()
+        if image.mode == 'P' and (format or '').upper() not in self.PALETTE_FORMATS:
+            image = image.convert('RGB')
+
+        image.save(path, format=format, **params)
+
+    # Encode a `CustomImage` strip by strip, and yield the encoded `bytes` as soon as each strip is encoded -
+    # to send over HTTP as they are produced, say. Only a single strip of `strip_height` rows is expanded
+    # into channel data at a time, and neither the image nor the encoded image is ever held as a whole.
+    # `format` is one of `STREAM_WRITERS`. Further options, such as `compress_level`, are passed on to its writer.
+    def iter_encoded(self, format='PNG', strip_height=64, **params):
+        if format.upper() not in self.STREAM_WRITERS:
+            raise ValueError(f'Cannot stream {format!r}, expected one of {list(self.STREAM_WRITERS)}')
+
+        # Every pixel must be reserved before the image can be constructed
+        if not self.are_all_pixels_reserved():
+            raise UnreservedPixelError(self._describe_unreserved_pixels())
+
+        stream = io.BytesIO()
+        writer = self.STREAM_WRITERS[format.upper()](stream, self._get_x_max(), self._get_y_max(), **params)
+
+        for strip in self.framebuffer.iter_rgb_strips(strip_height):
+            writer.write_rows(strip)
+            # Hand over whatever has been encoded so far, and start over with an empty stream
+            if stream.tell() > 0:
+                yield stream.getvalue()
+                stream.seek(0)
+                stream.truncate()
+
+        writer.close()
+        yield stream.getvalue()
+
+    # Encode a `CustomImage` strip by strip and write it to `fp`, any binary file object - see `iter_encoded`
+    @instrumented
+    def write_stream(self, fp, format='PNG', strip_height=64, **params):
+        for data in self.iter_encoded(format, strip_height, **params):
+            fp.write(data)
 
     # Turn a `CustomImage` into a `JPEG` and open it
+    @instrumented
     def construct_and_show_jpeg(self):
-        # `CustomImage` -> `bytes`
-        self._construct_final_byte_string()
+        # `CustomImage` -> `PIL.Image`
+        jpeg = self.to_pil()
 
-        # `bytes` -> `JPEG` using the default decoder
-        jpeg = Image.frombytes(self.mode, self.size, self.final_image_byte_data,
-            self.decoder_name, self.decoder_args)
-        
         # Open the image
         jpeg.show()
 
-    # Return `True` if all `ReservablePixel`s are reserved
+    # Return `True` if all pixels are reserved
+    # Reserved pixels are counted as they are drawn, so this does not scan the image
+    @instrumented
     def are_all_pixels_reserved(self):
-        for j in range(self._get_y_max()):
-            for i in range(self._get_x_max()):
-                if not self.reservations[j][i].is_reserved():
-                    return False
-        return True
+        self.flush()
+        return self.framebuffer.is_fully_reserved()
+
+    # Return the number of reserved pixels
+    def get_num_reserved_pixels(self):
+        self.flush()
+        return self.framebuffer.num_reserved
+
+    # Return a `RectangularRegion` bounding each unreserved area of the image - the holes left to fill.
+    # At most `max_regions` regions are returned, if specified.
+    @instrumented
+    def get_unreserved_regions(self, max_regions=None):
+        self.flush()
+        return [RectangularRegion(*box) for box in self.framebuffer.find_unreserved_boxes(max_regions)]
+
+    # Describe where the unreserved pixels of an image are, for error messages
+    def _describe_unreserved_pixels(self, max_regions=10):
+        num_unreserved = self._get_x_max() * self._get_y_max() - self.get_num_reserved_pixels()
+        regions = self.get_unreserved_regions(max_regions + 1)
+
+        described = ', '.join(f'x {reg.x_min}-{reg.x_max}, y {reg.y_min}-{reg.y_max}' for reg in regions[:max_regions])
+        if len(regions) > max_regions:
+            described += ', ...'
+        return f'{num_unreserved} pixels are unreserved, within: {described}'
 
     # General / direct image manipulation
 
@@ -135,249 +391,574 @@ class CustomImage:
         high_x = min(max(center_x + k, 0), self._get_x_max() - 1)
 
         # Reserve all pixels within the square
-        for j in range(low_y, high_y + 1):
-            for i in range(low_x, high_x + 1):
-                self.reservations[j][i].reserve(color)
+        self._reserve_rect(low_x, high_x + 1, low_y, high_y + 1, color)
+
+    # Reserve every pixel within a rectangle as a single color, clipped to the image.
+    # All rectangular drawing operations go through here, so that deferred images can record them.
+    def _reserve_rect(self, x_min, x_max, y_min, y_max, color):
+        x_min, x_max = max(x_min, 0), min(x_max, self._get_x_max())
+        y_min, y_max = max(y_min, 0), min(y_max, self._get_y_max())
+        if x_min >= x_max or y_min >= y_max:
+            return
+
+        if self.is_deferred():
+            self.commands.record_rect(x_min, x_max, y_min, y_max, color)
+        else:
+            self.framebuffer.fill_rect(x_min, x_max, y_min, y_max, color)
     
+    # Reserve many one-pixel-wide spans, each as a single color, see `Framebuffer.fill_spans`.
+    # Spans are clipped to the image. `colors` is an `(n, 3)` array of one color per span.
+    def _reserve_spans(self, positions, lows, highs, colors, vertical=True):
+        position_max, span_max = (self._get_x_max(), self._get_y_max()) if vertical else \
+            (self._get_y_max(), self._get_x_max())
+        lows, highs = np.maximum(lows, 0), np.minimum(highs, span_max)
+
+        visible = (positions >= 0) & (positions < position_max) & (lows < highs)
+        positions, lows, highs, colors = positions[visible], lows[visible], highs[visible], colors[visible]
+        if len(positions) == 0:
+            return
+
+        if self.is_deferred():
+            for position, low, high, color in zip(positions.tolist(), lows.tolist(), highs.tolist(), colors):
+                if vertical:
+                    self.commands.record_rect(position, position + 1, low, high, color)
+                else:
+                    self.commands.record_rect(low, high, position, position + 1, color)
+        else:
+            self.framebuffer.fill_spans(positions, lows, highs, colors, vertical)
+
+    # Reserve straight line segments from `(x_0, y_0)` to `(x_1, y_1)`, given as arrays of image coordinates,
+    # with `brush` stamped at every step. `colors` is either a single color or an `(n, 3)` array of one color per segment.
+    # A later segment wins over an earlier one.
+    #
+    # Segments of a square brush are reserved as spans, see `Rasterizer.resolve_segment_spans`. Those of any other
+    # brush are stamped, see `Rasterizer.resolve_segment_steps`.
+    def _reserve_segments(self, x_0, y_0, x_1, y_1, brush, colors):
+        colors = as_color_array(colors)
+        if not brush.is_square():
+            xs, ys, ids = self.rasterizer.resolve_segment_steps(x_0, y_0, x_1, y_1, brush.k)
+            self._reserve_stamps(xs, ys, brush, colors[ids] if colors.ndim == 2 else colors)
+            return
+
+        positions, lows, highs, ids, vertical = self.rasterizer.resolve_segment_spans(x_0, y_0, x_1, y_1, brush.k)
+        if len(positions) == 0:
+            return
+
+        colors = colors[ids] if colors.ndim == 2 else np.broadcast_to(colors, (len(ids), 3))
+
+        # Vertical and horizontal spans are reserved in separate batches, so reserve each run of segments
+        # of the same orientation in turn, to keep later segments winning
+        edges = [0, *(np.flatnonzero(vertical[1:] != vertical[:-1]) + 1).tolist(), len(ids)]
+        for start, end in zip(edges, edges[1:]):
+            self._reserve_spans(positions[start:end], lows[start:end], highs[start:end], colors[start:end],
+                bool(vertical[start]))
+
+    # Stamp `brush` (see `Brush`) at each center in `centers_x`, `centers_y`, all in one pass.
+    # With a square brush of size `k`, this is the bulk form of `_reserve_square`: the result is exactly as if
+    # `_reserve_square` had been called once per center, in order. A later stamp wins over an earlier one.
+    # `colors` is either a single color or an `(n, 3)` array of one color per center.
+    def _reserve_stamps(self, centers_x, centers_y, brush, colors):
+        if len(centers_x) == 0:
+            return
+
+        if self.is_deferred():
+            self.commands.record_stamps(centers_x, centers_y, brush, colors)
+            return
+
+        for xs, ys, chunk_colors in self.rasterizer.resolve_stamps(centers_x, centers_y, brush, colors):
+            self.framebuffer.fill_pixels(xs, ys, chunk_colors)
+
+    # Reserve a scattered set of pixels, given as arrays of image coordinates within the image.
+    # `colors` is either a single color or an `(n, 3)` array of one color per pixel. A later pixel wins over an earlier one.
+    def _reserve_pixels(self, xs, ys, colors):
+        if len(xs) == 0:
+            return
+
+        if self.is_deferred():
+            self.commands.record_squares(xs, ys, 0, colors)
+        else:
+            self.framebuffer.fill_pixels(xs, ys, colors)
+
+    # Reserve every pixel wherever the boolean array `covered`, of the shape of the image, is `True`,
+    # each as the color of its position as provided by `color_generator`, a `PositionalColorGenerator`.
+    #
+    # Every pixel takes the color of its position, whichever region or slice covers it: so callers mark every
+    # pixel covered, and every pixel is colored at once, rather than one region or slice at a time
+    def _reserve_pixels_by_position(self, covered, color_generator):
+        rows, cols = np.flatnonzero(covered.any(axis=1)), np.flatnonzero(covered.any(axis=0))
+        if len(rows) == 0:
+            return
+        x_min, x_max, y_min, y_max = int(cols[0]), int(cols[-1]) + 1, int(rows[0]), int(rows[-1]) + 1
+        mask = covered[y_min:y_max, x_min:x_max]
+
+        # Generate the colors of the whole bounding box at once, as a grid of one row of `x` by one column of `y`
+        colors = color_generator.generate_colors_at(np.arange(x_min, x_max)[np.newaxis, :],
+            np.arange(y_min, y_max)[:, np.newaxis])
+
+        if self.is_deferred():
+            self.commands.record_mask(x_min, y_min, mask, colors)
+        else:
+            self.framebuffer.fill_mask_colors(x_min, y_min, mask, colors)
+
     # Reserve the entire image as a single color
+    @instrumented
     def reserve_background_color(self, color):
-        for j in range(self._get_y_max()):
-            for i in range(self._get_x_max()):
-                self.reservations[j][i].reserve(color)
+        self._reserve_rect(0, self._get_x_max(), 0, self._get_y_max(), color)
 
     # Reserve the entire image as white
+    @instrumented
     def reserve_white_background(self):
         self.reserve_background_color(b'\xff\xff\xff')
 
     # Reserve the entire image as black
+    @instrumented
     def reserve_black_background(self):
         self.reserve_background_color(b'\x00\x00\x00')
 
+    # Recoloring
+
+    # Map every reserved pixel to the nearest color of a palette, see `PaletteQuantizer`.
+    # `palette` is a `RingColorGenerator`, whose pool is the palette, or a `PaletteQuantizer`.
+    # If `palette` is not specified, then use the pool of the `ColorGenerator`
+    #
+    # A `PaletteQuantizer` remembers every color it has mapped. To quantize many images to one palette,
+    # pass the same `PaletteQuantizer` every time.
+    #
+    # Raise a `ValueError` if there is no palette to quantize to: a `ColorGenerator` without a pool
+    @instrumented
+    def quantize_to_palette(self, palette=None):
+        palette = self.cg if palette is None else palette
+        if not isinstance(palette, PaletteQuantizer) and not hasattr(palette, 'pool'):
+            raise ValueError(f'Quantizing requires a palette: a PaletteQuantizer, or a ColorGenerator with a pool '
+                f'such as a RingColorGenerator, not {type(palette).__name__}')
+        quantizer = palette if isinstance(palette, PaletteQuantizer) else PaletteQuantizer(palette.pool)
+
+        self.flush()
+        self.framebuffer.map_colors(quantizer.quantize)
+
     # Image manipulation via `RectangularRegion`s
 
     # Reserve all pixels within a `RectangularRegion` as a single color
-    def _reserve_single_region_single_color(self, reg):
-        color = self.cg.generate_color()
+    # If `color` is not specified, then use the `ColorGenerator`
+    def _reserve_single_region_single_color(self, reg, color=None):
+        if color is None:
+            color = self.cg.generate_color()
         xMin, xMax, yMin, yMax = reg.get_edges()
 
-        for x in range(xMin, xMax):
-            for y in range(yMin, yMax):
-                self.reservations[y][x].reserve(color)
+        self._reserve_rect(xMin, xMax, yMin, yMax, color)
     
-    # Reserve all `RectangularRegion`s, using the supplied `ColorGenerator` for each region
-    def reserve_all_rectangular_regions(self):
-        for reg in self.rec_regions:
-            self._reserve_single_region_single_color(reg)
-
-    # Pick a `RectangularRegion` at random and divide it into two `RectangularRegion`s
-    def divide_random_rectangular_region_in_two(self):
-        # Grab a `RectangularRegion` at random and alias it as `super_reg`
-        super_reg_index = random.randrange(0, len(self.rec_regions))
-        super_reg = self.rec_regions[super_reg_index]
-
-        # Alias the dimensions and edges of `super_reg`
-        super_width, super_height = super_reg.get_width(), super_reg.get_height()
-        super_x_min, super_x_max, super_y_min, super_y_max = super_reg.get_edges()
-
-        # Ensure `super_reg` is large enough to split in two
-        _MIN_SIZE_TO_SPLIT = 2
-
-        if super_width < _MIN_SIZE_TO_SPLIT or super_height < _MIN_SIZE_TO_SPLIT:
-            # `super_reg` is too small to divide
+    # Reserve all `RectangularRegion`s, using the supplied `ColorGenerator` for each region.
+    # If `color_generator` is specified, then use it instead. A `PositionalColorGenerator` colors every pixel
+    # of every region by its position rather than every region as a single color
+    @instrumented
+    def reserve_all_rectangular_regions(self, color_generator=None):
+        color_generator = self.cg if color_generator is None else color_generator
+        if isinstance(color_generator, PositionalColorGenerator):
+            # Mark every pixel covered, see `_reserve_pixels_by_position`
+            covered = np.zeros((self._get_y_max(), self._get_x_max()), dtype=bool)
+            for x_min, x_max, y_min, y_max in zip(*(edge.tolist() for edge in self.rec_regions.get_edges())):
+                covered[max(y_min, 0):y_max, max(x_min, 0):x_max] = True
+            self._reserve_pixels_by_position(covered, color_generator)
             return
 
-        # Determine if `super_reg` will be divided horizontally or vertically
-        horiz_vert = bool(random.getrandbits(1))
+        # Generate the colors of all regions at once
+        colors = color_generator.generate_colors(len(self.rec_regions))
+        edges = (edge.tolist() for edge in self.rec_regions.get_edges())
 
-        if horiz_vert:
-            # Calculate the `x` coordinate that vertically divides `super_reg` into two
-            halfway_x = super_x_min + (super_width // 2)
+        for x_min, x_max, y_min, y_max, color in zip(*edges, colors):
+            self._reserve_rect(x_min, x_max, y_min, y_max, color)
 
-            # Instantiate the two new `RectangularRegion`s
-            # Note that the `y` edges remain unchanged from `super_reg`
-            reg_to_replace_super = RectangularRegion(super_x_min, halfway_x, super_y_min, super_y_max)
-            reg_to_append        = RectangularRegion(halfway_x, super_x_max, super_y_min, super_y_max)
+    # Pick a `RectangularRegion` at random, weighted by area, and divide it into two `RectangularRegion`s
+    # Regions too small to divide are never picked
+    @instrumented
+    def divide_random_rectangular_region_in_two(self):
+        self.rec_regions.divide_random(self.rng)
 
-        else:
-            # Calculate the `y` coordinate that horizontally divides `super_reg` into two
-            halfway_y = super_y_min + (super_height // 2)     
-
-            # Instantiate the two new `RectangularRegion`s
-            # Note that the `x` edges remain unchanged from `super_reg`
-            reg_to_replace_super = RectangularRegion(super_x_min, super_x_max, super_y_min, halfway_y)
-            reg_to_append        = RectangularRegion(super_x_min, super_x_max, halfway_y, super_y_max)
-        
-        # Avoid O(n) removal of `super_reg` from our list by replacing it directly
-        self.rec_regions[super_reg_index] = reg_to_replace_super
-        self.rec_regions.append(reg_to_append)
+    # Perform `n` random divisions, see `divide_random_rectangular_region_in_two`
+    @instrumented
+    def divide_rectangular_regions(self, n):
+        return self.rec_regions.divide_n(n, self.rng)
+
+    # Return the index into `self.rec_regions` of the `RectangularRegion` containing the point `(x, y)`,
+    # or `-1` if the point is outside the image. `x` and `y` may also be arrays of points
+    @instrumented
+    def find_rectangular_region(self, x, y):
+        return self.rec_regions.find(x, y)
 
     # Image manipulation via single-variable function plotting
     
     # Plot a single-variable function `func` over a `CustomImage`
     # If `color` is not specified, then use the `ColorGenerator` for each `x`
-    def draw_single_variable_function(self, func, brush_size=1, color=None):
+    #
+    # If `vectorized` is `True`, `func` is invoked once with an array of every `x` and must
+    # return an array of every `f(x)`. This works for any `numpy` expression.
+    # Ex: `lambda x : 200 * np.sin(x / 100) + 540`
+    #
+    # `brush` is the shape stamped at every `(x, f(x))`: 'square', 'disc' or 'diamond', of size `brush_size`,
+    # or any `Brush`, whose own size then applies. Every drawing operation with a `brush_size` takes a `brush`
+    @instrumented
+    def draw_single_variable_function(self, func, brush_size=1, color=None, vectorized=False, brush='square'):
+        brush = Brush.get(brush, brush_size)
+
         # A function `f(x)` can be represented as a dictionary of the form `{x : f(x)}`
         # Currently, functions are plotted and reserved immediately, leaving no reason
         # to store the function for later. Thus, avoid the O(n) space cost of populating
         # the dictionary form of a function by immediately reserving it.
+        xs = np.arange(self._get_x_max())
+
+        # Invoke lambda to caluclate `f(x)`, either once for all `x` or once per `x`
+        if vectorized:
+            f_xs = np.broadcast_to(np.asarray(func(xs), dtype=float), xs.shape)
+        else:
+            f_xs = np.array([func(x) for x in range(self._get_x_max())], dtype=float)
 
-        for x in range(self._get_x_max()):
-            # Invoke lambda to caluclate `f(x)`
-            f_x = func(x)
+        # A `ColorGenerator` is invoked once per `x`, in order
+        if color is None:
+            color = self.cg.generate_colors(len(xs))
+        color = as_color_array(color)
+
+        # Undefined values of `f(x)` cannot be plotted
+        defined = np.isfinite(f_xs)
+        if not defined.all():
+            xs, f_xs = xs[defined], f_xs[defined]
+            if color.ndim == 2:
+                color = color[defined]
 
-            # Translate the y coordinate to cartesian
-            f_x_cartesian = self._translate_y_coord_cartesian(f_x)
+        # Translate the y coordinates to cartesian.
+        # Values far outside of the image are saturated first, as they all clamp to the same edge.
+        f_xs_cartesian = self._translate_y_coord_cartesian(f_xs)
+        f_xs_cartesian = np.clip(f_xs_cartesian, -brush.k_y - 1, self._get_y_max() + brush.k_y)
 
-            # Reserve this `(x, f(x))` pair
-            self._reserve_square(x, math.floor(f_x_cartesian), brush_size, color)
+        # Reserve all `(x, f(x))` pairs at once
+        self._reserve_stamps(xs, np.floor(f_xs_cartesian).astype(np.int64), brush, color)
 
     # Image manipulation via `dots`
 
     # Add a `dot` at random coordinates to the `CustomImage`
+    @instrumented
     def add_random_dot(self):
         # Generate coordinates
-        x = random.randrange(0, self._get_x_max())
-        y = random.randrange(0, self._get_y_max())
+        x = int(self.rng.integers(self._get_x_max()))
+        y = int(self.rng.integers(self._get_y_max()))
 
         # Add `dot` to our underlying list
         dot = (x, y)
         self.dots.append(dot)
 
-    # Given two `dot`s, plot a line between them
-    def _connect_two_dots(self, dot_0, dot_1, brush_size):
-        # Calculate the slope `m` and the intersect `b` of this line
+    # Add `n` `dot`s at random coordinates to the `CustomImage`, drawing every coordinate at once
+    @instrumented
+    def add_random_dots(self, n):
+        xs = self.rng.integers(self._get_x_max(), size=n)
+        ys = self.rng.integers(self._get_y_max(), size=n)
+        self.dots.extend(zip(xs.tolist(), ys.tolist()))
 
+    # Given two `dot`s, plot a line between them
+    def _connect_two_dots(self, dot_0, dot_1, brush_size, brush='square'):
         # Alias the `dot` coordinates
         # Recall: `dot` == `(x, y)`
         x_0, y_0 = dot_0
         x_1, y_1 = dot_1
 
-        # Point-slope form:
-        m = 0
-        try:
-            m = (y_1 - y_0) / (x_1 - x_0)
-        except ZeroDivisionError:
-            # If a slope of infinity is needed to connect the `dot`s,
-            # effectively replace slope with the height of the image
-            m = self._get_y_max()
-
-        # With the slope `m`, use either `dot` to find the intersect `b`
-        # of the connecting line.
-        # This is just algebra applied to `y = mx + b`
-        b = y_0 - (m * x_0)
-
-        # Ensure the intercept `b` is an integer
-        b = int(round(b))
-
-        func = lambda x : (m * x) + b
-        self.draw_single_variable_function(func, brush_size)
+        self.draw_line_segment(x_0, y_0, x_1, y_1, brush_size, brush=brush)
 
     # Calulate and plot lines between all of this `CustomImage`s `dot`s 
-    def connect_all_dots(self, brush_size=1):
+    @instrumented
+    def connect_all_dots(self, brush_size=1, brush='square'):
         # TODO validate optional variable
         # TODO raise exception when there are not enough dots to connect
-        # Each `dot` has random coordinates, so simply traverse linearly through the list
-        for i in range(0, len(self.dots) - 1):
-            self._connect_two_dots(self.dots[i], self.dots[i + 1], brush_size)
+        if len(self.dots) < 2:
+            return
+
+        # Each `dot` has random coordinates, so simply traverse linearly through the list,
+        # pairing every `dot` with the next one, and draw all segments at once
+        dots = np.array(self.dots, dtype=np.int64)
+        self.draw_line_segments(np.hstack((dots[:-1], dots[1:])), brush_size, brush=brush)
+
+    # Image manipulation via point clouds
+
+    # Plot a point cloud by density: count the points that land on every pixel, and color every pixel
+    # with any points by how many, through a palette. Pixels without any points are left unreserved.
+    # `xs` and `ys` are arrays of cartesian coordinates, of any length - there is no per-point cost in Python.
+    #
+    # `radius` spreads every point across a `brush` of that size around it, see `DensityMap.splat`. This fills
+    # the gaps of a sparse cloud. `weights`, if specified, weighs every point, see `DensityMap.add_points`.
+    # See `reserve_density_map` for `palette` and `scale`. To plot a cloud too large to hold at once, add it
+    # to a `DensityMap` in batches instead, and reserve that.
+    @instrumented
+    def draw_density(self, xs, ys, radius=0, palette=None, scale='log', brush='disc', weights=None):
+        density = DensityMap(self._get_x_max(), self._get_y_max())
+        density.add_points(xs, self._translate_y_coord_cartesian(np.asarray(ys, dtype=float)), weights)
+
+        brush = Brush.get(brush, radius)
+        if brush.mask.size > 1:
+            density = density.splat(brush)
+        self.reserve_density_map(density, palette, scale)
+
+    # Reserve every pixel of a `DensityMap` with any points, colored by its density.
+    # Densities are scaled by `scale` (see `DensityMap.get_intensities`) and mapped onto `palette`, lowest to
+    # highest: an `(n, 3)` array of colors, or a `ColorGenerator`. A `RingColorGenerator` lends its pool, in order;
+    # any other `ColorGenerator` generates `DENSITY_LEVELS` colors. If `palette` is not specified, then use the
+    # `ColorGenerator` of this image
+    @instrumented
+    def reserve_density_map(self, density, palette=None, scale='log'):
+        palette = self.cg if palette is None else palette
+        if isinstance(palette, RingColorGenerator):
+            colors = palette.pool
+            if len(colors) == 0:
+                raise EmptyColorPoolError
+        elif isinstance(palette, ColorGenerator):
+            colors = palette.generate_colors(self.DENSITY_LEVELS)
+        else:
+            colors = as_color_array(palette).reshape(-1, 3)
+
+        intensities = density.get_intensities(scale)
+        ys, xs = np.nonzero(density.counts > 0)
+        levels = np.rint(intensities[ys, xs] * (len(colors) - 1)).astype(np.int64)
+        self._reserve_pixels(xs, ys, colors[levels])
+
+    # Image manipulation via line segments
+
+    # Plot a straight line segment from `(x_0, y_0)` to `(x_1, y_1)`, in cartesian coordinates
+    @instrumented
+    def draw_line_segment(self, x_0, y_0, x_1, y_1, brush_size=1, color=None, brush='square'):
+        self.draw_line_segments([(x_0, y_0, x_1, y_1)], brush_size, color, brush)
+
+    # Plot many straight line segments in a single batch.
+    # `segments` is a sequence of `(x_0, y_0, x_1, y_1)`, or an `(n, 4)` array, in cartesian coordinates.
+    #
+    # Segments are rasterized Bresenham-style: every segment takes one step per pixel along its
+    # major axis, and only pixels on the segment are touched. The brush - by default a square of side length
+    # `2k + 1`, where `k` is `brush_size` - is stamped at each step, so thick segments are continuous, too.
+    # If `color` is not specified, then use the `ColorGenerator` for each step
+    @instrumented
+    def draw_line_segments(self, segments, brush_size=1, color=None, brush='square'):
+        brush = Brush.get(brush, brush_size)
+        segments = np.asarray(segments, dtype=np.int64).reshape(-1, 4)
+        x_0, y_0, x_1, y_1 = segments.T
+        d_x, d_y = x_1 - x_0, y_1 - y_0
+
+        # A segment of `n` steps covers `n + 1` pixels along its major axis
+        num_steps = np.maximum(np.abs(d_x), np.abs(d_y))
+        num_pixels = num_steps + 1
+
+        # Lay out every step of every segment in one flat array:
+        # `ids` maps each step to its segment, `steps` counts from 0 within each segment
+        ids = np.repeat(np.arange(len(segments)), num_pixels)
+        steps = np.arange(len(ids)) - np.repeat(np.cumsum(num_pixels) - num_pixels, num_pixels)
+
+        # Interpolate along each segment, rounding to the nearest pixel with integer arithmetic only:
+        # `x_0 + round(d_x * step / num_steps)` == `x_0 + (2 * d_x * step + num_steps) // (2 * num_steps)`
+        divisor = np.maximum(num_steps, 1)[ids]
+        xs = x_0[ids] + (2 * d_x[ids] * steps + divisor) // (2 * divisor)
+        ys = y_0[ids] + (2 * d_y[ids] * steps + divisor) // (2 * divisor)
+
+        # Translate the y coordinates to cartesian
+        ys = self._translate_y_coord_cartesian(ys)
+
+        # A `ColorGenerator` is invoked once per step, in order
+        if color is None:
+            color = self.cg.generate_colors(len(xs))
+        color = as_color_array(color)
+
+        # Skip steps whose brush falls entirely outside of the image
+        k_x, k_y = brush.k_x, brush.k_y
+        visible = (xs >= -k_x) & (xs < self._get_x_max() + k_x) & (ys >= -k_y) & (ys < self._get_y_max() + k_y)
+        if not visible.all():
+            xs, ys = xs[visible], ys[visible]
+            if color.ndim == 2:
+                color = color[visible]
+
+        self._reserve_stamps(xs, ys, brush, color)
+
+    # Image manipulation via curves
+
+    # Plot a parametric curve `(x(t), y(t))` across `[t_min, t_max]`, in cartesian coordinates.
+    # `func` maps `t` to `(x, y)`. If `vectorized` is `True`, it is invoked with an array of every `t` at once
+    # and must return an array of every `x` and of every `y`.
+    # Ex: `lambda t : (960 + 400 * np.cos(3 * t), 540 + 400 * np.sin(2 * t))`
+    #
+    # Unlike `draw_single_variable_function`, the curve is continuous at any brush size, however steep:
+    # it is sampled more densely where it bends or moves fast, to within `tolerance` pixels, and consecutive
+    # samples are joined by line segments (see `CurveSampler`). Undefined samples and discontinuities are skipped.
+    # If `color` is not specified, then use the `ColorGenerator` for each segment
+    @instrumented
+    def draw_parametric_curve(self, func, t_min, t_max, brush_size=1, color=None, vectorized=False, tolerance=0.5,
+            brush='square'):
+        self._draw_parametric_curve(func, t_min, t_max, Brush.get(brush, brush_size), color, vectorized, tolerance)
+
+    # Plot a polar curve `r(theta)` across `[theta_min, theta_max]`, around `center` in cartesian coordinates,
+    # which defaults to the center of the image. `func` maps `theta` to `r`, see `draw_parametric_curve`
+    # Ex: `lambda theta : 400 * np.cos(4 * theta)`
+    @instrumented
+    def draw_polar_curve(self, func, theta_min=0, theta_max=2 * math.pi, center=None, brush_size=1, color=None,
+            vectorized=False, tolerance=0.5, brush='square'):
+        if center is None:
+            center = ((self._get_x_max() - 1) / 2, (self._get_y_max() - 1) / 2)
+        center_x, center_y = center
+
+        if vectorized:
+            def curve(thetas):
+                rs = np.asarray(func(thetas), dtype=float)
+                return center_x + rs * np.cos(thetas), center_y + rs * np.sin(thetas)
+        else:
+            def curve(theta):
+                r = func(theta)
+                return center_x + r * math.cos(theta), center_y + r * math.sin(theta)
 
-    # Image manipulation via `vertical_slices`
+        self._draw_parametric_curve(curve, theta_min, theta_max, Brush.get(brush, brush_size), color, vectorized,
+            tolerance)
 
-    # Enforce image bounds and tuck away the logic of adding to `vertical_slices`
-    # Recall: `vertical_slices` is keyed by `x` and valued by a list of `y` bounds
+    def _draw_parametric_curve(self, func, t_min, t_max, brush, color, vectorized, tolerance):
+        k = brush.k
+        bounds = (-k - 1, self._get_x_max() + k, -k - 1, self._get_y_max() + k)
+        xs, ys, joined = CurveSampler(tolerance).sample(func, t_min, t_max, bounds, vectorized)
+
+        # Join every pair of consecutive samples that is to be joined, translating y coordinates to cartesian
+        ys = self._translate_y_coord_cartesian(ys)
+        x_0, y_0, x_1, y_1 = xs[:-1][joined], ys[:-1][joined], xs[1:][joined], ys[1:][joined]
+
+        # A `ColorGenerator` is invoked once per segment, in order
+        if color is None:
+            color = self.cg.generate_colors(len(x_0))
+
+        self._reserve_segments(x_0, y_0, x_1, y_1, brush, color)
+
+    # Image manipulation via `vertical_slices` and `horizontal_slices`
+
+    # Enforce image bounds and tuck away the logic of adding to `vertical_slices` and `horizontal_slices`
+    # Recall: a slice is a position - `x` for vertical slices, `y` for horizontal ones - and a span across it
     def _add_vertical_slice(self, x, y_min, y_max):
-        # TODO bounds check x as well
+        self._add_slices(self.vertical_slices, [x], [y_min], [y_max], self._get_y_max())
 
-        # sanitize/saturate y
-        y_min = min(max(math.floor(y_min), 0), self._get_y_max() - 1)
-        y_max = min(max(math.floor(y_max), 0), self._get_y_max() - 1)
-        new_val = (y_min, y_max)
+    def _add_horizontal_slice(self, y, x_min, x_max):
+        self._add_slices(self.horizontal_slices, [y], [x_min], [x_max], self._get_x_max())
 
-        if x in self.vertical_slices:
-            self.vertical_slices[x].append(new_val)
-        else:
-            self.vertical_slices[x] = [new_val]
-        
-    # Reserve all `vertical_slice`s, using the supplied `ColorGenerator` once per slice
-    def reserve_all_vertical_slices(self):
-        # Recall type of `vertical_slices`: `{x : [(y_min, y_max)]}`
-        for x, slice_list in self.vertical_slices.items():
-            # Each `x` may have multiple slices
-            for curr_slice in slice_list:
-                # Generate a color for this slice
-                color = self.cg.generate_color()
-
-                # Alias the slice as its underlying data: a range over `y`
-                (curr_y_min, curr_y_max) = curr_slice
-
-                # Reserve the entire slice
-                for curr_y in range(curr_y_min, curr_y_max):
-                    self.reservations[curr_y][x].reserve(color)
+    # Add many slices to `slices` at once, given as parallel arrays
+    # `extent` is the size of the image along the slices: its height for vertical slices
+    def _add_slices(self, slices, positions, lows, highs, extent):
+        # TODO bounds check positions as well
+
+        # sanitize/saturate lows and highs
+        lows = np.clip(np.floor(lows), 0, extent - 1).astype(np.int64)
+        highs = np.clip(np.floor(highs), 0, extent - 1).astype(np.int64)
+
+        slices.add_many(positions, lows, highs)
+
+    # Reserve all `vertical_slice`s, using the supplied `ColorGenerator` once per slice.
+    # If `color_generator` is specified, then use it instead. A `PositionalColorGenerator` colors every pixel
+    # of every slice by its position rather than every slice as a single color
+    @instrumented
+    def reserve_all_vertical_slices(self, color_generator=None):
+        self._reserve_all_slices(self.vertical_slices, True, color_generator)
+
+    # Reserve all `horizontal_slice`s, see `reserve_all_vertical_slices`
+    @instrumented
+    def reserve_all_horizontal_slices(self, color_generator=None):
+        self._reserve_all_slices(self.horizontal_slices, False, color_generator)
+
+    def _reserve_all_slices(self, slices, vertical, color_generator=None):
+        if len(slices) == 0:
+            return
+
+        color_generator = self.cg if color_generator is None else color_generator
+        if isinstance(color_generator, PositionalColorGenerator):
+            # Mark every pixel covered, see `_reserve_pixels_by_position`. Vertical slices are marked across the
+            # transposed mask
+            covered = np.zeros((self._get_y_max(), self._get_x_max()), dtype=bool)
+            covered_by_position = covered.T if vertical else covered
+            for position, low, high in zip(*(array.tolist() for array in slices.get_slices())):
+                if 0 <= position < len(covered_by_position):
+                    covered_by_position[position, max(low, 0):high] = True
+            self._reserve_pixels_by_position(covered, color_generator)
+            return
+
+        # Generate the colors of all slices at once, in the order they are drawn
+        colors = color_generator.generate_colors(len(slices))
+
+        # Merge overlapping slices of the same color, and reserve every remaining span
+        positions, lows, highs, colors = slices.get_spans(colors)
+        self._reserve_spans(positions, lows, highs, colors, vertical)
 
     # Add `vertical_slice`s of random heights to the `CustomImage` spanning
     # from `x_min` to `x_max`
+    @instrumented
     def create_random_vertical_slices(self, x_min, x_max, x_step_size=1):
+        self._create_random_slices(self.vertical_slices, x_min, x_max, x_step_size, self._get_y_max())
+
+    # Add `horizontal_slice`s of random widths to the `CustomImage` spanning
+    # from `y_min` to `y_max`
+    @instrumented
+    def create_random_horizontal_slices(self, y_min, y_max, y_step_size=1):
+        self._create_random_slices(self.horizontal_slices, y_min, y_max, y_step_size, self._get_x_max())
+
+    # `extent` is the size of the image along the slices: its height for vertical slices
+    def _create_random_slices(self, slices, position_min, position_max, step_size, extent):
         # TODO sanitize input
-        for x in range(x_min, x_max, x_step_size):
-            # Generate random `y` bounds for the slice
-            y_bound_1 = random.randint(0, self._get_y_max())
-            y_bound_2 = random.randint(0, self._get_y_max())
+        positions = np.arange(position_min, position_max, step_size)
 
-            # Order the random bounds
-            curr_y_min = min(y_bound_1, y_bound_2)
-            curr_y_max = max(y_bound_1, y_bound_2)
+        # Generate two random bounds within `[0, extent]` for each slice, all at once
+        bounds = self.rng.integers(0, extent, size=(len(positions), 2), endpoint=True)
+        bounds_1, bounds_2 = bounds[:, 0], bounds[:, 1]
 
-            self._add_vertical_slice(x, curr_y_min, curr_y_max)
+        # Order the random bounds
+        self._add_slices(slices, positions, np.minimum(bounds_1, bounds_2), np.maximum(bounds_1, bounds_2), extent)
 
     # Add `vertical_slice`s of random heights to the `CustomImage` spanning
     # from `x_min` to `x_max`. Each slice will be symmetric across the center of the image.
     # The image can optionally be partitioned vertically, where each partition will have its own
     # relative center.
+    @instrumented
     def create_symmetric_vertical_slices_from_center(self, x_min, x_max, x_step_size=1, num_partitions=1):
+        self._create_symmetric_slices_from_center(self.vertical_slices, x_min, x_max, x_step_size,
+            num_partitions, self._get_y_max())
+
+    # Add `horizontal_slice`s of random widths to the `CustomImage` spanning
+    # from `y_min` to `y_max`. Each slice will be symmetric across the center of the image.
+    # The image can optionally be partitioned horizontally, where each partition will have its own
+    # relative center.
+    @instrumented
+    def create_symmetric_horizontal_slices_from_center(self, y_min, y_max, y_step_size=1, num_partitions=1):
+        self._create_symmetric_slices_from_center(self.horizontal_slices, y_min, y_max, y_step_size,
+            num_partitions, self._get_x_max())
+
+    # `extent` is the size of the image along the slices: its height for vertical slices
+    def _create_symmetric_slices_from_center(self, slices, position_min, position_max, step_size,
+            num_partitions, extent):
         # `n` partitions can be described by `n+1` bounds.
         # Ex: Drawing three parallel lines through a rectangle results in four segments.
         num_bounds = num_partitions + 1
 
-        # Get the absolute height of the image
-        abs_y_max = self._get_y_max()
-        
-        # Calculate the height of each partition
-        partition_height = abs_y_max // num_partitions
+        # Calculate the size of each partition
+        partition_size = extent // num_partitions
 
         # Calculate the bounds that describe the desired partitions
         # Ex: for an image with height of 100,
-        #   and `num_partitions` of 4: `y_bounds` == `[0, 25, 50, 75, 100]`
-        #   and `num_partitions` of 1: `y_bounds` == `[0, 100]`
-        y_bounds = [partition_height * i for i in range(num_bounds)]
+        #   and `num_partitions` of 4: `bounds` == `[0, 25, 50, 75, 100]`
+        #   and `num_partitions` of 1: `bounds` == `[0, 100]`
+        bounds = [partition_size * i for i in range(num_bounds)]
 
-        # Add slices to the `i`th partition
-        for i in range(num_partitions):
-            # Alias the bounds that describe this partition
-            rel_y_min, rel_y_max = y_bounds[i], y_bounds[i + 1]
-            
-            # Calculate the relative center of this partition
-            rel_center_y = rel_y_min + (partition_height // 2)
+        # For symmetric slices, it's easier to think about an `offset` that is applied
+        # both above and below the relative center of the partition, as opposed to a standard length.
+        # Calculate the slice `offset` upper bound with two considerations:
 
-            # Traverse the `i`th partition horizontally
-            for x in range(x_min, x_max, x_step_size):
-                # For symmetric slices, it's easier to think about an `offset` that is applied
-                # both above and below the relative center of the image, as opposed to a standard `height`.
-                # Calculate the slice `offset` upper bound with two considerations:
+        # Account for partition size
+        partition_size_restraint = 1 / num_partitions
 
-                # Account for partition height
-                partition_height_restraint = 1 / num_partitions
+        # Account for the symmetry of the slice - the offset will be applied in two directions
+        symmetric_slice_restraint = .4
 
-                # Account for the symmetry of the slice - the offset will be applied in two directions
-                symmetric_slice_restraint = .4
+        # Apply the considerations to calculate the upper bound
+        slice_offset_upper_bound = math.floor(extent * partition_size_restraint * symmetric_slice_restraint)
 
-                # Apply the considerations to calculate the upper bound
-                slice_offset_upper_bound = abs_y_max * partition_height_restraint * symmetric_slice_restraint
+        positions = np.arange(position_min, position_max, step_size)
 
-                # Choose the actual slice offset
-                curr_y_offset = random.randint(0, math.floor(slice_offset_upper_bound))
+        # Add slices to the `i`th partition
+        for i in range(num_partitions):
+            # Calculate the relative center of this partition
+            rel_center = bounds[i] + (partition_size // 2)
 
-                # Calculate the symmetric `y` bounds for this slice
-                curr_y_min = rel_center_y - curr_y_offset
-                curr_y_max = rel_center_y + curr_y_offset
+            # Choose the offset of every slice across the partition, all at once
+            offsets = self.rng.integers(0, slice_offset_upper_bound, size=len(positions), endpoint=True)
 
-                # Add the symmetric slice
-                self._add_vertical_slice(x, curr_y_min, curr_y_max)
\ No newline at end of file
+            # Add the symmetric slices
+            self._add_slices(slices, positions, rel_center - offsets, rel_center + offsets, extent)
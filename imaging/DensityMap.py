@@ -0,0 +1,95 @@
+import numpy as np
+
+# A `DensityMap` counts how many points land on every pixel of an image, so that a point cloud of any size
+# can be rendered by density rather than point by point (see `CustomImage.draw_density`).
+#
+# Points are added in bulk, as arrays of image coordinates, and counted in a single pass. Any number of
+# batches can be added before rendering. Every point can be spread across the pixels of a `Brush` around it
+# (`splat`), and counts are then scaled to intensities within `[0, 1]` (`get_intensities`):
+#   'linear': The count over the highest count
+#   'sqrt': The square root of the above, which brings out sparse areas
+#   'log': The logarithm of one plus the count, over that of one plus the highest count. This brings out
+#          sparse areas the most, and suits heavy-tailed data
+#
+# Counts are `float`, so that points can also be weighted.
+
+class DensityMap:
+
+    SCALES = ('linear', 'sqrt', 'log')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # `self.counts` is of the type `np.ndarray`, `(height, width)`, the number (or weight) of points per pixel
+        self.counts = np.zeros((height, width), dtype=float)
+
+    # Count points given as arrays of image coordinates, which are rounded down to the pixel they fall on.
+    # Points outside of the image, or undefined, are ignored. `weights`, if specified, is one weight per point
+    def add_points(self, xs, ys, weights=None):
+        xs, ys = np.asarray(xs, dtype=float).reshape(-1), np.asarray(ys, dtype=float).reshape(-1)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if weights is not None:
+            weights = np.broadcast_to(np.asarray(weights, dtype=float), xs.shape)[inside]
+
+        indices = ys[inside].astype(np.int64) * self.width + xs[inside].astype(np.int64)
+        self.counts += np.bincount(indices, weights, minlength=self.counts.size).reshape(self.counts.shape)
+
+    # Return a new `DensityMap` in which the count of every pixel is spread across the pixels of `brush`
+    # around it. Counts are summed rather than sampled: splatting keeps the total count, less whatever
+    # spreads past the edges of the image.
+    #
+    # Each row of the brush is made of runs of adjacent pixels. A run spreads a row of counts as a sum over
+    # a sliding window, taken from running totals, so splatting costs a few passes over the image per row of
+    # the brush - not one per pixel of the brush.
+    def splat(self, brush):
+        splatted = DensityMap(self.width, self.height)
+
+        # The running total of every row up to (but excluding) column `x` is at `running_totals[:, x + pad]`.
+        # It is padded with the first and last total on either side, so that every window is a plain slice
+        pad = brush.k_x + 1
+        running_totals = np.zeros((self.height, self.width + 1 + 2 * pad))
+        np.cumsum(self.counts, axis=1, out=running_totals[:, pad + 1:pad + 1 + self.width])
+        running_totals[:, pad + 1 + self.width:] = running_totals[:, pad + self.width, np.newaxis]
+
+        # `runs` is of the type `{(int, int) : [int]}`: for every run of offsets `[dx_min, dx_max]` within a row
+        # of the brush, the offsets `dy` of every row that it appears in. Symmetric brushes share most runs
+        runs = {}
+        for row in range(brush.mask.shape[0]):
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], brush.mask[row].astype(np.int8), [0]))))
+            for start, end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+                runs.setdefault((start - brush.k_x, end - 1 - brush.k_x), []).append(row - brush.k_y)
+
+        window_sums = np.empty((self.height, self.width))
+        for (dx_min, dx_max), dys in runs.items():
+            # The sum of the counts from `x - dx_max` to `x - dx_min` at every `x`
+            high, low = pad + 1 - dx_min, pad - dx_max
+            np.subtract(running_totals[:, high:high + self.width], running_totals[:, low:low + self.width],
+                out=window_sums)
+
+            # A point `dy` rows above a pixel spreads onto it
+            for dy in dys:
+                if dy >= self.height or -dy >= self.height:
+                    continue
+                if dy >= 0:
+                    splatted.counts[dy:] += window_sums[:self.height - dy]
+                else:
+                    splatted.counts[:dy] += window_sums[-dy:]
+        return splatted
+
+    # Return the counts scaled to intensities within `[0, 1]` by `scale`, see `SCALES`. Pixels without any
+    # points are at `0`
+    def get_intensities(self, scale='log'):
+        if scale not in self.SCALES:
+            raise ValueError(f'Unknown scale {scale!r}, expected one of {list(self.SCALES)}')
+
+        counts = np.maximum(self.counts, 0)
+        max_count = counts.max(initial=0)
+        if max_count == 0:
+            return np.zeros_like(counts)
+
+        if scale == 'linear':
+            return counts / max_count
+        if scale == 'sqrt':
+            return np.sqrt(counts / max_count)
+        return np.log1p(counts) / np.log1p(max_count)
@@ -0,0 +1,112 @@
+import struct
+import zlib
+
+import numpy as np
+
+from imaging.ImageWriter import PngWriter, pack_png_chunk
+from imaging.PaletteFramebuffer import PaletteFramebuffer
+
+# An `ExportCache` keeps the encoded `PNG` of a `Framebuffer` in sync with it, so that encoding an image
+# again after a small edit only redoes the work for what the edit changed.
+#
+# The `PNG` is kept in horizontal strips of `Framebuffer.DIRTY_BLOCK_SIZE` rows. Upon export, only the strips
+# holding a block that has changed since the last export are encoded again; every other strip is reused as is.
+# Re-exporting after drawing one curve thus costs the rows the curve crosses, not the image. Storages other than
+# 'dense' expand a single strip into channel data at a time, while it is encoded: only the encoded strips, and
+# their checksums, are kept.
+#
+# Each strip of a `PNG` is compressed on its own, into image data chunks of its own:
+#   - The first row of every strip is stored as is (the 'None' filter), every other row as its difference
+#     from the row above (the 'Up' filter). No strip depends on the rows of another
+#   - Each strip is compressed as its own run of `deflate` blocks, ending on a byte boundary, so that the
+#     encoded strips simply concatenate into one `zlib` stream. The stream's `Adler-32` checksum is combined
+#     from the checksums of the strips, without reading the image data again
+#
+# Specification: https://www.w3.org/TR/png/, https://www.rfc-editor.org/rfc/rfc1950, https://www.rfc-editor.org/rfc/rfc1951
+
+class ExportCache:
+
+    # The `zlib` stream header (`deflate`, 32 KiB window) and the final, empty, `deflate` block closing the stream
+    ZLIB_HEADER = b'\x78\x9c'
+    DEFLATE_END = b'\x03\x00'
+
+    # Modulus of `Adler-32`
+    ADLER_BASE = 65521
+
+    def __init__(self, framebuffer):
+        self.framebuffer = framebuffer
+        self.strip_height = framebuffer.DIRTY_BLOCK_SIZE
+        self.num_strips = framebuffer.block_versions.shape[0]
+
+        # The encoded strips of the `PNG`, each as `(chunk, adler32, length)`, along with the options they were
+        # encoded with and the `Framebuffer.version` they are up to date with
+        self.png_strips = None
+        self.png_options = None
+        self.png_version = None
+
+    # Return the indices of the strips that have changed since `version`. Every strip has, if `version` is `None`
+    def _get_dirty_strips(self, version):
+        if version is None:
+            return range(self.num_strips)
+        return np.flatnonzero(self.framebuffer.get_dirty_blocks(version).any(axis=1)).tolist()
+
+    def _get_strip_bounds(self, strip):
+        return strip * self.strip_height, min((strip + 1) * self.strip_height, self.framebuffer.height)
+
+    # Return the image encoded as a `PNG`, encoding only the changed strips.
+    # Palette storage is encoded as a palette image while its indices fit into a single byte
+    def get_png(self, compress_level=6):
+        framebuffer = self.framebuffer
+        is_palette = isinstance(framebuffer, PaletteFramebuffer) and framebuffer.indices.dtype == np.uint8
+
+        # Strips encoded any other way are of no use
+        options = (is_palette, compress_level)
+        if options != self.png_options:
+            self.png_strips = [None] * self.num_strips
+            self.png_options = options
+            self.png_version = None
+
+        version = framebuffer.version
+        for strip in self._get_dirty_strips(self.png_version):
+            y_min, y_max = self._get_strip_bounds(strip)
+            rows = framebuffer.indices[y_min:y_max] if is_palette else framebuffer.get_rgb_rows(y_min, y_max)
+            self.png_strips[strip] = self._encode_png_strip(rows.reshape(y_max - y_min, -1), compress_level)
+        self.png_version = version
+
+        # Width, height, bit depth of 8, color type of 3 (palette) or 2 (RGB), default compression, filter and interlace
+        header = pack_png_chunk(b'IHDR', struct.pack('>IIBBBBB', framebuffer.width, framebuffer.height, 8,
+            3 if is_palette else 2, 0, 0, 0))
+        if is_palette:
+            header += pack_png_chunk(b'PLTE', framebuffer.palette.tobytes())
+
+        adler32 = self._combine_adler32(self.png_strips)
+        trailer = pack_png_chunk(b'IDAT', self.DEFLATE_END + struct.pack('>I', adler32))
+
+        return b''.join([PngWriter.SIGNATURE, header, pack_png_chunk(b'IDAT', self.ZLIB_HEADER),
+            *(chunk for chunk, _, _ in self.png_strips), trailer, pack_png_chunk(b'IEND', b'')])
+
+    # Filter and compress a strip of `(rows, row_size)` channel data or palette indices.
+    # Return it as an image data chunk, along with the `Adler-32` checksum and length of its filtered data
+    def _encode_png_strip(self, rows, compress_level):
+        # Every row of image data is prefixed with its filter type: `0` (None) for the first, `2` (Up) for the rest
+        filtered = np.full((len(rows), 1 + rows.shape[1]), 2, dtype=np.uint8)
+        filtered[0, 0] = 0
+        filtered[0, 1:] = rows[0]
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+        # A raw `deflate` stream, flushed to a byte boundary without being closed
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+        data = compressor.compress(filtered) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return pack_png_chunk(b'IDAT', data), zlib.adler32(filtered), filtered.size
+
+    # Combine the `Adler-32` checksums of consecutive strips, each given as `(_, adler32, length)`, into the
+    # checksum of all of their data
+    def _combine_adler32(self, strips):
+        base = self.ADLER_BASE
+        combined = 1
+        for _, adler32, length in strips:
+            # The low half sums every byte plus one, the high half sums the low half after every byte
+            low = ((combined & 0xffff) + (adler32 & 0xffff) - 1) % base
+            high = ((combined >> 16) + (adler32 >> 16) + length * (combined & 0xffff) - length) % base
+            combined = (high << 16) | low
+        return combined
@@ -0,0 +1,295 @@
+import numpy as np
+from PIL import Image
+
+# A `Framebuffer` stores the pixel data behind a `CustomImage`.
+#
+# Pixels are held in one contiguous block of `uint8` channel data of shape `(height, width, 3)`,
+# one byte per RGB channel: red, green, blue. A separate boolean mask of shape `(height, width)`
+# records which pixels have been reserved (assigned a color). This costs about four bytes per pixel,
+# and because the arrays are zero-initialized, allocation is near-instant - the operating system
+# only hands out memory as pages are actually written.
+#
+# Rows are stored top to bottom, exactly like the final image data.
+# Ranges are half-open: `x_min` is included, `x_max` is not.
+#
+# Every `Framebuffer` keeps a running count of its reserved pixels, `num_reserved`, so checking
+# whether every pixel is reserved never scans the image. It also counts every pixel write,
+# `num_pixels_written`, including writes to pixels that were already reserved (overdraw).
+#
+# Every `Framebuffer` also tracks which parts of the image have changed - are dirty - in square blocks
+# of `DIRTY_BLOCK_SIZE` pixels per side, so that whatever is derived from its pixels can be brought up
+# to date without rescanning the whole image. Every change bumps `version`, and stamps the blocks it
+# touches with it. Any number of consumers can thus each save the `version` they last caught up with,
+# and ask `get_dirty_blocks` for whatever has changed since.
+
+# Interpret a color - `bytes`, a `bytearray` or any sequence of three channel values - as a `uint8` array
+def as_color_array(color):
+    if isinstance(color, (bytes, bytearray, memoryview)):
+        return np.frombuffer(color, dtype=np.uint8)
+    return np.asarray(color, dtype=np.uint8)
+
+# Pack an `(..., 3)` array of colors into integers of the form `0xRRGGBB`, one per color
+# Channels are widened one at a time, so that packing a whole image never widens all of its channel data at once
+def pack_colors(colors):
+    packed = colors[..., 0].astype(np.uint32) << 16
+    packed |= colors[..., 1].astype(np.uint32) << 8
+    packed |= colors[..., 2]
+    return packed
+
+# Write a single color into every pixel of `region`, an `(h, w, 3)` view of channel data.
+# Broadcasting a whole row of the color is far faster than broadcasting its three channel values.
+def fill_color(region, color):
+    region[...] = np.tile(as_color_array(color), (region.shape[1], 1))
+
+# Write a single color into the pixels of `region` wherever the boolean array `mask` is `True`.
+# Each pixel is viewed as one three-byte item, so that every selected pixel is a single copy.
+def fill_color_where(region, mask, color):
+    np.copyto(region.view('V3')[..., 0], as_color_array(color).view('V3'), where=mask)
+
+# Return the bounding boxes `[(x_min, x_max, y_min, y_max)]` of the areas where the boolean array
+# `mask` is `True`. Boxes are found by recursively cutting the mask along empty rows and columns
+# (an XY-cut), so no two boxes overlap. At most `max_boxes` boxes are returned, if specified.
+def find_bounding_boxes(mask, max_boxes=None):
+    boxes = []
+    pending = [(0, mask.shape[1], 0, mask.shape[0])]
+
+    while pending and (max_boxes is None or len(boxes) < max_boxes):
+        x_min, x_max, y_min, y_max = pending.pop()
+        box = mask[y_min:y_max, x_min:x_max]
+
+        # Trim the box down to the rows and columns that contain part of the mask
+        rows, cols = np.flatnonzero(box.any(axis=1)), np.flatnonzero(box.any(axis=0))
+        if len(rows) == 0:
+            continue
+        x_min, y_min = x_min + cols[0], y_min + rows[0]
+        rows, cols = rows - rows[0], cols - cols[0]
+
+        # Cut the box along every gap of empty rows or, failing that, of empty columns
+        row_gaps, col_gaps = np.flatnonzero(np.diff(rows) > 1), np.flatnonzero(np.diff(cols) > 1)
+        if len(row_gaps):
+            starts, ends = np.append(0, rows[row_gaps + 1]), np.append(rows[row_gaps] + 1, rows[-1] + 1)
+            pending.extend((x_min, x_min + cols[-1] + 1, y_min + start, y_min + end)
+                for start, end in zip(starts.tolist(), ends.tolist()))
+        elif len(col_gaps):
+            starts, ends = np.append(0, cols[col_gaps + 1]), np.append(cols[col_gaps] + 1, cols[-1] + 1)
+            pending.extend((x_min + start, x_min + end, y_min, y_min + rows[-1] + 1)
+                for start, end in zip(starts.tolist(), ends.tolist()))
+        else:
+            boxes.append((int(x_min), int(x_min + cols[-1] + 1), int(y_min), int(y_min + rows[-1] + 1)))
+
+    return sorted(boxes, key=lambda box: (box[2], box[0]))
+
+class Framebuffer:
+
+    # Number of channels (bytes) per pixel: red, green, blue
+    NUM_CHANNELS = 3
+
+    # Side length of the blocks that changes are tracked in
+    DIRTY_BLOCK_SIZE = 64
+
+    # Counting the reserved pixels of a box costs far less per pixel than finding distinct pixels does,
+    # see `_mark_pixels`
+    MAX_BOX_AREA_PER_PIXEL = 64
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # Allocate the channel data and the reservation mask
+        self.pixels = np.zeros((height, width, self.NUM_CHANNELS), dtype=np.uint8)
+        self.reserved = np.zeros((height, width), dtype=bool)
+        self.num_reserved = 0
+        self.num_pixels_written = 0
+        self._allocate_block_versions()
+
+    # Allocate the version of every block, all at `0`. Blocks along the right and bottom edges are cropped
+    def _allocate_block_versions(self):
+        size = self.DIRTY_BLOCK_SIZE
+        self.version = 0
+        self.block_versions = np.zeros((-(-self.height // size), -(-self.width // size)), dtype=np.int64)
+
+    # Mark every block that a rectangle touches as dirty
+    def _mark_dirty_rect(self, x_min, x_max, y_min, y_max):
+        if x_min < x_max and y_min < y_max:
+            size = self.DIRTY_BLOCK_SIZE
+            self.version += 1
+            self.block_versions[y_min // size:(y_max - 1) // size + 1, x_min // size:(x_max - 1) // size + 1] = \
+                self.version
+
+    # Mark every block that a scattered set of pixels touches as dirty
+    def _mark_dirty_pixels(self, xs, ys):
+        size = self.DIRTY_BLOCK_SIZE
+        self.version += 1
+        self.block_versions[ys // size, xs // size] = self.version
+
+    # Mark every block that many one-pixel-wide spans touch as dirty, see `fill_spans`
+    def _mark_dirty_spans(self, positions, lows, highs, vertical):
+        size = self.DIRTY_BLOCK_SIZE
+        block_versions = self.block_versions.T if vertical else self.block_versions
+
+        # List every block of every span: a span covers the blocks `[low // size, (high - 1) // size]`
+        starts = lows // size
+        counts = np.maximum((highs - 1) // size + 1 - starts, 0)
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.version += 1
+        block_versions[np.repeat(positions // size, counts), np.repeat(starts, counts) + offsets] = self.version
+
+    # Return a boolean array, one element per block, that is `True` wherever a block has changed since
+    # `version` - a value of `self.version` saved earlier. The block at `[i, j]` covers the pixels
+    # from `(j * DIRTY_BLOCK_SIZE, i * DIRTY_BLOCK_SIZE)` on
+    def get_dirty_blocks(self, version):
+        return self.block_versions > version
+
+    # Mark a rectangle of the reservation mask as reserved, counting the newly reserved pixels.
+    # Once every pixel is reserved, there is nothing left to count
+    def _mark_rect(self, rows, cols):
+        y_min, y_max, _ = rows.indices(self.height)
+        x_min, x_max, _ = cols.indices(self.width)
+        self._mark_dirty_rect(x_min, x_max, y_min, y_max)
+
+        region = self.reserved[rows, cols]
+        self.num_pixels_written += region.size
+        if not self.is_fully_reserved():
+            self.num_reserved += region.size - int(np.count_nonzero(region))
+        region[...] = True
+
+    # Mark a scattered set of pixels as reserved, counting the newly reserved pixels.
+    # A pixel listed more than once is only counted once
+    def _mark_pixels(self, xs, ys):
+        self._mark_dirty_pixels(xs, ys)
+        self.num_pixels_written += len(xs)
+        if self.is_fully_reserved() or len(xs) == 0:
+            self.reserved[ys, xs] = True
+            return
+
+        # Count the reserved pixels within the bounding box of the pixels, before and after, unless the box
+        # is much larger than the pixels are many. Then count the distinct pixels newly reserved instead
+        box = (slice(int(ys.min()), int(ys.max()) + 1), slice(int(xs.min()), int(xs.max()) + 1))
+        box_area = (box[0].stop - box[0].start) * (box[1].stop - box[1].start)
+        if box_area <= self.MAX_BOX_AREA_PER_PIXEL * len(xs):
+            num_reserved_before = int(np.count_nonzero(self.reserved[box]))
+            self.reserved[ys, xs] = True
+            self.num_reserved += int(np.count_nonzero(self.reserved[box])) - num_reserved_before
+        else:
+            newly_reserved = ~self.reserved[ys, xs]
+            self.num_reserved += len(np.unique(ys[newly_reserved] * self.width + xs[newly_reserved]))
+            self.reserved[ys, xs] = True
+
+    # Mark the pixels of a rectangle as reserved wherever `mask` is `True`, counting the newly reserved pixels
+    def _mark_mask(self, rows, cols, mask):
+        self._mark_dirty_rect(cols.start, cols.stop, rows.start, rows.stop)
+
+        region = self.reserved[rows, cols]
+        self.num_pixels_written += int(np.count_nonzero(mask))
+        if not self.is_fully_reserved():
+            self.num_reserved += int(np.count_nonzero(mask & ~region))
+        region |= mask
+
+    # Mark many one-pixel-wide spans as reserved, counting the newly reserved pixels, see `fill_spans`
+    def _mark_spans(self, positions, lows, highs, vertical):
+        if len(positions) == 0:
+            return
+        self._mark_dirty_spans(positions, lows, highs, vertical)
+
+        reserved = self.reserved.T if vertical else self.reserved
+        self.num_pixels_written += int((highs - lows).sum())
+
+        # Count the reserved pixels within the bounding box of every span, before and after
+        box = (slice(positions.min(), positions.max() + 1), slice(lows.min(), highs.max()))
+        num_reserved_before = None if self.is_fully_reserved() else int(np.count_nonzero(reserved[box]))
+
+        for position, low, high in zip(positions.tolist(), lows.tolist(), highs.tolist()):
+            reserved[position, low:high] = True
+
+        if num_reserved_before is not None:
+            self.num_reserved += int(np.count_nonzero(reserved[box])) - num_reserved_before
+
+    # Reserve every pixel within a rectangle as a single color
+    def fill_rect(self, x_min, x_max, y_min, y_max, color):
+        fill_color(self.pixels[y_min:y_max, x_min:x_max], color)
+        self._mark_rect(slice(y_min, y_max), slice(x_min, x_max))
+
+    # Reserve a scattered set of pixels, given as parallel arrays of coordinates.
+    # `colors` is either a single color or one color per pixel, as an `(n, 3)` array.
+    # If a pixel is listed more than once, the last occurrence wins.
+    def fill_pixels(self, xs, ys, colors):
+        self.pixels[ys, xs] = as_color_array(colors)
+        self._mark_pixels(xs, ys)
+
+    # Reserve the pixels of a rectangle, with top-left corner `(x_min, y_min)`, wherever the
+    # boolean array `mask` - of the same shape as the rectangle - is `True`, as a single color
+    def fill_mask(self, x_min, y_min, mask, color):
+        rows, cols = slice(y_min, y_min + mask.shape[0]), slice(x_min, x_min + mask.shape[1])
+        fill_color_where(self.pixels[rows, cols], mask, color)
+        self._mark_mask(rows, cols, mask)
+
+    # Reserve the pixels of a rectangle, with top-left corner `(x_min, y_min)`, wherever the boolean array `mask`
+    # is `True`, each as its own color: `colors` is an `(h, w, 3)` array, of the same shape as the rectangle
+    def fill_mask_colors(self, x_min, y_min, mask, colors):
+        rows, cols = slice(y_min, y_min + mask.shape[0]), slice(x_min, x_min + mask.shape[1])
+        np.copyto(self.pixels[rows, cols], colors, where=mask[..., np.newaxis])
+        self._mark_mask(rows, cols, mask)
+
+    # Reserve many one-pixel-wide spans, each as a single color, given as parallel arrays.
+    # A vertical span covers `[low, high)` over `y` in column `position`, a horizontal span
+    # covers `[low, high)` over `x` in row `position`. Spans must lie within the image.
+    # If spans overlap, the last one wins.
+    def fill_spans(self, positions, lows, highs, colors, vertical=True):
+        # Index columns through the transposed view, so that either way a span is `[position, low:high]`
+        pixels = self.pixels.transpose(1, 0, 2) if vertical else self.pixels
+
+        for position, low, high, color in zip(positions.tolist(), lows.tolist(), highs.tolist(), colors):
+            pixels[position, low:high] = color
+        self._mark_spans(positions, lows, highs, vertical)
+
+    # Reserve every pixel with the channel data of `rgb`, an `(height, width, 3)` array of `uint8`.
+    # A writable, contiguous array is adopted as the channel data as it is, without copying
+    def load_rgb_array(self, rgb):
+        if rgb.flags.writeable and rgb.flags.c_contiguous:
+            self.pixels = rgb
+        else:
+            self.pixels[...] = rgb
+        self._mark_rect(slice(None), slice(None))
+
+    # Replace the color of every reserved pixel with `function(colors)`, where `function` maps an
+    # `(..., 3)` array of colors to an array of the same shape - a `PaletteQuantizer`, say
+    def map_colors(self, function):
+        if self.is_fully_reserved():
+            self.pixels[...] = function(self.pixels)
+        else:
+            self.pixels[self.reserved] = function(self.pixels[self.reserved])
+        self.num_pixels_written += self.num_reserved
+        self._mark_dirty_rect(0, self.width, 0, self.height)
+
+    # Return `True` if every pixel has been reserved
+    def is_fully_reserved(self):
+        return self.num_reserved == self.width * self.height
+
+    # Return a boolean array of shape `(height, width)` that is `True` wherever a pixel is unreserved
+    def get_unreserved_mask(self):
+        return ~self.reserved
+
+    # Return the bounding boxes `[(x_min, x_max, y_min, y_max)]` of the unreserved areas, see `find_bounding_boxes`
+    def find_unreserved_boxes(self, max_boxes=None):
+        if self.is_fully_reserved():
+            return []
+        return find_bounding_boxes(self.get_unreserved_mask(), max_boxes)
+
+    # Return the channel data as an `(height, width, 3)` array, without copying
+    def to_rgb_array(self):
+        return self.pixels
+
+    # Return the channel data of the rows `[y_min, y_max)` as a `(y_max - y_min, width, 3)` array
+    def get_rgb_rows(self, y_min, y_max):
+        return self.pixels[y_min:y_max]
+
+    # Yield the channel data in strips of at most `strip_height` rows, top to bottom, see `get_rgb_rows`.
+    # Storages other than 'dense' only ever expand a single strip at a time
+    def iter_rgb_strips(self, strip_height):
+        for y_min in range(0, self.height, strip_height):
+            yield self.get_rgb_rows(y_min, min(y_min + strip_height, self.height))
+
+    # Turn the pixel data into an 'RGB' mode `PIL.Image`.
+    # The channel data is handed to `PIL` directly, without an intermediate `bytes` object
+    def to_pil(self):
+        return Image.frombuffer('RGB', (self.width, self.height), self.to_rgb_array(), 'raw', 'RGB', 0, 1)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from imaging.ColorGenerator import ColorGenerator
+from imaging.PositionalColorGenerator import PositionalColorGenerator
+
+# A `PositionalColorGenerator` provides the color of any position of an image, see `PositionalColorGenerator`.
+#
+# The policy for `GradientColorGenerator` is this: blend along the ramp from `start` to `end`, two points in
+# image coordinates. Positions before `start` take the first color of the ramp, and those past `end` the last.
+#   'linear': The ramp runs along the line from `start` to `end`, and is constant across it
+#   'radial': The ramp runs outwards from `start`, in circles, and reaches its end at the distance of `end`
+#
+# Ex: A vertical gradient from red at the top of a 1080p image to blue at its bottom:
+#   GradientColorGenerator((0, 0), (0, 1079), [b'\xff\x00\x00', b'\x00\x00\xff'])
+
+class GradientColorGenerator(PositionalColorGenerator):
+
+    SHAPES = ('linear', 'radial')
+
+    def __init__(self, start, end, colors, stops=None, shape='linear', rgb_rel_min=ColorGenerator.RGB_MIN,
+            rgb_rel_max=ColorGenerator.RGB_MAX):
+        if shape not in self.SHAPES:
+            raise ValueError(f'Unknown gradient shape {shape!r}, expected one of {list(self.SHAPES)}')
+        super().__init__(colors, stops, rgb_rel_min, rgb_rel_max)
+
+        self.start = np.asarray(start, dtype=float)
+        self.end = np.asarray(end, dtype=float)
+        self.shape = shape
+
+        # Set policy
+        self._internal_function_at = self._blend_linear if shape == 'linear' else self._blend_radial
+
+    # Project every position onto the line from `start` to `end`, as a fraction of its length
+    def _blend_linear(self, xs, ys):
+        d_x, d_y = self.end - self.start
+        length_squared = d_x * d_x + d_y * d_y
+        if length_squared == 0:
+            return self._always_at_ramp_start(xs, ys)
+        return np.clip(((xs - self.start[0]) * d_x + (ys - self.start[1]) * d_y) / length_squared, 0, 1)
+
+    # Measure the distance of every position from `start`, as a fraction of that of `end`
+    def _blend_radial(self, xs, ys):
+        radius = np.hypot(*(self.end - self.start))
+        if radius == 0:
+            return self._always_at_ramp_start(xs, ys)
+        return np.clip(np.hypot(xs - self.start[0], ys - self.start[1]) / radius, 0, 1)
@@ -0,0 +1,144 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Return a single `PNG` chunk: length, type, data and a checksum over type and data
+def pack_png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+# An `ImageWriter` encodes a single image as a stream of rows, top to bottom, a strip of rows at a time.
+# Every strip is encoded and written out as soon as it is received, so neither the image nor the encoded
+# image is ever held in memory as a whole. Any binary file object with a `write` method will do,
+# including one made from a socket via `socket.makefile('wb')`.
+#
+# Strips are `(rows, width, 3)` arrays of 'RGB' channel data. A writer is used like so:
+#   writer.write_rows(strip_0)
+#   writer.write_rows(strip_1)
+#   ...
+#   writer.close()
+#
+# `ImageWriter` is at the top of an inheritance hierarchy. Derivative instances encode different formats.
+# Each derivative supplies `_write_header`, `_write_strip` and `_write_trailer`.
+
+class ImageWriter:
+
+    # Provide a binary file object to write to, and the dimensions of the image
+    def __init__(self, fp, width, height):
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.num_rows_written = 0
+
+    # Encode and write a strip of rows
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        if rows.shape[1:] != (self.width, 3):
+            raise ValueError(f'Expected rows of shape (n, {self.width}, 3), got {rows.shape}')
+        if self.num_rows_written + len(rows) > self.height:
+            raise ValueError(f'Declared {self.height} rows, but received more')
+
+        # The header is written along with the first strip
+        if self.num_rows_written == 0:
+            self._write_header()
+
+        self._write_strip(rows)
+        self.num_rows_written += len(rows)
+
+    # Finish the image. The file object itself is left open
+    def close(self):
+        if self.num_rows_written != self.height:
+            raise ValueError(f'Declared {self.height} rows, but wrote {self.num_rows_written}')
+        if self.num_rows_written == 0:
+            self._write_header()
+        self._write_trailer()
+
+    def _write_header(self):
+        raise NotImplementedError
+
+    def _write_strip(self, rows):
+        raise NotImplementedError
+
+    def _write_trailer(self):
+        raise NotImplementedError
+
+
+# A `PngWriter` encodes a `PNG`, storing the image as 'RGB' data.
+# Rows are compressed by one running `zlib` stream, and its output is split into image data chunks
+# of at most `chunk_size` bytes as it is produced.
+#
+# Every row is stored as its difference from the row above (the 'Up' filter). Generated images are mostly
+# made of vertical runs, which this turns into runs of zeros that compress far better than the raw rows.
+#
+# Specification: https://www.w3.org/TR/png/
+
+class PngWriter(ImageWriter):
+
+    # Every `PNG` begins with this signature
+    SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+    def __init__(self, fp, width, height, compress_level=6, chunk_size=2 ** 16):
+        super().__init__(fp, width, height)
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(compress_level)
+
+        # Compressed data not yet written out as a chunk
+        self.pending = bytearray()
+
+        # The last row written, which the next row is stored as the difference from. The first row is
+        # stored as the difference from a row of zeros
+        self.previous_row = np.zeros(width * 3, dtype=np.uint8)
+
+    # Write a single `PNG` chunk, see `pack_png_chunk`
+    def _write_chunk(self, chunk_type, data):
+        self.fp.write(pack_png_chunk(chunk_type, data))
+
+    # Write out the pending compressed data as image data chunks. Unless `final`, only full chunks are written
+    def _write_pending(self, final=False):
+        num_full_chunks = len(self.pending) // self.chunk_size
+        end = len(self.pending) if final else num_full_chunks * self.chunk_size
+
+        for start in range(0, end, self.chunk_size):
+            self._write_chunk(b'IDAT', bytes(self.pending[start:min(start + self.chunk_size, end)]))
+        del self.pending[:end]
+
+    def _write_header(self):
+        self.fp.write(self.SIGNATURE)
+        # Width, height, bit depth of 8, color type of 2 (RGB), default compression, filter and interlace
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0))
+
+    def _write_strip(self, rows):
+        rows = rows.reshape(len(rows), self.width * 3)
+
+        # Every row of image data is prefixed with its filter type, `2` (Up).
+        # Channel values wrap around, as the specification requires
+        filtered = np.full((len(rows), 1 + self.width * 3), 2, dtype=np.uint8)
+        np.subtract(rows[:1], self.previous_row, out=filtered[:1, 1:])
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        self.previous_row = rows[-1].copy()
+
+        self.pending += self.compressor.compress(filtered)
+        self._write_pending()
+
+    def _write_trailer(self):
+        self.pending += self.compressor.flush()
+        self._write_pending(final=True)
+        self._write_chunk(b'IEND', b'')
+
+
+# A `PpmWriter` encodes a binary `PPM` (`P6`): a short text header followed by the raw 'RGB' channel data.
+# Nothing is compressed, so this is the fastest format to write, and the largest.
+#
+# Specification: https://netpbm.sourceforge.net/doc/ppm.html
+
+class PpmWriter(ImageWriter):
+
+    def _write_header(self):
+        self.fp.write(f'P6\n{self.width} {self.height}\n255\n'.encode('ascii'))
+
+    def _write_strip(self, rows):
+        self.fp.write(np.ascontiguousarray(rows).data)
+
+    def _write_trailer(self):
+        pass
@@ -0,0 +1,132 @@
+import functools
+import json
+import time
+import tracemalloc
+
+# An `Instrumentation` records what every operation on a `CustomImage` costs:
+#   'seconds': Wall time
+#   'pixels_written': Pixels written to the `Framebuffer`
+#   'pixels_overwritten': Pixels written that were already reserved - overdraw
+#   'colors_generated': Colors generated by the `ColorGenerator`
+#   'peak_memory_bytes': Peak memory allocated during the operation, above what was allocated before it.
+#                        Only recorded with `trace_memory`, as tracing memory slows every allocation down
+#
+# Attach an `Instrumentation` to a `CustomImage` upon instantiation, or at any time after:
+#   instrumentation = Instrumentation(callback=print)
+#   image = CustomImage(1920, 1080, cg, instrumentation=instrumentation)
+#
+# Every operation is recorded as a `dict`, and handed to `callback` as soon as it completes.
+# `report` sums the records up by operation. Operations invoked from within another operation -
+# say, `reserve_background_color` from `reserve_white_background` - are attributed to the outermost one.
+#
+# An image without an `Instrumentation` pays for a single attribute check per operation.
+
+class Instrumentation:
+
+    def __init__(self, callback=None, trace_memory=False):
+        self.callback = callback
+        self.trace_memory = trace_memory
+
+        # `self.records` is of the type `[dict]`, one record per operation, in the order they completed
+        self.records = []
+
+        # The number of operations currently in progress, so that nested operations are not recorded twice
+        self.depth = 0
+
+    # Perform the operation `method` of `image`, and record what it costs
+    def measure(self, image, method, *args, **kwargs):
+        if self.depth > 0:
+            return method(image, *args, **kwargs)
+
+        framebuffer, cg = image.framebuffer, image.cg
+        pixels_written_before = framebuffer.num_pixels_written
+        num_reserved_before = framebuffer.num_reserved
+        # An image may have no `ColorGenerator`, see `CustomImage.from_json`
+        colors_generated_before = getattr(cg, 'num_colors_generated', 0)
+
+        # Start tracing memory, unless it is already being traced
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            memory_before = tracemalloc.get_traced_memory()[0]
+            # Before Python 3.9, the peak cannot be reset, and covers everything traced so far
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+        self.depth += 1
+        error = None
+        start = time.perf_counter()
+        try:
+            return method(image, *args, **kwargs)
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.depth -= 1
+
+            pixels_written = framebuffer.num_pixels_written - pixels_written_before
+            newly_reserved = framebuffer.num_reserved - num_reserved_before
+            record = {
+                'operation': method.__name__,
+                'seconds': seconds,
+                'pixels_written': pixels_written,
+                'pixels_overwritten': pixels_written - newly_reserved,
+                'colors_generated': getattr(cg, 'num_colors_generated', 0) - colors_generated_before,
+            }
+
+            if self.trace_memory:
+                record['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1] - memory_before
+                if started_tracing:
+                    tracemalloc.stop()
+
+            if error is not None:
+                record['error'] = error
+
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    # Sum up the records by operation, and overall. Return a `dict` of the form:
+    #   {'operations': {operation: {'calls': int, 'seconds': float, ...}}, 'total': {'calls': int, ...}}
+    # Peak memory is the maximum over every call, rather than the sum
+    def report(self):
+        operations = {}
+        total = {'calls': 0}
+
+        for record in self.records:
+            summary = operations.setdefault(record['operation'], {'calls': 0})
+            for totals in (summary, total):
+                totals['calls'] += 1
+                for key, value in record.items():
+                    if key == 'peak_memory_bytes':
+                        totals[key] = max(totals.get(key, 0), value)
+                    elif key not in ('operation', 'error'):
+                        totals[key] = totals.get(key, 0) + value
+
+        return {'operations': operations, 'total': total}
+
+    # Serialize the report, and every record, as JSON
+    def to_json(self):
+        return json.dumps(dict(self.report(), records=self.records))
+
+    # Forget every record
+    def reset(self):
+        self.records = []
+
+    # A copy - made along with a copy of its image, say - starts out with no operation in progress
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['depth'] = 0
+        return state
+
+
+# Decorate a public `CustomImage` method to be recorded by the image's `Instrumentation`, if it has one
+def instrumented(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return method(self, *args, **kwargs)
+        return self.instrumentation.measure(self, method, *args, **kwargs)
+    return wrapper
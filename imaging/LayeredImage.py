@@ -0,0 +1,178 @@
+import copy
+
+import numpy as np
+
+from imaging.CustomImage import CustomImage
+
+# A `LayeredImage` stacks named layers, each a `CustomImage` of its own, into one composite `CustomImage`.
+# Layers are ordered bottom to top. Every pixel of the composite takes the color of the topmost layer that
+# reserves it, so a layer covers exactly the pixels it reserves; pixels that no layer reserves stay unreserved.
+#
+# Layers are drawn on like any other `CustomImage`:
+#   image = LayeredImage(1920, 1080, cg)
+#   image.add_layer('background').divide_rectangular_regions(100)
+#   image['background'].reserve_all_rectangular_regions()
+#   image.add_layer('curve').draw_single_variable_function(func, brush_size=5)
+#   image.get_composite().save('scene.png')
+#
+# The composite is cached. Every layer tracks the blocks of pixels it has changed (see `Framebuffer`),
+# and only the blocks changed since the last composite are composited again - redrawing one layer costs that layer's changes, not the scene.
+#
+# `fork` starts a variant of the image cheaply: the variant shares every layer with the original until
+# either of them draws on it, at which point that one copies the layer (copy-on-write). Always draw on
+# layers as returned by `get_layer` (or `add_layer`), rather than on a reference kept from before a `fork`.
+#
+# All layers share the `ColorGenerator` of the `LayeredImage`, and are always stored 'dense'.
+
+class LayeredImage:
+
+    # Provide dimensions and a `ColorGenerator` reference to instantiate a `LayeredImage`, with no layers
+    def __init__(self, x_max, y_max, color_generator):
+        self.size = (x_max, y_max)
+        self.cg = color_generator
+
+        # `self.layers` is of the type `{str : CustomImage}`, ordered bottom to top
+        self.layers = {}
+
+        # Names of the layers that are shared with a fork, and must be copied before they are drawn on
+        self.shared_layers = set()
+
+        # `self.layer_versions` is of the type `{str : int}`, the `Framebuffer.version` of every layer
+        # as of the last composite
+        self.layer_versions = {}
+
+        # The cached composite, and the blocks of it that are out of date regardless of the layers'
+        # own changes - those that a removed or cleared layer used to cover
+        self.composite = CustomImage(x_max, y_max, color_generator)
+        self.stale_blocks = np.zeros(self.composite.framebuffer.block_versions.shape, dtype=bool)
+
+    # Layers
+
+    # Add an empty layer on top of every other, or below the layer named `below`, and return it.
+    # `deferred` is passed on to the layer's `CustomImage`
+    def add_layer(self, name, below=None, deferred=False):
+        if name in self.layers:
+            raise ValueError(f'A layer named {name!r} already exists')
+        if below is not None and below not in self.layers:
+            raise KeyError(below)
+
+        layer = CustomImage(*self.size, self.cg, deferred=deferred)
+        if below is None:
+            self.layers[name] = layer
+        else:
+            layers = {}
+            for other_name, other in self.layers.items():
+                if other_name == below:
+                    layers[name] = layer
+                layers[other_name] = other
+            self.layers = layers
+        return layer
+
+    # Return the layer named `name`, ready to be drawn on
+    def get_layer(self, name):
+        layer = self.layers[name]
+
+        # Copy a shared layer, and keep the copy, which reuses the `ColorGenerator` of this image
+        if name in self.shared_layers:
+            layer = copy.deepcopy(layer, {id(layer.cg): self.cg})
+            self.layers[name] = layer
+            self.shared_layers.discard(name)
+        return layer
+
+    def __getitem__(self, name):
+        return self.get_layer(name)
+
+    def __contains__(self, name):
+        return name in self.layers
+
+    # Return the names of every layer, bottom to top
+    def get_layer_names(self):
+        return list(self.layers)
+
+    # Remove the layer named `name`, uncovering whatever lies beneath it
+    def remove_layer(self, name):
+        layer = self.layers.pop(name)
+        self.shared_layers.discard(name)
+        self.layer_versions.pop(name, None)
+        self._mark_stale(layer)
+
+    # Replace the layer named `name` by an empty one in its place, and return it
+    def clear_layer(self, name):
+        layer = self.layers[name]
+        self.shared_layers.discard(name)
+        self.layer_versions.pop(name, None)
+        self._mark_stale(layer)
+
+        self.layers[name] = CustomImage(*self.size, self.cg, deferred=layer.is_deferred())
+        return self.layers[name]
+
+    # Mark every block that a layer reserves any pixel of as stale
+    def _mark_stale(self, layer):
+        layer.flush()
+        size = layer.framebuffer.DIRTY_BLOCK_SIZE
+        reserved = layer.framebuffer.reserved
+        blocks = np.logical_or.reduceat(reserved, np.arange(0, reserved.shape[0], size), axis=0)
+        blocks = np.logical_or.reduceat(blocks, np.arange(0, reserved.shape[1], size), axis=1)
+        self.stale_blocks |= blocks
+
+    # Forking
+
+    # Return a variant of this image that shares every layer with it, along with a copy of its composite.
+    # The variant draws colors from a copy of the `ColorGenerator`, continuing where this image left off
+    def fork(self):
+        fork = LayeredImage.__new__(LayeredImage)
+        fork.size = self.size
+        fork.cg = copy.deepcopy(self.cg)
+        fork.layers = dict(self.layers)
+        fork.layer_versions = dict(self.layer_versions)
+        fork.composite = copy.deepcopy(self.composite, {id(self.cg): fork.cg})
+        fork.stale_blocks = self.stale_blocks.copy()
+
+        # Both images now copy each layer before drawing on it
+        self.shared_layers = set(self.layers)
+        fork.shared_layers = set(self.layers)
+        return fork
+
+    # Compositing
+
+    # Return the composite of every layer as a `CustomImage`, compositing whatever has changed since last time.
+    # The composite is owned by this image: copy it before drawing on it
+    def get_composite(self):
+        stale_blocks = self.stale_blocks
+        for name, layer in self.layers.items():
+            layer.flush()
+            stale_blocks |= layer.framebuffer.get_dirty_blocks(self.layer_versions.get(name, 0))
+            self.layer_versions[name] = layer.framebuffer.version
+
+        size = self.composite.framebuffer.DIRTY_BLOCK_SIZE
+        for block_y in np.flatnonzero(stale_blocks.any(axis=1)).tolist():
+            # Composite each run of stale blocks along a row of blocks at once
+            row = np.concatenate(([False], stale_blocks[block_y], [False]))
+            edges = np.flatnonzero(row[1:] != row[:-1]).tolist()
+            for start, end in zip(edges[0::2], edges[1::2]):
+                self._composite_rect(start * size, min(end * size, self.size[0]),
+                    block_y * size, min((block_y + 1) * size, self.size[1]))
+
+        stale_blocks[...] = False
+        return self.composite
+
+    # Composite a rectangle of every layer, top to bottom, stopping once every pixel is covered
+    def _composite_rect(self, x_min, x_max, y_min, y_max):
+        framebuffer = self.composite.framebuffer
+        rows, cols = slice(y_min, y_max), slice(x_min, x_max)
+
+        pixels = framebuffer.pixels[rows, cols]
+        pixels[...] = 0
+        covered = np.zeros((y_max - y_min, x_max - x_min), dtype=bool)
+        for layer in reversed(self.layers.values()):
+            uncovered = layer.framebuffer.reserved[rows, cols] & ~covered
+            np.copyto(pixels, layer.framebuffer.pixels[rows, cols], where=uncovered[..., None])
+            covered |= uncovered
+            if covered.all():
+                break
+
+        reserved = framebuffer.reserved[rows, cols]
+        framebuffer.num_reserved += int(np.count_nonzero(covered)) - int(np.count_nonzero(reserved))
+        framebuffer.num_pixels_written += covered.size
+        framebuffer._mark_dirty_rect(x_min, x_max, y_min, y_max)
+        reserved[...] = covered
@@ -0,0 +1,108 @@
+import random
+
+import numpy as np
+
+from imaging.ColorGenerator import ColorGenerator
+from imaging.PositionalColorGenerator import PositionalColorGenerator
+
+# A `PositionalColorGenerator` provides the color of any position of an image, see `PositionalColorGenerator`.
+#
+# The policy for `NoiseColorGenerator` is this: pick a color along the ramp by a smooth, random noise value
+# of every position - clouds, marble, terrain, etc. Two kinds of noise are provided:
+#   'value': Random values at the corners of a grid of cells, `scale` pixels apart, blended smoothly in between.
+#            Blocky, with features aligned to the grid
+#   'perlin': Random gradients at the corners of the grid instead (Perlin noise). Its features are rounder and
+#             far less aligned to the grid
+# Either is summed over `octaves`, each of half the `scale` and `persistence` times the weight of the one
+# before, which adds finer and finer detail.
+#
+# Noise is a function of position only: the same position always takes the same color, and so does the same
+# `seed`. Without a `seed`, one is drawn from the `random` module - seeding `random` beforehand works, too.
+#
+# Specification: Ken Perlin, "Improving Noise" (2002), https://mrl.cs.nyu.edu/~perlin/paper445.pdf
+
+class NoiseColorGenerator(PositionalColorGenerator):
+
+    KINDS = ('value', 'perlin')
+
+    # The lattice repeats every `PERIOD` cells along either axis
+    PERIOD = 256
+
+    # Perlin noise of unit gradients lies within `[-sqrt(1/2), sqrt(1/2)]`
+    PERLIN_RANGE = np.sqrt(0.5)
+
+    def __init__(self, colors, scale=64, kind='perlin', octaves=1, persistence=0.5, seed=None, stops=None,
+            rgb_rel_min=ColorGenerator.RGB_MIN, rgb_rel_max=ColorGenerator.RGB_MAX):
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown noise kind {kind!r}, expected one of {list(self.KINDS)}')
+        super().__init__(colors, stops, rgb_rel_min, rgb_rel_max)
+
+        self.scale = scale
+        self.kind = kind
+        self.octaves = octaves
+        self.persistence = persistence
+
+        # Draw the lattice: a permutation that hashes every corner of a cell, repeated so that the sum of two
+        # entries can be looked up again, along with the value (or the gradient) of every hash
+        rng = np.random.default_rng(random.getrandbits(128) if seed is None else seed)
+        self.permutation = np.tile(rng.permutation(self.PERIOD), 2)
+        self.values = rng.random(self.PERIOD)
+        angles = rng.uniform(0, 2 * np.pi, self.PERIOD)
+        self.gradients_x, self.gradients_y = np.cos(angles), np.sin(angles)
+
+        # Offset every octave, so that the corners of their grids do not line up
+        self.octave_offsets = rng.uniform(0, self.PERIOD, (octaves, 2))
+
+        # Set policy
+        self._internal_function_at = self._sum_octaves
+
+    # Sum the noise of every octave, weighted, and scale the sum back into `[0, 1]`
+    def _sum_octaves(self, xs, ys):
+        noise = self._value_noise if self.kind == 'value' else self._perlin_noise
+        total = np.zeros(np.broadcast_shapes(xs.shape, ys.shape))
+        frequency, weight, total_weight = 1 / self.scale, 1.0, 0.0
+
+        for offset_x, offset_y in self.octave_offsets.tolist():
+            total += weight * noise(xs * frequency + offset_x, ys * frequency + offset_y)
+            total_weight += weight
+            frequency, weight = frequency * 2, weight * self.persistence
+        return total / total_weight
+
+    # Split positions, in units of cells, into the cells they fall into and their offsets within them.
+    # Return the hashes of the four corners of every cell, along with the offsets `(f_x, f_y)`
+    def _get_cells(self, xs, ys):
+        cells_x, cells_y = np.floor(xs), np.floor(ys)
+        f_x, f_y = xs - cells_x, ys - cells_y
+
+        permutation = self.permutation
+        i_x, i_y = cells_x.astype(np.int64) % self.PERIOD, cells_y.astype(np.int64) % self.PERIOD
+        left, right = permutation[i_x], permutation[i_x + 1]
+        corners = (permutation[left + i_y], permutation[right + i_y],
+            permutation[left + i_y + 1], permutation[right + i_y + 1])
+        return corners, f_x, f_y
+
+    # Blend the values of the corners of every cell, weighted by `6t^5 - 15t^4 + 10t^3` along either axis
+    def _blend(self, top_left, top_right, bottom_left, bottom_right, f_x, f_y):
+        u = f_x * f_x * f_x * (f_x * (f_x * 6 - 15) + 10)
+        v = f_y * f_y * f_y * (f_y * (f_y * 6 - 15) + 10)
+        top = top_left + u * (top_right - top_left)
+        bottom = bottom_left + u * (bottom_right - bottom_left)
+        return top + v * (bottom - top)
+
+    # Value noise, within `[0, 1]`
+    def _value_noise(self, xs, ys):
+        corners, f_x, f_y = self._get_cells(xs, ys)
+        return self._blend(*(self.values[corner] for corner in corners), f_x, f_y)
+
+    # Perlin noise, scaled from `[-PERLIN_RANGE, PERLIN_RANGE]` into `[0, 1]`.
+    # Every corner contributes the dot product of its gradient with the offset of the position from it
+    def _perlin_noise(self, xs, ys):
+        (top_left, top_right, bottom_left, bottom_right), f_x, f_y = self._get_cells(xs, ys)
+        gradients_x, gradients_y = self.gradients_x, self.gradients_y
+
+        def contribution(corner, d_x, d_y):
+            return gradients_x[corner] * d_x + gradients_y[corner] * d_y
+
+        noise = self._blend(contribution(top_left, f_x, f_y), contribution(top_right, f_x - 1, f_y),
+            contribution(bottom_left, f_x, f_y - 1), contribution(bottom_right, f_x - 1, f_y - 1), f_x, f_y)
+        return np.clip(noise / (2 * self.PERLIN_RANGE) + 0.5, 0, 1)
@@ -0,0 +1,132 @@
+import numpy as np
+from PIL import Image
+
+from imaging.Framebuffer import Framebuffer, as_color_array, pack_colors
+
+# A `Framebuffer` stores the pixel data behind a `CustomImage`.
+#
+# A `PaletteFramebuffer` stores one palette index per pixel instead of three channel values.
+# The palette is an `(n, 3)` array of colors, one row per color, that grows as new colors are drawn.
+# Indices are single bytes while the palette holds at most 256 colors, and widen to two bytes beyond that.
+#
+# Images built from a small, finite set of colors - such as the pool of a `RingColorGenerator` -
+# take a third of the memory of RGB channel data, and can be encoded directly as palette images.
+
+class PaletteFramebuffer(Framebuffer):
+
+    # Limits on the number of palette colors for one- and two-byte indices
+    MAX_BYTE_PALETTE_SIZE = 2 ** 8
+    MAX_PALETTE_SIZE = 2 ** 16
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        # Allocate the palette indices and the reservation mask
+        self.indices = np.zeros((height, width), dtype=np.uint8)
+        self.reserved = np.zeros((height, width), dtype=bool)
+        self.num_reserved = 0
+        self.num_pixels_written = 0
+        self._allocate_block_versions()
+
+        # Allocate the palette, along with a lookup of each color's index.
+        # `palette_lookup` is keyed by a color packed into an integer: `0xRRGGBB`
+        self.palette = np.empty((0, self.NUM_CHANNELS), dtype=np.uint8)
+        self.palette_lookup = {}
+
+    # Add colors to the palette, skipping colors that are already in it,
+    # and return the palette index of every color
+    def add_colors_to_palette(self, colors):
+        colors = as_color_array(colors).reshape(-1, self.NUM_CHANNELS)
+        unique_keys, first_occurrences, inverse = np.unique(pack_colors(colors),
+            return_index=True, return_inverse=True)
+
+        # Append the missing colors in the order they first occur
+        missing = [i for i in np.argsort(first_occurrences) if int(unique_keys[i]) not in self.palette_lookup]
+        if missing:
+            if len(self.palette) + len(missing) > self.MAX_PALETTE_SIZE:
+                raise ValueError(f'A palette can hold at most {self.MAX_PALETTE_SIZE} colors')
+
+            for i in missing:
+                self.palette_lookup[int(unique_keys[i])] = len(self.palette_lookup)
+            self.palette = np.concatenate((self.palette, colors[first_occurrences[missing]]))
+
+            # Widen the indices once they no longer fit into a single byte
+            if len(self.palette) > self.MAX_BYTE_PALETTE_SIZE and self.indices.dtype == np.uint8:
+                self.indices = self.indices.astype(np.uint16)
+
+        unique_indices = np.array([self.palette_lookup[int(key)] for key in unique_keys], dtype=self.indices.dtype)
+        return unique_indices[inverse.reshape(-1)]
+
+    # Reserve every pixel within a rectangle as a single color
+    def fill_rect(self, x_min, x_max, y_min, y_max, color):
+        self.indices[y_min:y_max, x_min:x_max] = self.add_colors_to_palette(color)[0]
+        self._mark_rect(slice(y_min, y_max), slice(x_min, x_max))
+
+    # Reserve a scattered set of pixels, given as parallel arrays of coordinates.
+    # `colors` is either a single color or one color per pixel, as an `(n, 3)` array.
+    # If a pixel is listed more than once, the last occurrence wins.
+    def fill_pixels(self, xs, ys, colors):
+        indices = self.add_colors_to_palette(colors)
+        self.indices[ys, xs] = indices if as_color_array(colors).ndim == 2 else indices[0]
+        self._mark_pixels(xs, ys)
+
+    # Reserve the pixels of a rectangle, with top-left corner `(x_min, y_min)`, wherever the
+    # boolean array `mask` - of the same shape as the rectangle - is `True`, as a single color
+    def fill_mask(self, x_min, y_min, mask, color):
+        rows, cols = slice(y_min, y_min + mask.shape[0]), slice(x_min, x_min + mask.shape[1])
+        self.indices[rows, cols][mask] = self.add_colors_to_palette(color)[0]
+        self._mark_mask(rows, cols, mask)
+
+    # Reserve the pixels of a rectangle wherever `mask` is `True`, each as its own color, see `Framebuffer.fill_mask_colors`
+    def fill_mask_colors(self, x_min, y_min, mask, colors):
+        rows, cols = slice(y_min, y_min + mask.shape[0]), slice(x_min, x_min + mask.shape[1])
+        self.indices[rows, cols][mask] = self.add_colors_to_palette(colors[mask])
+        self._mark_mask(rows, cols, mask)
+
+    # Reserve many one-pixel-wide spans, each as a single color, see `Framebuffer.fill_spans`
+    def fill_spans(self, positions, lows, highs, colors, vertical=True):
+        indices = self.indices.T if vertical else self.indices
+
+        # Look up the palette index of every span's color at once
+        palette_indices = self.add_colors_to_palette(colors).tolist()
+
+        for position, low, high, index in zip(positions.tolist(), lows.tolist(), highs.tolist(), palette_indices):
+            indices[position, low:high] = index
+        self._mark_spans(positions, lows, highs, vertical)
+
+    # Reserve every pixel with the channel data of `rgb`, an `(height, width, 3)` array of `uint8`.
+    # Every distinct color of `rgb` is added to the palette
+    def load_rgb_array(self, rgb):
+        indices = self.add_colors_to_palette(rgb.reshape(-1, self.NUM_CHANNELS))
+        self.indices = indices.reshape(self.height, self.width)
+        self._mark_rect(slice(None), slice(None))
+
+    # Replace the color of every reserved pixel, see `Framebuffer.map_colors`.
+    # Only the palette is mapped, never the pixels themselves. Colors may end up in the palette more than once
+    def map_colors(self, function):
+        self.palette = function(self.palette)
+        self.palette_lookup = {}
+        for index, key in enumerate(pack_colors(self.palette).tolist()):
+            self.palette_lookup.setdefault(key, index)
+        self.num_pixels_written += self.num_reserved
+        self._mark_dirty_rect(0, self.width, 0, self.height)
+
+    # Expand the palette indices into an `(height, width, 3)` array of channel data
+    def to_rgb_array(self):
+        return self.palette[self.indices]
+
+    # Expand the palette indices of the rows `[y_min, y_max)` into channel data
+    def get_rgb_rows(self, y_min, y_max):
+        return self.palette[self.indices[y_min:y_max]]
+
+    # Turn the pixel data into a `PIL.Image`.
+    # While the palette fits into a single byte per pixel, this is a 'P' (palette) mode image
+    # sharing memory with the indices. Otherwise it is expanded into an 'RGB' mode image.
+    def to_pil(self):
+        if self.indices.dtype != np.uint8:
+            return super().to_pil()
+
+        image = Image.frombuffer('P', (self.width, self.height), self.indices, 'raw', 'P', 0, 1)
+        image.putpalette(self.palette.tobytes())
+        return image
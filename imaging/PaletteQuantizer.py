@@ -0,0 +1,87 @@
+import numpy as np
+
+from imaging.exceptions import EmptyColorPoolError
+from imaging.Framebuffer import as_color_array, pack_colors
+
+# A `PaletteQuantizer` maps colors to the nearest color of a fixed palette, such as the pool of a
+# `RingColorGenerator`. Distance is the Euclidean distance between RGB channel values. A color equally
+# near to several palette colors maps to the one that comes first in the palette.
+#
+# Rather than comparing every pixel against every palette color, the quantizer keeps a lookup table
+# over the whole RGB space, with one entry per 24-bit color. An entry is only filled in the first time
+# its color is quantized: only the distinct colors not seen before are compared against the palette,
+# and every pixel is then a single table lookup. A photo holds far fewer distinct colors than pixels,
+# and the table keeps paying off across every further image quantized to the same palette.
+#
+# The table takes two bytes per entry, 32 MiB in all, and is allocated upon the first quantization.
+
+class PaletteQuantizer:
+
+    # Number of entries in the lookup table, one per 24-bit color
+    NUM_COLORS = 2 ** 24
+
+    # Bound the size of the temporary array of distances between new colors and palette colors
+    MAX_DISTANCES_PER_PASS = 2 ** 22
+
+    # Beyond this many new colors, they are found with a table of the whole RGB space rather than by sorting
+    MAX_COLORS_TO_SORT = 2 ** 20
+
+    def __init__(self, colors):
+        colors = as_color_array(colors).reshape(-1, 3)
+        if len(colors) == 0:
+            raise EmptyColorPoolError
+
+        # Pools repeat colors for artistic control. Keep each color once, in the order it first appears
+        _, first_occurrences = np.unique(pack_colors(colors), return_index=True)
+        self.palette = colors[np.sort(first_occurrences)]
+
+        # `lookup` holds the palette index of every 24-bit color quantized so far, `-1` for the rest
+        self.lookup = None
+
+    # Return the palette index nearest to each color of `colors`, an `(..., 3)` array
+    def quantize_indices(self, colors):
+        if self.lookup is None:
+            self.lookup = np.full(self.NUM_COLORS, -1, dtype=np.int16 if len(self.palette) < 2 ** 15 else np.int32)
+
+        keys = pack_colors(as_color_array(colors))
+        indices = self.lookup[keys]
+
+        # Fill in the table for every color not quantized before, and look those colors up again
+        unknown = indices < 0
+        num_unknown = int(np.count_nonzero(unknown))
+        if num_unknown > 0:
+            new_keys = keys[unknown]
+            if num_unknown <= self.MAX_COLORS_TO_SORT:
+                new_keys = np.unique(new_keys)
+            else:
+                seen = np.zeros(self.NUM_COLORS, dtype=bool)
+                seen[new_keys] = True
+                new_keys = np.flatnonzero(seen).astype(np.uint32)
+
+            self.lookup[new_keys] = self._find_nearest(new_keys)
+            indices[unknown] = self.lookup[keys[unknown]]
+
+        return indices
+
+    # Return the palette color nearest to each color of `colors`, as an array of the same shape
+    def quantize(self, colors):
+        return np.take(self.palette, self.quantize_indices(colors), axis=0)
+
+    # Compare colors, packed as `0xRRGGBB`, against every palette color and return the index of the nearest.
+    #
+    # The squared distance `|c - p|^2` expands to `|c|^2 - 2 c.p + |p|^2`. `|c|^2` is the same for every
+    # palette color, so the nearest is the one minimizing `|p|^2 - 2 c.p`, one matrix product for all colors.
+    # Every term is an integer below `2^24`, so `float32` holds it exactly and ties are still broken exactly.
+    def _find_nearest(self, keys):
+        channels = np.stack((keys >> 16, (keys >> 8) & 0xFF, keys & 0xFF), axis=-1).astype(np.float32)
+        palette = self.palette.astype(np.float32)
+        squared_norms = (palette * palette).sum(axis=1)
+        nearest = np.empty(len(keys), dtype=self.lookup.dtype)
+
+        chunk_size = max(self.MAX_DISTANCES_PER_PASS // len(palette), 1)
+        for start in range(0, len(keys), chunk_size):
+            distances = squared_norms - 2 * (channels[start:start + chunk_size] @ palette.T)
+            # `argmin` picks the first of equally near palette colors
+            nearest[start:start + chunk_size] = distances.argmin(axis=1)
+
+        return nearest
@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+
+from imaging.ColorGenerator import ColorGenerator
+from imaging.exceptions import EmptyColorPoolError
+from imaging.Framebuffer import as_color_array
+from imaging.RingColorGenerator import RingColorGenerator
+
+# A `PositionalColorGenerator` provides the color of any position of an image, so that colors can vary
+# across a single region or slice - gradients, noise, etc.
+#
+# Colors are requested for many positions at once, as arrays of image coordinates (`x` to the right, `y` down,
+# like `CustomImage.find_rectangular_region`), and generated in one vectorized pass: see `generate_colors_at`.
+# Every `PositionalColorGenerator` has an `_internal_function_at` - a bound method that enforces its policy by
+# mapping positions to values within `[0, 1]`. Each value picks a color along a ramp:
+#   - `colors` are spread along the ramp, evenly or at the values of `stops`, and blended linearly in between.
+#     A `RingColorGenerator` lends its pool, in order
+#   - The ramp is sampled into a table of `RAMP_LEVELS` colors once, so that coloring is a single lookup per position
+# The policy for the parent-level `PositionalColorGenerator` is this: every position is at the start of the ramp.
+#
+# A `PositionalColorGenerator` is a `ColorGenerator` too. Asked for colors without any positions, it provides
+# the color of the origin - so a curve or dot drawn with one is a single color.
+
+class PositionalColorGenerator(ColorGenerator):
+
+    # The number of colors that the ramp is sampled into
+    RAMP_LEVELS = 1024
+
+    # Bound the number of positions colored in one pass, see `generate_colors_at`
+    MAX_POSITIONS_PER_PASS = 2 ** 17
+
+    def __init__(self, colors=(b'\x00\x00\x00',), stops=None, rgb_rel_min=ColorGenerator.RGB_MIN,
+            rgb_rel_max=ColorGenerator.RGB_MAX):
+        super().__init__(rgb_rel_min, rgb_rel_max)
+        self.set_ramp(colors, stops)
+
+        # Set policy
+        self._internal_function = self._generate_color_at_origin
+        self._internal_function_at = self._always_at_ramp_start
+
+    # Spread `colors` along the ramp, at `stops` - increasing values within `[0, 1]`, one per color - or evenly
+    def set_ramp(self, colors, stops=None):
+        if isinstance(colors, RingColorGenerator):
+            colors = colors.pool
+        if len(colors) == 0:
+            raise EmptyColorPoolError
+
+        # Colors may be listed as `bytes` or `bytearray`s just as well as sequences of channel values
+        if isinstance(colors, (list, tuple)):
+            colors = np.stack([as_color_array(color) for color in colors])
+        colors = as_color_array(colors).reshape(-1, 3)
+
+        stops = np.linspace(0, 1, len(colors)) if stops is None else np.asarray(stops, dtype=float)
+        if stops.shape != (len(colors),):
+            raise ValueError(f'Expected one stop per color, {len(colors)} in all, not {stops.shape}')
+
+        # Sample every channel of the ramp into `self.ramp`, an `(RAMP_LEVELS, 3)` array of `uint8`
+        levels = np.linspace(0, 1, self.RAMP_LEVELS)
+        channels = [np.rint(np.interp(levels, stops, colors[:, channel])) for channel in range(3)]
+        self.ramp = self.ints_to_rgbs(*channels)
+
+    # Enforce the policy of the parent-level `PositionalColorGenerator`
+    def _always_at_ramp_start(self, xs, ys):
+        return np.zeros(np.broadcast_shapes(xs.shape, ys.shape))
+
+    def _generate_color_at_origin(self):
+        return bytearray(self.generate_colors_at(0, 0).tobytes())
+
+    # Generate `n` colors without any positions: the color of the origin, `n` times
+    def generate_colors(self, n):
+        return np.repeat(self.generate_colors_at([0], [0]), n, axis=0)
+
+    # Generate the color of every position `(xs[i], ys[i])`, given as arrays (or scalars) of image coordinates.
+    # Return an array of shape `xs.shape + (3,)` of `uint8` channel data, one color per position.
+    #
+    # `xs` and `ys` are broadcast against each other. To color a whole grid of pixels, pass a single row of every
+    # `x` and a single column of every `y`: whatever depends on `x` (or `y`) alone is then only computed once per
+    # column (or row) of the grid, rather than once per pixel. Positions are colored a band of rows at a time,
+    # so that the temporary arrays of a policy stay small enough to be cached
+    def generate_colors_at(self, xs, ys):
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        shape = np.broadcast_shapes(xs.shape, ys.shape)
+        self.num_colors_generated += math.prod(shape)
+        if len(shape) == 0:
+            return self._color_positions(xs, ys)
+
+        colors = np.empty(shape + (3,), dtype=np.uint8)
+        rows_per_pass = max(self.MAX_POSITIONS_PER_PASS // max(math.prod(shape[1:]), 1), 1)
+        for start in range(0, shape[0], rows_per_pass):
+            # Coordinates that are broadcast along the rows are passed whole
+            band = slice(start, start + rows_per_pass)
+            colors[band] = self._color_positions(*(coords[band] if coords.ndim == len(shape) and len(coords) > 1
+                else coords for coords in (xs, ys)))
+        return colors
+
+    # Color positions along the ramp, by the values of the policy
+    def _color_positions(self, xs, ys):
+        # Round every value to the nearest level of the ramp. Undefined values are taken to be at its start
+        levels = np.asarray(self._internal_function_at(xs, ys) * (self.RAMP_LEVELS - 1) + 0.5)
+        np.fmax(levels, 0, out=levels)
+        np.fmin(levels, self.RAMP_LEVELS - 1, out=levels)
+        return self.ramp[levels.astype(np.intp)]
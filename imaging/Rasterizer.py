@@ -0,0 +1,342 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from imaging.Brush import Brush
+from imaging.Framebuffer import as_color_array
+from imaging.SharedFramebuffer import SharedFramebuffer
+
+# A `Rasterizer` turns the drawing commands of a `CustomImage` (see `CommandBuffer`) into pixels.
+#
+# Commands can be rasterized for the whole image, or for one horizontal band of rows at a time.
+# A band only ever writes its own rows, and every pixel depends only on the commands that cover it,
+# so rasterizing every band - in any order, or in parallel - gives exactly the same pixels as
+# rasterizing the whole image at once. `rasterize_parallel` hands the bands to a pool of processes,
+# which all write into one `SharedFramebuffer`.
+
+class Rasterizer:
+
+    # Bound the size of the temporary index arrays and of the ownership grid of `resolve_stamps`
+    MAX_INDICES_PER_PASS = 2 ** 20
+    MAX_OWNER_AREA = 2 ** 24
+
+    # Bands are handed out to the processes of `rasterize_parallel` one at a time, several per process,
+    # so that a process that finishes early can pick up another band
+    BANDS_PER_PROCESS = 4
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    # Rasterize `commands` into `framebuffer`, touching only the rows `[y_min, y_max)`.
+    #
+    # Commands are walked from last to first. A pixel is claimed by the first command to cover it -
+    # which is the last command to draw it - and every older command skips it. So every pixel is
+    # written exactly once, and overdrawn pixels are never written.
+    def rasterize(self, commands, framebuffer, y_min=0, y_max=None):
+        y_max = self.height if y_max is None else y_max
+        claimed = np.zeros((y_max - y_min, self.width), dtype=bool)
+        num_unclaimed = claimed.size
+
+        for command in reversed(commands):
+            # Older commands cannot show through once every pixel is claimed
+            if num_unclaimed == 0:
+                break
+
+            if command[0] == 'rect':
+                _, rect_x_min, rect_x_max, rect_y_min, rect_y_max, color = command
+
+                # Clip the rectangle to the band
+                rect_y_min, rect_y_max = max(rect_y_min, y_min), min(rect_y_max, y_max)
+                if rect_y_min >= rect_y_max:
+                    continue
+                band_rows = slice(rect_y_min - y_min, rect_y_max - y_min)
+
+                unclaimed = ~claimed[band_rows, rect_x_min:rect_x_max]
+                num_newly_claimed = int(unclaimed.sum())
+
+                if num_newly_claimed == unclaimed.size:
+                    framebuffer.fill_rect(rect_x_min, rect_x_max, rect_y_min, rect_y_max, color)
+                elif num_newly_claimed > 0:
+                    framebuffer.fill_mask(rect_x_min, rect_y_min, unclaimed, color)
+
+                claimed[band_rows, rect_x_min:rect_x_max] = True
+                num_unclaimed -= num_newly_claimed
+
+            elif command[0] == 'mask':
+                _, mask_x_min, mask_y_min, mask, colors = command
+
+                # Clip the mask to the band
+                mask_rows = slice(max(y_min - mask_y_min, 0), min(y_max - mask_y_min, mask.shape[0]))
+                if mask_rows.start >= mask_rows.stop:
+                    continue
+                band_rows = slice(mask_y_min + mask_rows.start - y_min, mask_y_min + mask_rows.stop - y_min)
+                band_cols = slice(mask_x_min, mask_x_min + mask.shape[1])
+
+                unclaimed = mask[mask_rows] & ~claimed[band_rows, band_cols]
+                num_newly_claimed = int(unclaimed.sum())
+                if num_newly_claimed > 0:
+                    framebuffer.fill_mask_colors(mask_x_min, mask_y_min + mask_rows.start, unclaimed,
+                        colors[mask_rows])
+
+                claimed[band_rows, band_cols] |= unclaimed
+                num_unclaimed -= num_newly_claimed
+
+            else:
+                _, centers_x, centers_y, brush, colors = command
+                if command[0] == 'squares':
+                    brush = Brush.get('square', brush)
+                chunks = list(self.resolve_stamps(centers_x, centers_y, brush, colors, y_min, y_max))
+
+                # Later chunks of stamps win over earlier ones, so they are claimed first as well
+                for xs, ys, chunk_colors in reversed(chunks):
+                    unclaimed = ~claimed[ys - y_min, xs]
+                    xs, ys = xs[unclaimed], ys[unclaimed]
+                    if chunk_colors.ndim == 2:
+                        chunk_colors = chunk_colors[unclaimed]
+
+                    framebuffer.fill_pixels(xs, ys, chunk_colors)
+                    claimed[ys - y_min, xs] = True
+                    num_unclaimed -= len(xs)
+
+    # Rasterize `commands` into `framebuffer` across `processes` processes, each rasterizing one horizontal
+    # band of rows at a time. The result is identical to that of `rasterize`.
+    #
+    # `framebuffer` must be a `SharedFramebuffer`, which the processes write into directly.
+    def rasterize_parallel(self, commands, framebuffer, processes):
+        with ProcessPoolExecutor(processes, initializer=_set_band_worker,
+                initargs=(framebuffer.name, self.width, self.height, commands)) as executor:
+            num_pixels_written = sum(executor.map(_rasterize_band, self.get_bands(processes * self.BANDS_PER_PROCESS)))
+
+        framebuffer.num_reserved = int(np.count_nonzero(framebuffer.reserved))
+        framebuffer.num_pixels_written += num_pixels_written
+        framebuffer._mark_dirty_rect(0, self.width, 0, self.height)
+
+    # Split the image into at most `num_bands` horizontal bands of rows of about equal height.
+    # Return the bands as a list of `(y_min, y_max)`
+    def get_bands(self, num_bands):
+        edges = np.linspace(0, self.height, min(num_bands, self.height) + 1).astype(int).tolist()
+        return [(y_min, y_max) for y_min, y_max in zip(edges, edges[1:]) if y_min < y_max]
+
+    # Work out which pixels are covered by stamping `brush` (see `Brush`) at each center in `centers_x`, `centers_y`,
+    # and with which color. A later stamp wins over an earlier one. `colors` is either a single color or an
+    # `(n, 3)` array of one color per center.
+    #
+    # Stamps are resolved in chunks, each yielded as `(xs, ys, colors)` with every pixel listed once.
+    # Writing the chunks in order gives the final result. Only pixels within the rows `[y_min, y_max)`
+    # are yielded, if specified.
+    def resolve_stamps(self, centers_x, centers_y, brush, colors, y_min=0, y_max=None):
+        colors = as_color_array(colors)
+
+        # Skip the stamps that do not reach into the band at all
+        if y_min > 0 or (y_max is not None and y_max < self.height):
+            y_max = self.height if y_max is None else y_max
+            stamp_y_min = np.clip(centers_y - brush.k_y, 0, self.height - 1)
+            stamp_y_max = np.clip(centers_y + brush.k_y, 0, self.height - 1)
+            in_band = (stamp_y_max >= y_min) & (stamp_y_min < y_max)
+
+            centers_x, centers_y = centers_x[in_band], centers_y[in_band]
+            if colors.ndim == 2:
+                colors = colors[in_band]
+        else:
+            y_max = self.height
+
+        # Chunks are resolved in order, so later stamps still win over earlier ones
+        chunk_size = max(self.MAX_INDICES_PER_PASS // brush.mask.shape[0], 1)
+        chunks = [(start, min(start + chunk_size, len(centers_x))) for start in range(0, len(centers_x), chunk_size)]
+        chunks.reverse()
+
+        while chunks:
+            start, end = chunks.pop()
+            box = self._get_stamps_bounding_box(centers_x[start:end], centers_y[start:end], brush)
+            box_x_min, box_x_max, box_y_min, box_y_max = box
+
+            # Split chunks whose stamps are spread across too large an area
+            if (box_x_max - box_x_min + 1) * (box_y_max - box_y_min + 1) > self.MAX_OWNER_AREA and end - start > 1:
+                middle = (start + end) // 2
+                chunks.extend([(middle, end), (start, middle)])
+                continue
+
+            chunk_colors = colors[start:end] if colors.ndim == 2 else colors
+            xs, ys, chunk_colors = self._resolve_stamps_in_box(centers_x[start:end], centers_y[start:end], brush,
+                chunk_colors, box)
+
+            # Stamps reaching across the edge of the band also cover pixels outside of it
+            if box_y_min < y_min or box_y_max >= y_max:
+                in_band = (ys >= y_min) & (ys < y_max)
+                xs, ys = xs[in_band], ys[in_band]
+                if chunk_colors.ndim == 2:
+                    chunk_colors = chunk_colors[in_band]
+
+            yield xs, ys, chunk_colors
+
+    # Return the bounding box `(x_min, x_max, y_min, y_max)`, inclusive, of stamps clamped to the image
+    def _get_stamps_bounding_box(self, centers_x, centers_y, brush):
+        x_max, y_max = self.width - 1, self.height - 1
+        k_x, k_y = brush.k_x, brush.k_y
+        return (max(min(int(centers_x.min()) - k_x, x_max), 0), min(max(int(centers_x.max()) + k_x, 0), x_max),
+                max(min(int(centers_y.min()) - k_y, y_max), 0), min(max(int(centers_y.max()) + k_y, 0), y_max))
+
+    # Resolve stamps that all lie within the bounding box `box`, see `resolve_stamps`
+    def _resolve_stamps_in_box(self, centers_x, centers_y, brush, colors, box):
+        # A square brush is clamped to the image just like `CustomImage._reserve_square` does, any other is clipped
+        x_max, y_max = self.width - 1, self.height - 1
+        box_x_min, box_x_max, box_y_min, box_y_max = box
+        clamped = brush.is_square()
+
+        # Only sweep the offsets of the brush that land on the image for some stamp. Every other offset lands off
+        # the image for every stamp: it is either clipped, or clamped onto the same edge as the outermost offset swept
+        dx_min, dx_max = self._get_offsets_on_image(centers_x, brush.k_x, x_max)
+        dy_min, dy_max = self._get_offsets_on_image(centers_y, brush.k_y, y_max)
+
+        # Track which stamp last covered each pixel of the bounding box.
+        # Stamps overlap, so a later stamp must win over an earlier one.
+        box_width = box_x_max - box_x_min + 1
+        owner = np.full((box_y_max - box_y_min + 1, box_width), -1, dtype=np.int32)
+        flat_owner = owner.reshape(-1)
+
+        rows = centers_y[:, np.newaxis] + np.arange(dy_min, dy_max + 1)
+        rows_inside = (rows >= 0) & (rows <= y_max)
+        row_starts = (np.clip(rows, 0, y_max) - box_y_min) * box_width
+        order = np.arange(len(centers_x), dtype=np.int32)[:, np.newaxis]
+
+        # Sweep one column of the brush, across every stamp, at a time
+        for dx, column_rows in brush.columns:
+            column_rows = column_rows[(column_rows >= dy_min + brush.k_y) & (column_rows <= dy_max + brush.k_y)]
+            if not dx_min <= dx <= dx_max or len(column_rows) == 0:
+                continue
+            column_rows -= dy_min + brush.k_y
+
+            # A column that spans every row swept needs no gathering
+            full = len(column_rows) == rows.shape[1]
+            cols = centers_x + dx
+            column_row_starts = row_starts if full else row_starts[:, column_rows]
+            indices = column_row_starts + (np.clip(cols, 0, x_max) - box_x_min)[:, np.newaxis]
+
+            # Flattened in order of the stamps, which the writes below rely on
+            if clamped and full:
+                column_order = order
+            elif clamped:
+                indices, column_order = indices.ravel(), np.broadcast_to(order, indices.shape).ravel()
+            else:
+                inside = rows_inside[:, column_rows] & ((cols >= 0) & (cols <= x_max))[:, np.newaxis]
+                indices, column_order = indices[inside], np.broadcast_to(order, inside.shape)[inside]
+
+            # Reading before writing keeps the highest index even when a pixel repeats
+            flat_owner[indices] = np.maximum(flat_owner[indices], column_order)
+
+        # Every covered pixel takes the color of the stamp that owns it
+        ys, xs = np.nonzero(owner >= 0)
+        if colors.ndim == 2:
+            colors = colors[owner[ys, xs]]
+        return xs + box_x_min, ys + box_y_min, colors
+
+    # Return the range `[offset_min, offset_max]` of the offsets within `[-k, k]` that land within `[0, limit]`
+    # from some center along one axis. Should no offset land there, the range is the single offset closest to it
+    def _get_offsets_on_image(self, centers, k, limit):
+        offset_min, offset_max = max(-k, -int(centers.max())), min(k, limit - int(centers.min()))
+        return min(offset_min, k), max(offset_max, -k)
+
+    # Work out the pixels covered by straight line segments from `(x_0, y_0)` to `(x_1, y_1)`, given as arrays
+    # of image coordinates, with a square brush of side length `2k + 1` - the same pixels as stamping a square at
+    # every step of the segment, as `CustomImage.draw_line_segments` does. Segments are clipped to the image.
+    #
+    # Every segment is returned as one-pixel-wide spans across its major axis, one per column (or row) it covers,
+    # rather than as a square per step: a thick segment costs the pixels it covers, not `(2k + 1) ** 2` per step.
+    # Return `(positions, lows, highs, ids, vertical)`, one element per span, see `Framebuffer.fill_spans`.
+    # `ids` maps each span to its segment, in order, and `vertical` is `True` for the spans of segments that
+    # run more along `x` than along `y`. Spans may still reach past the edges of the image.
+    def resolve_segment_spans(self, x_0, y_0, x_1, y_1, k):
+        x_0, y_0, x_1, y_1, ids = self.clip_segments(x_0, y_0, x_1, y_1, k)
+
+        # Work along the major axis `a` of every segment, in increasing order, and across its minor axis `b`
+        vertical = np.abs(x_1 - x_0) >= np.abs(y_1 - y_0)
+        a_0, b_0, a_1, b_1 = np.where(vertical, x_0, y_0), np.where(vertical, y_0, x_0), \
+            np.where(vertical, x_1, y_1), np.where(vertical, y_1, x_1)
+        backwards = a_1 < a_0
+        a_0, b_0, a_1, b_1 = np.where(backwards, a_1, a_0), np.where(backwards, b_1, b_0), \
+            np.where(backwards, a_0, a_1), np.where(backwards, b_0, b_1)
+        num_steps, d_b = a_1 - a_0, b_1 - b_0
+
+        # Every step is stamped with a square, so the brush reaches `k` spans past either end of a segment
+        num_spans = num_steps + 2 * k + 1
+        span_ids = np.repeat(np.arange(len(a_0)), num_spans)
+        offsets = np.arange(len(span_ids)) - np.repeat(np.cumsum(num_spans) - num_spans, num_spans) - k
+
+        # A span gathers the squares of the steps within `k` of it. The segment is monotonic across its minor
+        # axis, so those squares reach furthest at the first and last of these steps. Steps are rounded to the
+        # nearest pixel with integer arithmetic only, just like `CustomImage.draw_line_segments` does
+        steps, divisor, d_b, b_0 = num_steps[span_ids], np.maximum(num_steps, 1)[span_ids], d_b[span_ids], b_0[span_ids]
+        first, last = np.clip(offsets - k, 0, steps), np.clip(offsets + k, 0, steps)
+        b_first = b_0 + (2 * d_b * first + divisor) // (2 * divisor)
+        b_last = b_0 + (2 * d_b * last + divisor) // (2 * divisor)
+
+        return (a_0[span_ids] + offsets, np.minimum(b_first, b_last) - k, np.maximum(b_first, b_last) + k + 1,
+            ids[span_ids], vertical[span_ids])
+
+
+    # Work out every step of straight line segments from `(x_0, y_0)` to `(x_1, y_1)`, given as arrays of image
+    # coordinates: one pixel per step along the major axis of each segment, for a brush that reaches `k` pixels
+    # from its center to be stamped at. Segments are clipped to the image, widened by `k`.
+    # Return `(xs, ys, ids)`, one element per step, in order. `ids` maps each step to its segment
+    def resolve_segment_steps(self, x_0, y_0, x_1, y_1, k):
+        x_0, y_0, x_1, y_1, ids = self.clip_segments(x_0, y_0, x_1, y_1, k)
+        d_x, d_y = x_1 - x_0, y_1 - y_0
+
+        # A segment of `n` steps covers `n + 1` pixels along its major axis
+        num_steps = np.maximum(np.abs(d_x), np.abs(d_y))
+        num_pixels = num_steps + 1
+        step_ids = np.repeat(np.arange(len(x_0)), num_pixels)
+        steps = np.arange(len(step_ids)) - np.repeat(np.cumsum(num_pixels) - num_pixels, num_pixels)
+
+        # Steps are rounded to the nearest pixel with integer arithmetic only, just like
+        # `CustomImage.draw_line_segments` does
+        divisor = np.maximum(num_steps, 1)[step_ids]
+        xs = x_0[step_ids] + (2 * d_x[step_ids] * steps + divisor) // (2 * divisor)
+        ys = y_0[step_ids] + (2 * d_y[step_ids] * steps + divisor) // (2 * divisor)
+        return xs, ys, ids[step_ids]
+
+    # Clip straight line segments from `(x_0, y_0)` to `(x_1, y_1)`, given as arrays of image coordinates, to
+    # the image widened by `k` (Liang-Barsky). Coordinates far outside of the image would otherwise take as many
+    # steps to rasterize. Return `(x_0, y_0, x_1, y_1, ids)` of the segments left, rounded to the nearest pixel.
+    # `ids` maps each to its segment
+    def clip_segments(self, x_0, y_0, x_1, y_1, k):
+        x_0, y_0, x_1, y_1 = (np.asarray(coords, dtype=float) for coords in (x_0, y_0, x_1, y_1))
+        ids = np.arange(len(x_0))
+
+        d_x, d_y = x_1 - x_0, y_1 - y_0
+        t_min, t_max = np.zeros(len(x_0)), np.ones(len(x_0))
+        visible = np.isfinite(x_0) & np.isfinite(y_0) & np.isfinite(x_1) & np.isfinite(y_1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for p, q in ((-d_x, x_0 + k + 1), (d_x, self.width + k - x_0), (-d_y, y_0 + k + 1), (d_y, self.height + k - y_0)):
+                r = q / p
+                visible &= (p != 0) | (q >= 0)
+                t_min = np.where(p < 0, np.maximum(t_min, r), t_min)
+                t_max = np.where(p > 0, np.minimum(t_max, r), t_max)
+        visible &= t_min <= t_max
+
+        x_0, y_0, d_x, d_y = x_0[visible], y_0[visible], d_x[visible], d_y[visible]
+        t_min, t_max = t_min[visible], t_max[visible]
+        x_0, y_0, x_1, y_1 = (np.rint(coords).astype(np.int64) for coords in
+            (x_0 + t_min * d_x, y_0 + t_min * d_y, x_0 + t_max * d_x, y_0 + t_max * d_y))
+        return x_0, y_0, x_1, y_1, ids[visible]
+
+# The state of a worker process of `Rasterizer.rasterize_parallel`: its `Rasterizer`, the name of the
+# `SharedFramebuffer`, and the commands to rasterize. Set once per process, so that the commands are
+# only handed to every process once rather than once per band
+_band_worker = None
+
+def _set_band_worker(name, width, height, commands):
+    global _band_worker
+    _band_worker = (Rasterizer(width, height), name, commands)
+
+# Rasterize a single band `(y_min, y_max)` in a worker process, and return the number of pixels written.
+# The worker attaches to the `SharedFramebuffer` for the band only, so that no attachment outlives it
+def _rasterize_band(band):
+    rasterizer, name, commands = _band_worker
+    framebuffer = SharedFramebuffer(rasterizer.width, rasterizer.height, name=name)
+    try:
+        rasterizer.rasterize(commands, framebuffer, *band)
+        return framebuffer.num_pixels_written
+    finally:
+        framebuffer.close()
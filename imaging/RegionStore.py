@@ -0,0 +1,221 @@
+import numpy as np
+
+from imaging.RectangularRegion import RectangularRegion
+
+# A `RegionStore` holds the `RectangularRegion`s that a `CustomImage` is divided into.
+#
+# Regions are stored as a struct of arrays: `x_min`, `x_max`, `y_min` and `y_max` each hold one edge
+# of every region, so whole sets of regions can be processed at once. The store starts out as a single
+# region and only ever grows by dividing one region in two, so the regions always tile the original one.
+#
+# Two structures are maintained alongside the edges, both updated in O(log n) per division:
+#   1) A Fenwick tree over the area of every region that is large enough to divide. Regions are picked
+#      for division at random, weighted by area, and a pick never lands on a region too small to divide
+#   2) A split tree, recording every division. Descending it answers which region contains a point.
+#      Every division halves a side, so the tree is no deeper than `log2(width) + log2(height)`
+#
+# Indexing or iterating a `RegionStore` yields `RectangularRegion`s.
+
+class RegionStore:
+
+    # A region is only divided if both of its sides are at least this long
+    MIN_SIZE_TO_SPLIT = 2
+
+    # Split tree nodes record the axis they divide along. Leaves hold a single region instead
+    LEAF = -1
+    AXIS_X = 0
+    AXIS_Y = 1
+
+    def __init__(self, x_min, x_max, y_min, y_max, capacity=16):
+        self.bounds = (x_min, x_max, y_min, y_max)
+        self.num_regions = 0
+        self.num_nodes = 0
+        self.total_weight = 0
+        self._allocate(capacity)
+
+        # The single starting region is also the root of the split tree
+        self._set_edges(0, x_min, x_max, y_min, y_max)
+        self.num_regions = 1
+        self._update_weight(0, x_max - x_min, y_max - y_min)
+        self._add_leaf(0)
+
+    # Allocate or grow every per-region and per-node array to hold `capacity` regions
+    def _allocate(self, capacity):
+        def grow(array, size, dtype, fill=0):
+            grown = np.full(size, fill, dtype=dtype)
+            if array is not None:
+                grown[:len(array)] = array
+            return grown
+
+        self.capacity = capacity
+
+        # Region edges, one array per edge
+        self.x_min = grow(getattr(self, 'x_min', None), capacity, np.int64)
+        self.x_max = grow(getattr(self, 'x_max', None), capacity, np.int64)
+        self.y_min = grow(getattr(self, 'y_min', None), capacity, np.int64)
+        self.y_max = grow(getattr(self, 'y_max', None), capacity, np.int64)
+
+        # The split tree holds `2n - 1` nodes for `n` regions.
+        # A divided node's two children are stored next to one another, at `node_children[node]` and after
+        self.node_axis = grow(getattr(self, 'node_axis', None), 2 * capacity, np.int8, self.LEAF)
+        self.node_split = grow(getattr(self, 'node_split', None), 2 * capacity, np.int64)
+        self.node_children = grow(getattr(self, 'node_children', None), 2 * capacity, np.int64)
+        self.node_region = grow(getattr(self, 'node_region', None), 2 * capacity, np.int64)
+        self.leaf_nodes = grow(getattr(self, 'leaf_nodes', None), capacity, np.int64)
+
+        # Weights are Python `int`s: single elements are updated far more often than whole arrays are read.
+        # The Fenwick tree is rebuilt from the weights in O(n) whenever it grows
+        weights = getattr(self, 'weights', [])
+        self.weights = weights + [0] * (capacity - len(weights))
+        self.fenwick = [0] * (capacity + 1)
+        for i, weight in enumerate(self.weights, 1):
+            self.fenwick[i] += weight
+            parent = i + (i & -i)
+            if parent <= capacity:
+                self.fenwick[parent] += self.fenwick[i]
+
+    def _set_edges(self, index, x_min, x_max, y_min, y_max):
+        self.x_min[index], self.x_max[index] = x_min, x_max
+        self.y_min[index], self.y_max[index] = y_min, y_max
+
+    # Set the weight of a region of the given dimensions: its area if it can be divided, `0` otherwise
+    def _update_weight(self, index, width, height):
+        splittable = width >= self.MIN_SIZE_TO_SPLIT and height >= self.MIN_SIZE_TO_SPLIT
+        weight = width * height if splittable else 0
+
+        delta = weight - self.weights[index]
+        if delta == 0:
+            return
+        self.weights[index] = weight
+        self.total_weight += delta
+
+        fenwick, capacity = self.fenwick, self.capacity
+        i = index + 1
+        while i <= capacity:
+            fenwick[i] += delta
+            i += i & -i
+
+    # Return the index of the region whose weight spans `target`, where `0 <= target < total_weight`
+    def _find_by_weight(self, target):
+        fenwick, capacity = self.fenwick, self.capacity
+        index = 0
+        step = 1 << (capacity.bit_length() - 1)
+        while step:
+            candidate = index + step
+            if candidate <= capacity and fenwick[candidate] <= target:
+                index = candidate
+                target -= fenwick[candidate]
+            step >>= 1
+        return index
+
+    # Append a leaf holding `region` to the split tree and return it
+    def _add_leaf(self, region):
+        node = self.num_nodes
+        self.num_nodes += 1
+        self.node_axis[node] = self.LEAF
+        self.node_region[node] = region
+        self.leaf_nodes[region] = node
+        return node
+
+    def __len__(self):
+        return self.num_regions
+
+    def __getitem__(self, index):
+        if not -self.num_regions <= index < self.num_regions:
+            raise IndexError('region index out of range')
+        index %= self.num_regions
+        return RectangularRegion(int(self.x_min[index]), int(self.x_max[index]),
+            int(self.y_min[index]), int(self.y_max[index]))
+
+    def __iter__(self):
+        for index in range(self.num_regions):
+            yield self[index]
+
+    # Return the edges of every region as four arrays: `x_min, x_max, y_min, y_max`
+    def get_edges(self):
+        n = self.num_regions
+        return self.x_min[:n], self.x_max[:n], self.y_min[:n], self.y_max[:n]
+
+    # Divide a region in two, either with a vertical line (`vertical`) or a horizontal one.
+    # The first half keeps `index`, the second half is appended. Return `False` if the region is too small
+    def divide(self, index, vertical):
+        x_min, x_max = int(self.x_min[index]), int(self.x_max[index])
+        y_min, y_max = int(self.y_min[index]), int(self.y_max[index])
+
+        if x_max - x_min < self.MIN_SIZE_TO_SPLIT or y_max - y_min < self.MIN_SIZE_TO_SPLIT:
+            return False
+
+        if self.num_regions == self.capacity:
+            self._allocate(2 * self.capacity)
+        new_index = self.num_regions
+        self.num_regions += 1
+
+        if vertical:
+            # Note that the `y` edges remain unchanged
+            halfway = x_min + (x_max - x_min) // 2
+            self.x_max[index] = halfway
+            self._set_edges(new_index, halfway, x_max, y_min, y_max)
+            self._update_weight(index, halfway - x_min, y_max - y_min)
+            self._update_weight(new_index, x_max - halfway, y_max - y_min)
+        else:
+            # Note that the `x` edges remain unchanged
+            halfway = y_min + (y_max - y_min) // 2
+            self.y_max[index] = halfway
+            self._set_edges(new_index, x_min, x_max, halfway, y_max)
+            self._update_weight(index, x_max - x_min, halfway - y_min)
+            self._update_weight(new_index, x_max - x_min, y_max - halfway)
+
+        # The leaf of the divided region becomes a split, with a leaf for each half
+        node = self.leaf_nodes[index]
+        self.node_axis[node] = self.AXIS_X if vertical else self.AXIS_Y
+        self.node_split[node] = halfway
+        self.node_children[node] = self._add_leaf(index)
+        self._add_leaf(new_index)
+        return True
+
+    # Pick a region at random, weighted by area, and divide it in two along a random axis.
+    # `rng` is a `numpy.random.Generator`.
+    # Return the index of the divided region, or `None` if every region is too small to divide
+    def divide_random(self, rng):
+        if self.total_weight == 0:
+            return None
+
+        index = self._find_by_weight(int(rng.integers(self.total_weight)))
+        self.divide(index, bool(rng.integers(2)))
+        return index
+
+    # Perform `n` random divisions, see `divide_random`. The random numbers of every division are drawn at once:
+    # a fraction of the total weight of the regions, and an axis.
+    # Return the number of divisions made, which is less than `n` only once every region is too small
+    def divide_n(self, n, rng):
+        fractions, axes = rng.random(n).tolist(), rng.integers(0, 2, n).tolist()
+        for num_divisions, (fraction, vertical) in enumerate(zip(fractions, axes)):
+            if self.total_weight == 0:
+                return num_divisions
+            index = self._find_by_weight(min(int(fraction * self.total_weight), self.total_weight - 1))
+            self.divide(index, bool(vertical))
+        return n
+
+    # Return the index of the region containing the point `(x, y)`, or `-1` if no region does.
+    # `xs` and `ys` may also be arrays of points, in which case an array of indices is returned
+    def find(self, xs, ys):
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        xs, ys = np.broadcast_arrays(xs, ys)
+
+        # Points outside of the starting region descend like any other, and are discarded after
+        x_lo, x_hi, y_lo, y_hi = self.bounds
+        inside = (xs >= x_lo) & (xs < x_hi) & (ys >= y_lo) & (ys < y_hi)
+
+        # Descend the split tree one level at a time, for every point at once
+        nodes = np.zeros(xs.shape, dtype=np.int64)
+        while True:
+            axes = self.node_axis[nodes]
+            splits = axes != self.LEAF
+            if not splits.any():
+                break
+            coords = np.where(axes == self.AXIS_X, xs, ys)
+            upper = coords >= self.node_split[nodes]
+            nodes = np.where(splits, self.node_children[nodes] + upper, nodes)
+
+        regions = np.where(inside, self.node_region[nodes], -1)
+        return int(regions) if regions.ndim == 0 else regions
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from imaging.exceptions import RenderTimeoutError, UnreservedPixelError
+from imaging.Scene import Scene
+
+# A `RenderService` renders `Scene`s over HTTP, on a pool of worker processes.
+#
+# Endpoints:
+#   POST /render   The body is a `Scene` description as JSON. Responds with the encoded image
+#   GET /health    Responds with the state of the queue, the workers and the cache as JSON
+#
+# Requests flow through three stages:
+#   1) The cache: an LRU cache of encoded images, keyed by `Scene.get_key`. A hit responds right away
+#   2) Coalescing: a scene that is already being rendered is not rendered again. The request waits
+#      for the render in progress, and shares its result
+#   3) The queue: every other scene waits for a worker in a queue of at most `max_queue_size` scenes.
+#      Once the queue is full, further requests are turned away with `503 Service Unavailable` and a
+#      `Retry-After` header, rather than queueing up without bound. This keeps latency predictable
+#
+# Every render has a deadline of `render_timeout` seconds. A render that misses it is killed along with its
+# worker process, which is replaced, and its requests are turned away with `503 Service Unavailable` too.
+# Each worker renders in a process of its own, so that killing one never disturbs the renders of the others.
+#
+# The service only ever listens on `localhost` unless told otherwise. Invocation, from the root of the repository:
+#   python -m imaging.RenderService --port 8000 --processes 8
+#
+# Renders run in worker processes, so the event loop only ever parses requests and writes responses.
+
+class RenderService:
+
+    # Content types of the encoded formats of a `Scene`
+    CONTENT_TYPES = {
+        'PNG': 'image/png',
+        'JPEG': 'image/jpeg',
+        'PPM': 'image/x-portable-pixmap',
+        'GIF': 'image/gif',
+        'BMP': 'image/bmp',
+        'TIFF': 'image/tiff',
+        'WEBP': 'image/webp',
+    }
+
+    STATUS_REASONS = {
+        200: 'OK',
+        400: 'Bad Request',
+        404: 'Not Found',
+        405: 'Method Not Allowed',
+        408: 'Request Timeout',
+        413: 'Payload Too Large',
+        500: 'Internal Server Error',
+        503: 'Service Unavailable',
+    }
+
+    # Limits on a single request
+    MAX_HEADER_SIZE = 2 ** 16
+    MAX_BODY_SIZE = 2 ** 20
+
+    # `processes` is the number of worker processes, one render each at a time, which defaults to the
+    # number of CPUs. `max_pixels` bounds the size of a single scene, and `render_timeout` the seconds it may
+    # take to render. The cache holds at most `cache_size` images and `max_cache_bytes` bytes of encoded
+    # images, whichever is reached first
+    def __init__(self, processes=None, max_queue_size=64, cache_size=256, max_cache_bytes=2 ** 28,
+            max_pixels=7680 * 4320, read_timeout=10, render_timeout=30):
+        self.processes = processes or os.cpu_count()
+        self.max_queue_size = max_queue_size
+        self.cache_size = cache_size
+        self.max_cache_bytes = max_cache_bytes
+        self.max_pixels = max_pixels
+        self.read_timeout = read_timeout
+        self.render_timeout = render_timeout
+
+        # `self.cache` is of the type `OrderedDict{str : (str, bytes)}`, from least to most recently used.
+        # Each scene key values to the format and the bytes of its encoded image
+        self.cache = collections.OrderedDict()
+        self.num_cache_bytes = 0
+
+        # `self.in_flight` is of the type `{str : asyncio.Future}`, holding the render of every scene that
+        # is queued or being rendered
+        self.in_flight = {}
+
+        # Counters for `GET /health`
+        self.stats = collections.Counter()
+
+        # Allocated upon `start`, within the event loop
+        self.queue = None
+        self.executors = []
+        self.workers = []
+
+        # `self.worker_pids` is of the type `[multiprocessing.Value]`, the process ID of every worker's process,
+        # once it has started, so that a render past its deadline can be killed
+        self.worker_pids = []
+        self.server = None
+
+    # Start a new worker process, and return it along with the shared value it reports its process ID to.
+    # Processes are spawned rather than forked, so that they never inherit the sockets of open connections -
+    # which would keep those connections from closing
+    def _start_executor(self):
+        context = multiprocessing.get_context('spawn')
+        pid = context.Value('q', 0)
+        return ProcessPoolExecutor(1, mp_context=context, initializer=_report_pid, initargs=(pid,)), pid
+
+    # Replace the process of the `i`th worker. If `kill` is `True`, then kill its render in progress first.
+    # `ProcessPoolExecutor` cannot cancel a running task, so its process is killed by the ID it reported
+    def _replace_executor(self, i, kill=False):
+        executor, pid = self.executors[i], self.worker_pids[i]
+        if kill and pid.value:
+            try:
+                os.kill(pid.value, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executors[i], self.worker_pids[i] = self._start_executor()
+
+    # Start the worker processes and the workers feeding them from the queue
+    async def start(self):
+        self.queue = asyncio.Queue(self.max_queue_size)
+        started = [self._start_executor() for _ in range(self.processes)]
+        self.executors = [executor for executor, _ in started]
+        self.worker_pids = [pid for _, pid in started]
+        self.workers = [asyncio.create_task(self._work(i)) for i in range(self.processes)]
+
+    # Stop accepting requests, and shut down the workers and their processes
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)
+
+    # Start the service and listen for HTTP requests on `host`, `port`, until cancelled
+    async def serve(self, host='127.0.0.1', port=8000):
+        await self.start()
+        self.server = await asyncio.start_server(self._handle_connection, host, port, limit=self.MAX_HEADER_SIZE)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    # Rendering
+
+    # Hand scenes from the queue to the process of the `i`th worker, one at a time
+    async def _work(self, i):
+        loop = asyncio.get_running_loop()
+        while True:
+            scene, future = await self.queue.get()
+            try:
+                data = await asyncio.wait_for(
+                    loop.run_in_executor(self.executors[i], _encode_scene, scene.description), self.render_timeout)
+            except asyncio.TimeoutError:
+                self._replace_executor(i, kill=True)
+                self.stats['timeouts'] += 1
+                future.set_exception(RenderTimeoutError(f'Rendering took longer than {self.render_timeout} seconds'))
+            except BrokenProcessPool:
+                # The worker process died. Replace it, and fail the request
+                self._replace_executor(i)
+                future.set_exception(RuntimeError('A worker process died while rendering'))
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(data)
+            finally:
+                self.queue.task_done()
+
+    # Render a scene and return its encoded image, from the cache, from a render in progress, or by queueing
+    # a new render. Raise `asyncio.QueueFull` if the queue is full
+    async def render(self, scene):
+        key = scene.get_key()
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return self.cache[key][1]
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            # Turn the request away before registering it, so that no one waits on a render never queued
+            self.queue.put_nowait((scene, future))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done : self._finish(key, scene, done))
+            self.stats['renders'] += 1
+
+        # Shield the render, so that a client hanging up does not cancel it for every other client waiting
+        return await asyncio.shield(future)
+
+    # Cache the result of a finished render
+    def _finish(self, key, scene, future):
+        del self.in_flight[key]
+        if future.cancelled() or future.exception() is not None:
+            self.stats['errors'] += 1
+            return
+
+        data = future.result()
+        if len(data) > self.max_cache_bytes:
+            return
+        self.cache[key] = (scene.description['format'], data)
+        self.num_cache_bytes += len(data)
+
+        # Evict the least recently used images
+        while len(self.cache) > self.cache_size or self.num_cache_bytes > self.max_cache_bytes:
+            _, (_, evicted) = self.cache.popitem(last=False)
+            self.num_cache_bytes -= len(evicted)
+
+    # HTTP
+
+    # Serve a single request on a connection, then close it
+    async def _handle_connection(self, reader, writer):
+        try:
+            status, headers, body = await self._handle_request(reader)
+            await self._write_response(writer, status, headers, body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Read and answer a single request. Return the status, extra headers and body of the response.
+    # Reading the request times out after `read_timeout` seconds, rendering after `render_timeout` seconds
+    async def _handle_request(self, reader):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.read_timeout)
+        except asyncio.TimeoutError:
+            return self._error(408, 'Timed out reading the request')
+        except asyncio.LimitOverrunError:
+            return self._error(413, 'Request headers too large')
+        except asyncio.IncompleteReadError:
+            return self._error(400, 'Incomplete request')
+
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, _ = request_line.split(' ', 2)
+        except ValueError:
+            return self._error(400, 'Malformed request line')
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if path == '/health':
+            if method != 'GET':
+                return self._error(405, 'Use GET')
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.get_health()).encode('utf-8')
+
+        if path != '/render':
+            return self._error(404, f'No such endpoint {path}')
+        if method != 'POST':
+            return self._error(405, 'Use POST')
+
+        try:
+            length = int(headers.get('content-length', ''))
+        except ValueError:
+            return self._error(400, 'Content-Length is required')
+        if length < 0:
+            return self._error(400, 'Content-Length must not be negative')
+        if length > self.MAX_BODY_SIZE:
+            return self._error(413, 'Request body too large')
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout)
+        except asyncio.TimeoutError:
+            return self._error(408, 'Timed out reading the request')
+        except asyncio.IncompleteReadError:
+            return self._error(400, 'Incomplete request body')
+
+        try:
+            scene = Scene.from_json(body)
+        except ValueError as e:
+            return self._error(400, str(e))
+        if scene.size[0] * scene.size[1] > self.max_pixels:
+            return self._error(400, f'Scenes are limited to {self.max_pixels} pixels')
+
+        try:
+            data = await self.render(scene)
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            status, headers, body = self._error(503, 'Too many renders queued, retry later')
+            headers['Retry-After'] = '1'
+            return status, headers, body
+        except RenderTimeoutError as e:
+            return self._error(503, str(e))
+        except (TypeError, ValueError, UnreservedPixelError) as e:
+            return self._error(400, f'{type(e).__name__}: {e}')
+        except Exception as e:
+            return self._error(500, f'{type(e).__name__}: {e}')
+
+        headers = {'Content-Type': self.CONTENT_TYPES[scene.description['format']], 'ETag': f'"{scene.get_key()}"'}
+        return 200, headers, data
+
+    def _error(self, status, message):
+        return status, {'Content-Type': 'application/json'}, json.dumps({'error': message}).encode('utf-8')
+
+    async def _write_response(self, writer, status, headers, body):
+        lines = [f'HTTP/1.1 {status} {self.STATUS_REASONS[status]}', f'Content-Length: {len(body)}',
+            'Connection: close']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        writer.write(body)
+        await writer.drain()
+
+    # Return the state of the queue, the workers and the cache
+    def get_health(self):
+        return {
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+            'max_queue_size': self.max_queue_size,
+            'in_flight': len(self.in_flight),
+            'workers': len(self.workers),
+            'render_timeout': self.render_timeout,
+            'cached': len(self.cache),
+            'cache_bytes': self.num_cache_bytes,
+            **self.stats,
+        }
+
+
+# Report the process ID of a worker process to the shared value `pid`, as it starts
+def _report_pid(pid):
+    pid.value = os.getpid()
+
+# Render and encode a scene in a worker process
+def _encode_scene(description):
+    return Scene(description).encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render scenes over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--max-queue-size', type=int, default=64)
+    parser.add_argument('--cache-size', type=int, default=256, help='number of encoded images to cache')
+    parser.add_argument('--render-timeout', type=float, default=30, help='seconds a single render may take')
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.processes, args.max_queue_size, args.cache_size,
+        render_timeout=args.render_timeout)
+    print(f'Serving on http://{args.host}:{args.port}', file=sys.stderr)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,21 @@
 import random
 
+import numpy as np
+
 from imaging.ColorGenerator import ColorGenerator
+from imaging.exceptions import EmptyColorPoolError
 
 # A `ColorGenerator` provides colors upon request.
 # A color is a `bytearray` of three elements, one per RGB channel: red, green, blue.
 #
-# Every `ColorGenerator` has an `_internal_function` - a lambda that enforces the policy
+# Every `ColorGenerator` has an `_internal_function` - a bound method that enforces the policy
 # of a respective `ColorGenerator`.
-# The policy for `RingColorGenerator` is this: store a pool (list) of colors and traverse it circularly
+# The policy for `RingColorGenerator` is this: store a pool of colors and traverse it circularly
 # in insertion order.
 #
+# The pool is packed as one `(n, 3)` array of `uint8` channel data, one row per color, so that
+# many colors can be generated at once with plain index arithmetic.
+#
 # This class also provides methods for populating the internal pool of colors.
 
 class RingColorGenerator(ColorGenerator):
@@ -20,24 +26,48 @@ class RingColorGenerator(ColorGenerator):
         self.rgb_rel_min = min(max(rgb_rel_min, self.RGB_MIN), self.RGB_MAX)
         self.rgb_rel_max = min(max(rgb_rel_max, self.RGB_MIN), self.RGB_MAX)
 
-        # Allocate underlying list and index pointer needed for the ring policy
-        self.pool = []
+        # Allocate underlying pool and index pointer needed for the ring policy
+        self.pool = np.empty((0, 3), dtype=np.uint8)
         self.curr_ring_index = initial_ring_index
 
         # Set policy
-        self._internal_function = lambda : self._grab_next_color_and_advance()
+        self._internal_function = self._grab_next_color_and_advance
 
     # Perform the circular traversal and return the next color
     def _grab_next_color_and_advance(self):
-        # TODO add empty pool exception
+        if len(self.pool) == 0:
+            raise EmptyColorPoolError
+
         # Maintain `self.curr_ring_index`
         if self.curr_ring_index >= len(self.pool) - 1:
-            # Reset to beginning of the list
+            # Reset to beginning of the pool
             self.curr_ring_index = 0
         else:
             self.curr_ring_index += 1
         
-        return self.pool[self.curr_ring_index]
+        return bytearray(self.pool[self.curr_ring_index])
+
+    # Perform `n` steps of the circular traversal at once and return the colors as an `(n, 3)` array
+    def generate_colors(self, n):
+        if len(self.pool) == 0:
+            raise EmptyColorPoolError
+        if n == 0:
+            return self.pool[:0]
+        self.num_colors_generated += n
+
+        # The first step is taken exactly like `_grab_next_color_and_advance` would take it...
+        first_index = 0 if self.curr_ring_index >= len(self.pool) - 1 else self.curr_ring_index + 1
+
+        # ...and every following step simply wraps around the pool
+        indices = (first_index + np.arange(n)) % len(self.pool)
+        self.curr_ring_index = int(indices[-1])
+
+        return self.pool[indices]
+
+    # Append an `(n, 3)` array of colors to `self.pool`, each color repeated `num_insertions` times
+    def _add_colors_to_pool(self, colors, num_insertions=1):
+        colors = np.repeat(np.asarray(colors, dtype=np.uint8).reshape(-1, 3), num_insertions, axis=0)
+        self.pool = np.concatenate((self.pool, colors))
 
     # Methods for populating `self.pool`
 
@@ -58,8 +88,7 @@ class RingColorGenerator(ColorGenerator):
         color = self.ints_to_rgb(r, g, b)
 
         # Append, possibly more than once per color, for artistic control
-        for i in range(num_insertions):
-            self.pool.append(color)
+        self._add_colors_to_pool(color, num_insertions)
 
     # Parse a Coolors color palette URL and add append the palette's colors to our pool.
     #
@@ -85,27 +114,22 @@ class RingColorGenerator(ColorGenerator):
         # A smooth rainbow gradient is achieved by traversing the RGB state space
         # one channel at a time, while the other two channels are held constant at
         # either relative extrema:
-
-        # Incrementing `blue` yields Red to Magenta
-        for b in range(_min, _max, step_size):
-            self.pool.append(self.ints_to_rgb(_max, _min, b))
-
-        # Decrementing `red` yields Magenta to Blue
-        for r in range(_max, _min, step_size * -1):
-            self.pool.append(self.ints_to_rgb(r, _min, _max))
-
-        # Incrementing `green` yields Blue to Teal
-        for g in range(_min, _max, step_size):
-            self.pool.append(self.ints_to_rgb(_min, g, _max))
-
-        # Decrementing `blue` yields Teal to Green
-        for b in range(_max, _min, step_size * -1):
-            self.pool.append(self.ints_to_rgb(_min, _max, b))
-
-        # Incrementing `red` yields Green to Yellow
-        for r in range(_min, _max, step_size):
-            self.pool.append(self.ints_to_rgb(r, _max, _min))
-
-        # Decrementing `green` yields Yellow to Red
-        for g in range(_max, _min, step_size * -1):
-            self.pool.append(self.ints_to_rgb(_max, g, _min))
\ No newline at end of file
+        # NOTE: The rising and falling traversals are always of equal length
+        rising = np.arange(_min, _max, step_size)
+        falling = np.arange(_max, _min, step_size * -1)
+        lows, highs = np.full(len(rising), _min), np.full(len(rising), _max)
+
+        self._add_colors_to_pool(np.concatenate((
+            # Incrementing `blue` yields Red to Magenta
+            self.ints_to_rgbs(highs, lows, rising),
+            # Decrementing `red` yields Magenta to Blue
+            self.ints_to_rgbs(falling, lows, highs),
+            # Incrementing `green` yields Blue to Teal
+            self.ints_to_rgbs(lows, rising, highs),
+            # Decrementing `blue` yields Teal to Green
+            self.ints_to_rgbs(lows, highs, falling),
+            # Incrementing `red` yields Green to Yellow
+            self.ints_to_rgbs(rising, highs, lows),
+            # Decrementing `green` yields Yellow to Red
+            self.ints_to_rgbs(highs, falling, lows),
+        )))
@@ -0,0 +1,252 @@
+import hashlib
+import inspect
+import json
+import math
+import random
+
+from imaging.CustomImage import CustomImage
+from imaging.ColorGenerator import ColorGenerator
+from imaging.RingColorGenerator import RingColorGenerator
+
+# A `Scene` describes a `CustomImage` as plain JSON data, so that it can be rendered elsewhere -
+# in a worker process, or by the `RenderService`. A description has the form:
+#
+#   {
+#     "size": [1920, 1080],
+#     "seed": 0,
+#     "storage": "dense",
+#     "color_generator": {
+#       "type": "ring",
+#       "options": {"rgb_rel_min": 0, "rgb_rel_max": 255},
+#       "operations": [{"op": "add_rainbow_to_pool", "kwargs": {"step_size": 30}}]
+#     },
+#     "operations": [
+#       {"op": "reserve_white_background"},
+#       {"op": "divide_rectangular_regions", "args": [100]},
+#       {"op": "reserve_all_rectangular_regions"}
+#     ],
+#     "format": "PNG",
+#     "quality": null
+#   }
+#
+# Only "size" is required. Operations are `CustomImage` methods, applied in order, with JSON arguments.
+# Only the methods in `OPERATIONS` may be called, which excludes anything that reads or writes files.
+# Their arguments are bounded by the size of the canvas, see `ARGUMENT_LIMITS`.
+# `random` is seeded with "seed" before the image is instantiated, so a description always renders the same.
+#
+# Every description is normalized upon instantiation: defaults are filled in and operations are written out
+# in full. Two descriptions of the same scene thus share the same `get_key`, a hash of the normalized description.
+
+class Scene:
+
+    # `ColorGenerator`s by "type", along with the methods their operations may call
+    COLOR_GENERATORS = {
+        'base': (ColorGenerator, set()),
+        'ring': (RingColorGenerator, {'add_rainbow_to_pool', 'add_palette_to_pool_from_url',
+            'add_color_to_pool_from_rgb_string'}),
+    }
+
+    # `CustomImage` methods that operations may call
+    OPERATIONS = {
+        'reserve_background_color', 'reserve_white_background', 'reserve_black_background',
+        'quantize_to_palette',
+        'reserve_all_rectangular_regions', 'divide_random_rectangular_region_in_two', 'divide_rectangular_regions',
+        'add_random_dot', 'connect_all_dots', 'draw_line_segment', 'draw_line_segments',
+        'reserve_all_vertical_slices', 'reserve_all_horizontal_slices',
+        'create_random_vertical_slices', 'create_random_horizontal_slices',
+        'create_symmetric_vertical_slices_from_center', 'create_symmetric_horizontal_slices_from_center',
+    }
+
+    # Bounds on the arguments of operations, by parameter name, so that a short description cannot keep a worker
+    # busy for long. Every argument is at least its lower bound, and at most an upper bound relative to the canvas:
+    #   'diagonal': The length of its diagonal
+    #   'pixels': Its number of pixels
+    # The slices created by a single operation are bounded by 'pixels' too, and so are the coordinates of line
+    # segments by 'diagonal', past either edge of the canvas
+    ARGUMENT_LIMITS = {
+        'brush_size': (0, 'diagonal'),
+        'n': (0, 'pixels'),
+        'num_partitions': (1, 'pixels'),
+    }
+
+    # Parameters of operations that take Python objects, such as a `ColorGenerator`, which JSON cannot describe.
+    # Operations always use the defaults of these
+    OBJECT_PARAMETERS = {'color_generator', 'palette'}
+
+    # Formats that a scene can be encoded as
+    FORMATS = {'PNG', 'JPEG', 'PPM', 'GIF', 'BMP', 'TIFF', 'WEBP'}
+
+    DEFAULTS = {
+        'seed': 0,
+        'storage': 'dense',
+        'color_generator': {'type': 'ring', 'options': {}, 'operations': [
+            {'op': 'add_rainbow_to_pool', 'args': [], 'kwargs': {'step_size': 30}},
+        ]},
+        'format': 'PNG',
+        'quality': None,
+    }
+
+    def __init__(self, description):
+        self.description = self._normalize(description)
+        self.size = tuple(self.description['size'])
+
+    # Instantiate a `Scene` from a JSON string or `bytes`
+    @classmethod
+    def from_json(cls, serialized):
+        try:
+            description = json.loads(serialized)
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON: {e}') from None
+        return cls(description)
+
+    # Return the normalized description of a scene, raising a `ValueError` on anything invalid
+    def _normalize(self, description):
+        if not isinstance(description, dict):
+            raise ValueError('A scene must be a JSON object')
+        unknown = set(description) - set(self.DEFAULTS) - {'size', 'operations'}
+        if unknown:
+            raise ValueError(f'Unknown scene fields: {sorted(unknown)}')
+
+        normalized = dict(self.DEFAULTS, **description)
+
+        size = normalized.get('size')
+        if (not isinstance(size, list) or len(size) != 2
+                or not all(isinstance(n, int) and not isinstance(n, bool) and n > 0 for n in size)):
+            raise ValueError('"size" must be a list of two positive integers')
+
+        if not isinstance(normalized['seed'], (int, str)) or isinstance(normalized['seed'], bool):
+            raise ValueError('"seed" must be an integer or a string')
+        if normalized['storage'] not in CustomImage.STORAGES:
+            raise ValueError(f'"storage" must be one of {list(CustomImage.STORAGES)}')
+
+        normalized['format'] = str(normalized['format']).upper()
+        if normalized['format'] not in self.FORMATS:
+            raise ValueError(f'"format" must be one of {sorted(self.FORMATS)}')
+        if normalized['quality'] is not None and not isinstance(normalized['quality'], int):
+            raise ValueError('"quality" must be an integer')
+
+        generator = normalized['color_generator']
+        if not isinstance(generator, dict) or generator.get('type', 'ring') not in self.COLOR_GENERATORS:
+            raise ValueError(f'"color_generator" must be an object whose "type" is one of '
+                f'{list(self.COLOR_GENERATORS)}')
+        generator_type = generator.get('type', 'ring')
+        options = generator.get('options', {})
+        if not isinstance(options, dict):
+            raise ValueError('"color_generator" "options" must be an object')
+        normalized['color_generator'] = {
+            'type': generator_type,
+            'options': options,
+            'operations': self._normalize_operations(generator.get('operations', []),
+                self.COLOR_GENERATORS[generator_type][1]),
+        }
+
+        normalized['operations'] = self._normalize_operations(normalized.get('operations', []), self.OPERATIONS,
+            size)
+        return normalized
+
+    # Write every operation out in full, as `{'op': str, 'args': list, 'kwargs': dict}`.
+    # If `size` is specified, then operations are `CustomImage` methods, whose arguments are checked against
+    # `ARGUMENT_LIMITS` on a canvas of that size
+    def _normalize_operations(self, operations, allowed, size=None):
+        if not isinstance(operations, list):
+            raise ValueError('"operations" must be a list')
+
+        normalized = []
+        for operation in operations:
+            if not isinstance(operation, dict) or set(operation) - {'op', 'args', 'kwargs'}:
+                raise ValueError('Every operation must be an object of "op", "args" and "kwargs"')
+            if operation.get('op') not in allowed:
+                raise ValueError(f'Unknown operation {operation.get("op")!r}, expected one of {sorted(allowed)}')
+
+            args, kwargs = operation.get('args', []), operation.get('kwargs', {})
+            if not isinstance(args, list) or not isinstance(kwargs, dict):
+                raise ValueError(f'"args" of {operation["op"]!r} must be a list, and "kwargs" an object')
+            if size is not None:
+                self._check_limits(operation['op'], args, kwargs, size)
+            normalized.append({'op': operation['op'], 'args': args, 'kwargs': kwargs})
+
+        return normalized
+
+    # Raise a `ValueError` if the arguments of an operation exceed `ARGUMENT_LIMITS` on a canvas of `size`,
+    # or set any of `OBJECT_PARAMETERS`
+    def _check_limits(self, op, args, kwargs, size):
+        try:
+            arguments = inspect.signature(getattr(CustomImage, op)).bind(None, *args, **kwargs)
+        except TypeError as e:
+            raise ValueError(f'Invalid arguments to {op!r}: {e}') from None
+
+        objects = sorted(self.OBJECT_PARAMETERS.intersection(arguments.arguments))
+        if objects:
+            raise ValueError(f'{objects} of {op!r} cannot be described as JSON, leave them out')
+        arguments.apply_defaults()
+        arguments = arguments.arguments
+
+        width, height = size
+        limits = {'diagonal': math.hypot(width, height), 'pixels': width * height}
+
+        def check(name, value, low, high):
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not low <= value <= high:
+                raise ValueError(f'"{name}" of {op!r} must be a number within [{low:g}, {high:g}] on a '
+                    f'{width}x{height} canvas, not {value!r}')
+
+        for name, (low, limit) in self.ARGUMENT_LIMITS.items():
+            if name in arguments:
+                check(name, arguments[name], low, limits[limit])
+
+        # Slices are created at every step across a range of positions, once per partition
+        if op.startswith('create_'):
+            position_min, position_max, step_size = list(arguments.values())[1:4]
+            for name, value in zip(('min', 'max', 'step_size'), (position_min, position_max, step_size)):
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise ValueError(f'The position {name} of {op!r} must be an integer')
+            num_slices = len(range(position_min, position_max, step_size)) * arguments.get('num_partitions', 1)
+            check('number of slices', num_slices, 0, limits['pixels'])
+
+        # A line segment takes a step per pixel along it, whether or not that pixel is on the canvas
+        if op in ('draw_line_segment', 'draw_line_segments'):
+            segments = [list(arguments[name] for name in ('x_0', 'y_0', 'x_1', 'y_1'))] \
+                if op == 'draw_line_segment' else arguments['segments']
+            if not isinstance(segments, list) or not all(isinstance(s, list) and len(s) == 4 for s in segments):
+                raise ValueError(f'"segments" of {op!r} must be a list of [x_0, y_0, x_1, y_1]')
+            for segment in segments:
+                for name, value, extent in zip(('x_0', 'y_0', 'x_1', 'y_1'), segment, (width, height) * 2):
+                    check(name, value, -limits['diagonal'], extent + limits['diagonal'])
+
+    # Return the normalized description as canonical JSON: sorted keys and no whitespace
+    def to_json(self):
+        return json.dumps(self.description, sort_keys=True, separators=(',', ':'))
+
+    # Return a hash of the normalized description, identical for every description of the same scene
+    def get_key(self):
+        return hashlib.sha256(self.to_json().encode('utf-8')).hexdigest()
+
+    # Instantiate the `ColorGenerator` of the scene
+    def _build_color_generator(self):
+        generator = self.description['color_generator']
+        cls = self.COLOR_GENERATORS[generator['type']][0]
+        cg = cls(**generator['options'])
+        for operation in generator['operations']:
+            getattr(cg, operation['op'])(*operation['args'], **operation['kwargs'])
+        return cg
+
+    # Render the scene and return it as a `CustomImage`.
+    # Arguments that an operation rejects surface as the `TypeError` or `ValueError` it raises
+    def render(self, **options):
+        random.seed(self.description['seed'])
+        image = CustomImage(*self.size, self._build_color_generator(), storage=self.description['storage'],
+            **options)
+
+        for operation in self.description['operations']:
+            getattr(image, operation['op'])(*operation['args'], **operation['kwargs'])
+
+        return image
+
+    # Render the scene and return it encoded in its format
+    def encode(self, **options):
+        image = self.render(**options)
+        format = self.description['format']
+
+        # Formats that can be streamed are encoded without handing the image to `PIL`
+        if format in CustomImage.STREAM_WRITERS and self.description['quality'] is None:
+            return b''.join(image.iter_encoded(format))
+        return image.to_bytes(format, quality=self.description['quality'])
@@ -0,0 +1,88 @@
+from multiprocessing import shared_memory
+import weakref
+
+import numpy as np
+
+from imaging.Framebuffer import Framebuffer
+
+# A `Framebuffer` stores the pixel data behind a `CustomImage`.
+#
+# A `SharedFramebuffer` lays its channel data and reservation mask out in one block of shared memory,
+# so that several processes can write into the same image without copying any pixel data between them.
+# The block holds the channel data first, `height * width * 3` bytes, followed by the mask.
+#
+# One process creates the block; any other attaches to it by `name`. Every process must `close` its
+# `SharedFramebuffer` once done with it. The creating process frees the block with `unlink`, or at the
+# latest once its `SharedFramebuffer` is garbage collected.
+#
+# A copy of a `SharedFramebuffer` - made along with a copy of its image, or by pickling it to another
+# process - creates a block of its own, rather than attaching to the block of the original.
+#
+# Pixel counts are per process: each only counts the pixels it writes itself.
+
+class SharedFramebuffer(Framebuffer):
+
+    def __init__(self, width, height, name=None):
+        self.width = width
+        self.height = height
+        self._attach(name)
+        self.num_reserved = 0
+        self.num_pixels_written = 0
+        self._allocate_block_versions()
+
+    # Create a new block, zero-initialized just like the arrays of a `Framebuffer`, or attach to the block `name`
+    def _attach(self, name):
+        num_pixels = self.width * self.height
+        size = max(num_pixels * (self.NUM_CHANNELS + 1), 1)
+        if name is None:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=size)
+            self._free = weakref.finalize(self, self.shared_memory.unlink)
+        else:
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+            self._free = None
+        self.name = self.shared_memory.name
+
+        # View the block as the channel data and the reservation mask
+        buffer = self.shared_memory.buf
+        self.pixels = np.ndarray((self.height, self.width, self.NUM_CHANNELS), dtype=np.uint8, buffer=buffer)
+        self.reserved = np.ndarray((self.height, self.width), dtype=bool, buffer=buffer,
+            offset=num_pixels * self.NUM_CHANNELS)
+
+    # Return a `SharedFramebuffer` holding a copy of the pixels, counts and changes of `framebuffer`
+    @classmethod
+    def from_framebuffer(cls, framebuffer):
+        shared = cls(framebuffer.width, framebuffer.height)
+        shared.pixels[...] = framebuffer.pixels
+        shared.reserved[...] = framebuffer.reserved
+        shared.num_reserved = framebuffer.num_reserved
+        shared.num_pixels_written = framebuffer.num_pixels_written
+        shared.version = framebuffer.version
+        shared.block_versions = framebuffer.block_versions.copy()
+        return shared
+
+    # The channel data always stays in the block, so `rgb` is copied into it
+    def load_rgb_array(self, rgb):
+        self.pixels[...] = rgb
+        self._mark_rect(slice(None), slice(None))
+
+    # Detach from the block. The views onto it must be released first
+    def close(self):
+        self.pixels = self.reserved = None
+        self.shared_memory.close()
+
+    # Free the block, once every process has closed it
+    def unlink(self):
+        self._free()
+
+    # A copy carries the channel data and the mask as plain arrays, and moves them into a new block of its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['shared_memory'], state['_free'], state['name']
+        return state
+
+    def __setstate__(self, state):
+        pixels, reserved = state.pop('pixels'), state.pop('reserved')
+        self.__dict__.update(state)
+        self._attach(None)
+        self.pixels[...] = pixels
+        self.reserved[...] = reserved
@@ -0,0 +1,109 @@
+import numpy as np
+
+# A `SliceStore` holds the slices of a `CustomImage`: one-pixel-wide lines, either vertical or horizontal.
+#
+# A slice is a span `[low, high)` along one row or column, referred to as its `position`.
+# For vertical slices, `position` is an `x` coordinate and the span runs over `y`. For horizontal slices,
+# `position` is a `y` coordinate and the span runs over `x`.
+#
+# Slices are stored as three parallel arrays, in the order they were added. A position can hold
+# any number of slices, which may overlap.
+#
+# Slices are drawn grouped by position - positions in the order they were first added, and the slices
+# of each position in the order they were added - so that every position is walked once.
+
+class SliceStore:
+
+    def __init__(self, capacity=16):
+        self.num_slices = 0
+        self.positions = np.zeros(capacity, dtype=np.int64)
+        self.lows = np.zeros(capacity, dtype=np.int64)
+        self.highs = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.num_slices
+
+    # Return the spans `[(low, high)]` of every slice at `position`, in the order they were added
+    def __getitem__(self, position):
+        positions, lows, highs = self.get_slices()
+        at_position = positions == position
+        return list(zip(lows[at_position].tolist(), highs[at_position].tolist()))
+
+    def __contains__(self, position):
+        return bool((self.get_slices()[0] == position).any())
+
+    # Return every slice, in the order they were added, as three arrays: `positions, lows, highs`
+    def get_slices(self):
+        n = self.num_slices
+        return self.positions[:n], self.lows[:n], self.highs[:n]
+
+    # Add a single slice
+    def add(self, position, low, high):
+        self.add_many([position], [low], [high])
+
+    # Add many slices at once, given as parallel arrays
+    def add_many(self, positions, lows, highs):
+        num_new = len(positions)
+        required = self.num_slices + num_new
+
+        # Grow every array geometrically, so that adding slices one at a time stays amortized O(1)
+        if required > len(self.positions):
+            capacity = max(required, 2 * len(self.positions))
+            for name in ('positions', 'lows', 'highs'):
+                grown = np.zeros(capacity, dtype=np.int64)
+                grown[:self.num_slices] = getattr(self, name)[:self.num_slices]
+                setattr(self, name, grown)
+
+        new = slice(self.num_slices, required)
+        self.positions[new], self.lows[new], self.highs[new] = positions, lows, highs
+        self.num_slices = required
+
+    # Return the order in which slices are drawn: grouped by position, see above
+    def get_draw_order(self):
+        positions = self.get_slices()[0]
+
+        # Rank every position by the first slice added to it, and sort slices by that rank.
+        # A stable sort keeps the slices of each position in the order they were added
+        _, first_occurrences, inverse = np.unique(positions, return_index=True, return_inverse=True)
+        ranks = np.argsort(np.argsort(first_occurrences))
+        return np.argsort(ranks[inverse.reshape(-1)], kind='stable')
+
+    # Return the spans to draw every slice with, given the color of every slice in draw order.
+    # Spans are returned as four arrays: `positions, lows, highs, colors`
+    #
+    # Consecutive slices of a position that share a color are merged, wherever they overlap or touch.
+    # Merging never changes the drawn image: either way, the pixels of the merged span end up that color.
+    # Empty slices are dropped.
+    def get_spans(self, colors):
+        order = self.get_draw_order()
+        positions, lows, highs = (array[order] for array in self.get_slices())
+        colors = np.asarray(colors).reshape(-1, 3)
+
+        # Drop empty slices. Their colors are still consumed
+        nonempty = lows < highs
+        positions, lows, highs, colors = positions[nonempty], lows[nonempty], highs[nonempty], colors[nonempty]
+        if len(positions) == 0:
+            return positions, lows, highs, colors
+
+        # Slices can only merge within a group of consecutive slices of one position and one color
+        new_group = np.ones(len(positions), dtype=bool)
+        new_group[1:] = (positions[1:] != positions[:-1]) | (colors[1:] != colors[:-1]).any(axis=1)
+        groups = np.cumsum(new_group) - 1
+
+        # The slices of a group all share one color, so the order they are drawn in does not matter.
+        # Sort each group by `low`, and merge it like any set of intervals
+        order = np.lexsort((lows, groups))
+        positions, lows, highs = positions[order], lows[order], highs[order]
+        colors, groups = colors[order], groups[order]
+
+        # Track the furthest `high` of each group so far. Offsetting every group past the `high`s of the
+        # previous groups keeps a single running maximum from crossing group boundaries
+        offsets = groups * (int(highs.max()) + 1)
+        max_highs = np.maximum.accumulate(highs + offsets) - offsets
+
+        # A slice starts a new span unless it overlaps or touches the span before it
+        new_span = new_group.copy()
+        new_span[1:] |= lows[1:] > max_highs[:-1]
+
+        starts = np.flatnonzero(new_span)
+        return positions[starts], lows[starts], np.maximum.reduceat(highs, starts), colors[starts]
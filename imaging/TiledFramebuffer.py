@@ -0,0 +1,314 @@
+import numpy as np
+
+from imaging.Framebuffer import Framebuffer, as_color_array, fill_color, fill_color_where
+
+# A `Framebuffer` stores the pixel data behind a `CustomImage`.
+#
+# A `TiledFramebuffer` divides the image into square tiles of `tile_size` pixels per side.
+# Every tile starts out compressed: it is either unreserved, or reserved as one single color,
+# and then costs only a few bytes. A tile is given its own pixel data and reservation mask only
+# once something draws into part of it.
+#
+# This suits images that are mostly solid colors - a background plus a few features - and makes
+# background and large region fills cost O(tiles) instead of O(pixels).
+
+class TiledFramebuffer(Framebuffer):
+
+    # Every tile is in one of three states
+    EMPTY = 0       # No pixel in the tile is reserved
+    CONSTANT = 1    # Every pixel in the tile is reserved as `tile_colors[tile]`
+    DENSE = 2       # The tile has its own pixel data and reservation mask in `dense_tiles`
+
+    def __init__(self, width, height, tile_size=256):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+
+        # Calculate the dimensions of the tile grid. Tiles along the right and bottom edges
+        # are cropped when the image dimensions are not multiples of `tile_size`
+        self.num_tiles_x = -(-width // tile_size)
+        self.num_tiles_y = -(-height // tile_size)
+        grid = (self.num_tiles_y, self.num_tiles_x)
+
+        # Allocate the per-tile state and the color of every `CONSTANT` tile
+        self.tile_states = np.full(grid, self.EMPTY, dtype=np.uint8)
+        self.tile_colors = np.zeros(grid + (self.NUM_CHANNELS,), dtype=np.uint8)
+
+        # `dense_tiles` is of the type `{(int, int) : (pixels, reserved)}`
+        # Each key `(tile_y, tile_x)` values to the pixel data and reservation mask of that tile
+        self.dense_tiles = {}
+
+        # Track the number of reserved pixels in every tile, next to the number of pixels in every tile
+        tile_widths = np.diff(np.minimum(np.arange(self.num_tiles_x + 1) * tile_size, width))
+        tile_heights = np.diff(np.minimum(np.arange(self.num_tiles_y + 1) * tile_size, height))
+        self.tile_areas = np.outer(tile_heights, tile_widths)
+        self.tile_counts = np.zeros(grid, dtype=np.int64)
+        self.num_reserved = 0
+        self.num_pixels_written = 0
+        self._allocate_block_versions()
+
+    # Record `num_newly_reserved` more reserved pixels within a tile
+    def _count_tile(self, tile_x, tile_y, num_newly_reserved):
+        self.tile_counts[tile_y, tile_x] += num_newly_reserved
+        self.num_reserved += int(num_newly_reserved)
+
+    # Return the pixel bounds `(x_min, x_max, y_min, y_max)` of a tile
+    def _get_tile_bounds(self, tile_x, tile_y):
+        x_min, y_min = tile_x * self.tile_size, tile_y * self.tile_size
+        return x_min, min(x_min + self.tile_size, self.width), y_min, min(y_min + self.tile_size, self.height)
+
+    # Give a tile its own pixel data and reservation mask, if it does not have them yet, and return them
+    def _decompress_tile(self, tile_x, tile_y):
+        key = (tile_y, tile_x)
+        if key in self.dense_tiles:
+            return self.dense_tiles[key]
+
+        x_min, x_max, y_min, y_max = self._get_tile_bounds(tile_x, tile_y)
+        pixels = np.zeros((y_max - y_min, x_max - x_min, self.NUM_CHANNELS), dtype=np.uint8)
+        reserved = np.zeros((y_max - y_min, x_max - x_min), dtype=bool)
+
+        # A `CONSTANT` tile expands into its single color
+        if self.tile_states[key] == self.CONSTANT:
+            fill_color(pixels, self.tile_colors[key])
+            reserved[:] = True
+
+        self.tile_states[key] = self.DENSE
+        self.dense_tiles[key] = (pixels, reserved)
+        return pixels, reserved
+
+    # Reserve every pixel within a rectangle as a single color
+    def fill_rect(self, x_min, x_max, y_min, y_max, color):
+        # Clip the rectangle to the image, as slicing would
+        x_min, x_max = max(x_min, 0), min(x_max, self.width)
+        y_min, y_max = max(y_min, 0), min(y_max, self.height)
+        if x_min >= x_max or y_min >= y_max:
+            return
+
+        color = as_color_array(color)
+        size = self.tile_size
+        self.num_pixels_written += (x_max - x_min) * (y_max - y_min)
+        self._mark_dirty_rect(x_min, x_max, y_min, y_max)
+
+        # Alias the range of tiles that the rectangle touches...
+        tile_x_min, tile_x_max = x_min // size, (x_max - 1) // size + 1
+        tile_y_min, tile_y_max = y_min // size, (y_max - 1) // size + 1
+
+        # ...and the range of tiles that the rectangle covers completely.
+        # A cropped tile along the right or bottom edge is covered if the rectangle reaches the edge
+        full_x_min = -(-x_min // size)
+        full_x_max = self.num_tiles_x if x_max == self.width else x_max // size
+        full_y_min = -(-y_min // size)
+        full_y_max = self.num_tiles_y if y_max == self.height else y_max // size
+
+        # Completely covered tiles collapse into a single color, discarding any pixel data
+        if full_x_min < full_x_max and full_y_min < full_y_max:
+            covered = (slice(full_y_min, full_y_max), slice(full_x_min, full_x_max))
+            for tile_y, tile_x in zip(*np.nonzero(self.tile_states[covered] == self.DENSE)):
+                del self.dense_tiles[(tile_y + full_y_min, tile_x + full_x_min)]
+
+            self.tile_states[covered] = self.CONSTANT
+            self.tile_colors[covered] = color
+
+            self.num_reserved += int((self.tile_areas[covered] - self.tile_counts[covered]).sum())
+            self.tile_counts[covered] = self.tile_areas[covered]
+
+        # Partially covered tiles can only lie along the edges of the rectangle
+        for tile_y in range(tile_y_min, tile_y_max):
+            fully_covered_row = full_y_min <= tile_y < full_y_max
+
+            for tile_x in range(tile_x_min, tile_x_max):
+                if fully_covered_row and full_x_min <= tile_x < full_x_max:
+                    continue
+
+                # Draw into the part of the tile that the rectangle covers
+                tile_x_lo, _, tile_y_lo, _ = self._get_tile_bounds(tile_x, tile_y)
+                pixels, reserved = self._decompress_tile(tile_x, tile_y)
+                rows = slice(max(y_min - tile_y_lo, 0), y_max - tile_y_lo)
+                cols = slice(max(x_min - tile_x_lo, 0), x_max - tile_x_lo)
+                fill_color(pixels[rows, cols], color)
+                region = reserved[rows, cols]
+                self._count_tile(tile_x, tile_y, region.size - np.count_nonzero(region))
+                region[...] = True
+
+    # Reserve a scattered set of pixels, given as parallel arrays of coordinates.
+    # `colors` is either a single color or one color per pixel, as an `(n, 3)` array.
+    # If a pixel is listed more than once, the last occurrence wins.
+    def fill_pixels(self, xs, ys, colors):
+        if len(xs) == 0:
+            return
+
+        colors = as_color_array(colors)
+        size = self.tile_size
+        self.num_pixels_written += len(xs)
+        self._mark_dirty_pixels(xs, ys)
+
+        # Group the pixels by tile. A stable sort keeps the order of pixels within each tile,
+        # so that the last occurrence of a repeated pixel still wins
+        tile_ids = (ys // size) * self.num_tiles_x + (xs // size)
+        order = np.argsort(tile_ids, kind='stable')
+        tile_ids, xs, ys = tile_ids[order], xs[order], ys[order]
+        if colors.ndim == 2:
+            colors = colors[order]
+
+        # Draw into each touched tile
+        group_starts = np.flatnonzero(np.diff(tile_ids, prepend=-1))
+        group_ends = np.append(group_starts[1:], len(tile_ids))
+
+        for start, end in zip(group_starts, group_ends):
+            tile_y, tile_x = divmod(int(tile_ids[start]), self.num_tiles_x)
+            pixels, reserved = self._decompress_tile(tile_x, tile_y)
+
+            rows, cols = ys[start:end] - tile_y * size, xs[start:end] - tile_x * size
+            pixels[rows, cols] = colors[start:end] if colors.ndim == 2 else colors
+            reserved[rows, cols] = True
+
+            # Recount the tile rather than the pixels, which may list a pixel more than once
+            num_reserved = np.count_nonzero(reserved)
+            self._count_tile(tile_x, tile_y, num_reserved - self.tile_counts[tile_y, tile_x])
+
+    # Reserve the pixels of a rectangle, with top-left corner `(x_min, y_min)`, wherever the
+    # boolean array `mask` - of the same shape as the rectangle - is `True`, as a single color
+    def fill_mask(self, x_min, y_min, mask, color):
+        color = as_color_array(color)
+        size = self.tile_size
+        x_max, y_max = x_min + mask.shape[1], y_min + mask.shape[0]
+        self._mark_dirty_rect(x_min, x_max, y_min, y_max)
+
+        for tile_y in range(y_min // size, (y_max - 1) // size + 1):
+            for tile_x in range(x_min // size, (x_max - 1) // size + 1):
+                tile_x_lo, tile_x_hi, tile_y_lo, tile_y_hi = self._get_tile_bounds(tile_x, tile_y)
+
+                # Alias the part of `mask` that overlaps this tile
+                lo_x, hi_x = max(x_min, tile_x_lo), min(x_max, tile_x_hi)
+                lo_y, hi_y = max(y_min, tile_y_lo), min(y_max, tile_y_hi)
+                tile_mask = mask[lo_y - y_min:hi_y - y_min, lo_x - x_min:hi_x - x_min]
+                if not tile_mask.any():
+                    continue
+
+                # A masked rectangle that covers a tile entirely is just a rectangle
+                if tile_mask.all():
+                    self.fill_rect(lo_x, hi_x, lo_y, hi_y, color)
+                    continue
+
+                pixels, reserved = self._decompress_tile(tile_x, tile_y)
+                rows, cols = slice(lo_y - tile_y_lo, hi_y - tile_y_lo), slice(lo_x - tile_x_lo, hi_x - tile_x_lo)
+                self.num_pixels_written += int(np.count_nonzero(tile_mask))
+                fill_color_where(pixels[rows, cols], tile_mask, color)
+                self._count_tile(tile_x, tile_y, np.count_nonzero(tile_mask & ~reserved[rows, cols]))
+                reserved[rows, cols] |= tile_mask
+
+    # Reserve the pixels of a rectangle wherever `mask` is `True`, each as its own color, see `Framebuffer.fill_mask_colors`
+    def fill_mask_colors(self, x_min, y_min, mask, colors):
+        size = self.tile_size
+        x_max, y_max = x_min + mask.shape[1], y_min + mask.shape[0]
+        self._mark_dirty_rect(x_min, x_max, y_min, y_max)
+
+        for tile_y in range(y_min // size, (y_max - 1) // size + 1):
+            for tile_x in range(x_min // size, (x_max - 1) // size + 1):
+                tile_x_lo, tile_x_hi, tile_y_lo, tile_y_hi = self._get_tile_bounds(tile_x, tile_y)
+
+                # Alias the parts of `mask` and `colors` that overlap this tile
+                lo_x, hi_x = max(x_min, tile_x_lo), min(x_max, tile_x_hi)
+                lo_y, hi_y = max(y_min, tile_y_lo), min(y_max, tile_y_hi)
+                overlap = (slice(lo_y - y_min, hi_y - y_min), slice(lo_x - x_min, hi_x - x_min))
+                tile_mask = mask[overlap]
+                if not tile_mask.any():
+                    continue
+
+                pixels, reserved = self._decompress_tile(tile_x, tile_y)
+                rows, cols = slice(lo_y - tile_y_lo, hi_y - tile_y_lo), slice(lo_x - tile_x_lo, hi_x - tile_x_lo)
+                self.num_pixels_written += int(np.count_nonzero(tile_mask))
+                np.copyto(pixels[rows, cols], colors[overlap], where=tile_mask[..., np.newaxis])
+                self._count_tile(tile_x, tile_y, np.count_nonzero(tile_mask & ~reserved[rows, cols]))
+                reserved[rows, cols] |= tile_mask
+
+    # Reserve many one-pixel-wide spans, each as a single color, see `Framebuffer.fill_spans`
+    def fill_spans(self, positions, lows, highs, colors, vertical=True):
+        for position, low, high, color in zip(positions.tolist(), lows.tolist(), highs.tolist(), colors):
+            if vertical:
+                self.fill_rect(position, position + 1, low, high, color)
+            else:
+                self.fill_rect(low, high, position, position + 1, color)
+
+    # Reserve every pixel with the channel data of `rgb`, an `(height, width, 3)` array of `uint8`.
+    # Tiles of a single color stay compressed
+    def load_rgb_array(self, rgb):
+        self.dense_tiles = {}
+
+        for tile_y in range(self.num_tiles_y):
+            for tile_x in range(self.num_tiles_x):
+                x_min, x_max, y_min, y_max = self._get_tile_bounds(tile_x, tile_y)
+                pixels = rgb[y_min:y_max, x_min:x_max]
+
+                if (pixels == pixels[0, 0]).all():
+                    self.tile_states[tile_y, tile_x] = self.CONSTANT
+                    self.tile_colors[tile_y, tile_x] = pixels[0, 0]
+                else:
+                    self.tile_states[tile_y, tile_x] = self.DENSE
+                    self.dense_tiles[(tile_y, tile_x)] = (pixels.copy(), np.ones(pixels.shape[:2], dtype=bool))
+
+        self.num_pixels_written += self.width * self.height
+        self.num_reserved = self.width * self.height
+        self.tile_counts[...] = self.tile_areas
+        self._mark_dirty_rect(0, self.width, 0, self.height)
+
+    # Replace the color of every reserved pixel, see `Framebuffer.map_colors`
+    def map_colors(self, function):
+        constant = self.tile_states == self.CONSTANT
+        self.tile_colors[constant] = function(self.tile_colors[constant])
+
+        for pixels, reserved in self.dense_tiles.values():
+            pixels[reserved] = function(pixels[reserved])
+
+        self.num_pixels_written += self.num_reserved
+        self._mark_dirty_rect(0, self.width, 0, self.height)
+
+    # Compress every decompressed tile that has become a single, fully reserved color again
+    def compact(self):
+        for key, (pixels, reserved) in list(self.dense_tiles.items()):
+            if reserved.all() and (pixels == pixels[0, 0]).all():
+                self.tile_states[key] = self.CONSTANT
+                self.tile_colors[key] = pixels[0, 0]
+                del self.dense_tiles[key]
+
+    # Return a boolean array of shape `(height, width)` that is `True` wherever a pixel is unreserved
+    def get_unreserved_mask(self):
+        # Expand the tile states into a mask first, then fill in the masks of dense tiles
+        size = self.tile_size
+        unreserved = np.repeat(np.repeat(self.tile_states == self.EMPTY, size, axis=0), size, axis=1)
+        unreserved = np.ascontiguousarray(unreserved[:self.height, :self.width])
+
+        for (tile_y, tile_x), (_, reserved) in self.dense_tiles.items():
+            x_min, x_max, y_min, y_max = self._get_tile_bounds(tile_x, tile_y)
+            unreserved[y_min:y_max, x_min:x_max] = ~reserved
+
+        return unreserved
+
+    # Assemble the channel data of every tile into one `(height, width, 3)` array
+    def to_rgb_array(self):
+        return self.get_rgb_rows(0, self.height)
+
+    # Assemble the channel data of the rows `[y_min, y_max)` from the tiles they overlap
+    def get_rgb_rows(self, y_min, y_max):
+        rgb = np.zeros((y_max - y_min, self.width, self.NUM_CHANNELS), dtype=np.uint8)
+        if y_min >= y_max:
+            return rgb
+
+        # Alias the range of tile rows that overlap the rows
+        tile_y_min, tile_y_max = y_min // self.tile_size, (y_max - 1) // self.tile_size + 1
+        states = self.tile_states[tile_y_min:tile_y_max]
+
+        for tile_y, tile_x in zip(*np.nonzero(states == self.CONSTANT)):
+            tile_y += tile_y_min
+            x_min, x_max, tile_y_lo, tile_y_hi = self._get_tile_bounds(tile_x, tile_y)
+            rows = slice(max(tile_y_lo, y_min) - y_min, min(tile_y_hi, y_max) - y_min)
+            fill_color(rgb[rows, x_min:x_max], self.tile_colors[tile_y, tile_x])
+
+        for tile_y, tile_x in zip(*np.nonzero(states == self.DENSE)):
+            tile_y += tile_y_min
+            x_min, x_max, tile_y_lo, tile_y_hi = self._get_tile_bounds(tile_x, tile_y)
+            lo, hi = max(tile_y_lo, y_min), min(tile_y_hi, y_max)
+            pixels, _ = self.dense_tiles[(tile_y, tile_x)]
+            rgb[lo - y_min:hi - y_min, x_min:x_max] = pixels[lo - tile_y_lo:hi - tile_y_lo]
+
+        return rgb
@@ -1,3 +1,11 @@
-# Raised when an unreserved `ReservablePixel`s byte data is accessed
+# Raised when an image is constructed while some of its pixels are unreserved
 class UnreservedPixelError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+# Raised when a `RingColorGenerator` is asked for a color before any were added to its pool
+class EmptyColorPoolError(Exception):
+    pass
+
+# Raised when a render takes longer than the `RenderService` allows, see `RenderService.render_timeout`
+class RenderTimeoutError(Exception):
+    pass
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from imaging.CustomImage import CustomImage
+from imaging.ColorGenerator import ColorGenerator
+from imaging.exceptions import EmptyColorPoolError
+from imaging.RingColorGenerator import RingColorGenerator
+from imaging.SharedFramebuffer import SharedFramebuffer
+
+# Quantizing without a palette takes the pool of the `ColorGenerator`, which a plain `ColorGenerator` lacks
+def test_quantize_to_palette_without_pool_raises_value_error():
+    image = CustomImage(4, 4, ColorGenerator())
+    image.reserve_white_background()
+    with pytest.raises(ValueError, match='requires a palette'):
+        image.quantize_to_palette()
+
+def test_quantize_to_palette_with_empty_pool_raises_empty_color_pool_error():
+    image = CustomImage(4, 4, RingColorGenerator())
+    image.reserve_white_background()
+    with pytest.raises(EmptyColorPoolError):
+        image.quantize_to_palette()
+
+def test_quantize_to_palette_maps_to_the_pool():
+    cg = RingColorGenerator()
+    cg.add_color_to_pool_from_rgb_string('FA0000')
+    cg.add_color_to_pool_from_rgb_string('0000FA')
+    image = CustomImage(4, 4, cg)
+    image.reserve_background_color(b'\xff\x10\x10')
+    image.quantize_to_palette()
+    assert image.to_pil().getpixel((0, 0)) == (250, 0, 0)
+
+def _build_deferred_regions(**kwargs):
+    cg = RingColorGenerator()
+    cg.add_rainbow_to_pool(step_size=20)
+    image = CustomImage(200, 100, cg, deferred=True, seed=1, **kwargs)
+    image.divide_rectangular_regions(10)
+    image.reserve_all_rectangular_regions()
+    return image
+
+# Parallel images keep their pixels in shared memory, which every process writes into directly
+@pytest.mark.parametrize('processes, flush_processes', [(3, None), (1, 2)])
+def test_parallel_flush_matches_serial_flush(processes, flush_processes):
+    serial = _build_deferred_regions()
+    serial.flush()
+    parallel = _build_deferred_regions(processes=processes)
+    parallel.flush(flush_processes)
+    assert isinstance(parallel.framebuffer, SharedFramebuffer)
+    assert parallel.export_cache.framebuffer is parallel.framebuffer
+    assert parallel.to_bytes('PNG') == serial.to_bytes('PNG')
+
+def test_copy_of_parallel_image_has_its_own_shared_memory():
+    image = _build_deferred_regions(processes=2)
+    image.flush()
+    copy = image.copy()
+    assert copy.framebuffer.name != image.framebuffer.name
+    copy.framebuffer.pixels[...] = 0
+    assert image.framebuffer.pixels.any()
+
+# A `PNG` is encoded with whatever options it is saved with, by the `ExportCache` or else by `PIL`
+@pytest.mark.parametrize('storage', ['dense', 'tiled', 'palette'])
+@pytest.mark.parametrize('params', [{}, {'compress_level': 0}, {'compress_level': 9}, {'optimize': True}])
+def test_png_honors_save_options(storage, params):
+    image = _build_deferred_regions(storage=storage)
+    image.flush()
+    data = image.to_bytes('PNG', **params)
+    decoded = Image.open(io.BytesIO(data)).convert('RGB')
+    assert np.array_equal(np.asarray(decoded), np.asarray(image.to_pil().convert('RGB')))
+    if params:
+        assert data != image.to_bytes('PNG')
+
+def test_png_compress_level_zero_stores_uncompressed_data():
+    image = _build_deferred_regions()
+    image.flush()
+    assert len(image.to_bytes('PNG', compress_level=0)) > 200 * 100 * 3
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from imaging.RenderService import RenderService
+
+# Answer a single request, as raw bytes, and return its status along with its decoded JSON body, if any
+async def request(service, raw):
+    reader = asyncio.StreamReader()
+    reader.feed_data(raw)
+    reader.feed_eof()
+    status, headers, body = await service._handle_request(reader)
+    return status, json.loads(body) if headers.get('Content-Type') == 'application/json' else body
+
+def post_scene(scene):
+    body = json.dumps(scene).encode('utf-8')
+    return b'POST /render HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body
+
+# Answer requests on a started service, with a single worker process
+def serve(*raws):
+    async def run():
+        service = RenderService(processes=1, render_timeout=30)
+        await service.start()
+        try:
+            return [await request(service, raw) for raw in raws]
+        finally:
+            await service.stop()
+    return asyncio.run(run())
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'create_symmetric_vertical_slices_from_center', 'args': [0, 10], 'kwargs': {'num_partitions': 0}},
+    {'op': 'create_symmetric_horizontal_slices_from_center', 'args': [0, 10, 1, 0]},
+    {'op': 'divide_rectangular_regions', 'args': [-1]},
+    {'op': 'draw_line_segment', 'args': [0, 0, 9, 9, 3000]},
+    {'op': 'reserve_all_rectangular_regions', 'args': [5]},
+    {'op': 'quantize_to_palette', 'kwargs': {'palette': [[0, 0, 0]]}},
+])
+def test_out_of_bounds_arguments_are_rejected_with_400(operation):
+    [(status, body)] = serve(post_scene({'size': [10, 10], 'operations': [operation]}))
+    assert status == 400, body
+
+def test_quantizing_without_a_pool_is_rejected_with_400():
+    scene = {'size': [10, 10], 'color_generator': {'type': 'base'},
+        'operations': [{'op': 'reserve_white_background'}, {'op': 'quantize_to_palette'}]}
+    [(status, body)] = serve(post_scene(scene))
+    assert status == 400
+    assert 'requires a palette' in body['error']
+
+def test_negative_content_length_is_rejected_with_400():
+    [(status, _)] = serve(b'POST /render HTTP/1.1\r\nContent-Length: -1\r\n\r\n')
+    assert status == 400
+
+def test_valid_scene_renders():
+    scene = {'size': [10, 10], 'operations': [
+        {'op': 'create_symmetric_vertical_slices_from_center', 'args': [0, 10], 'kwargs': {'num_partitions': 2}},
+        {'op': 'reserve_white_background'}, {'op': 'reserve_all_vertical_slices'}]}
+    [(status, body)] = serve(post_scene(scene))
+    assert status == 200
+    assert body.startswith(b'\x89PNG')